@@ -0,0 +1,67 @@
+import argparse
+import subprocess
+import sys
+import time
+
+# Seconds to import btrccts in a new interpreter (without the python
+# startup), and which heavy modules got imported. Exits with 1, if an
+# import takes longer than --max-seconds.
+# Usage: python benchmarks/import_time.py --repeat 5
+
+HELP = """import contextlib, io, sys
+from btrccts import AlgorithmBase, parse_params_and_execute_algorithm
+sys.argv = ['algo.py', '--help']
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_params_and_execute_algorithm(AlgorithmBase)
+except SystemExit:
+    pass"""
+CREATE = ('from btrccts.context import BacktestContext; '
+          'BacktestContext(timeframe=None).create_exchange("kraken"{})')
+STATEMENTS = [
+    ('import btrccts', 'import btrccts'),
+    ('import AlgorithmBase', 'from btrccts import AlgorithmBase'),
+    ('parse --help', HELP),
+    ('import btrccts.run', 'import btrccts.run'),
+    ('create sync exchange', CREATE.format('')),
+    ('create async exchange', CREATE.format(', async_ccxt=True')),
+]
+HEAVY_MODULES = ['pandas', 'ccxt', 'ccxt.async_support', 'aiohttp',
+                 'ccxtpro', 'btrccts.metrics']
+REPORT = ('import sys; print(",".join(m for m in {!r} '
+          'if m in sys.modules))').format(HEAVY_MODULES)
+
+
+def measure(statement, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', '{}\n{}'.format(statement, REPORT)],
+            check=True, capture_output=True, text=True)
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best, result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', default=3, type=int)
+    parser.add_argument('--max-seconds', default=None, type=float)
+    args = parser.parse_args()
+    baseline, _ = measure('pass', args.repeat)
+    print('{:<24}{:>8.3f}s'.format('python startup', baseline))
+    failed = False
+    for name, statement in STATEMENTS:
+        duration, modules = measure(statement, args.repeat)
+        duration = max(0, duration - baseline)
+        print('{:<24}{:>8.3f}s  {}'.format(name, duration, modules or '-'))
+        if args.max_seconds is not None and duration > args.max_seconds:
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import logging
+import pandas
+import time
+from btrccts.algorithm import AlgorithmBaseSync
+from btrccts.run import main_loop, main_loop_sync
+from btrccts.timeframe import Timeframe
+
+# Iterations per second of main_loop with an empty algorithm.
+# Usage: python benchmarks/main_loop.py --iterations 100000
+
+
+class EmptyAlgo(AlgorithmBaseSync):
+    pass
+
+
+def create_timeframe(iterations):
+    start = pandas.Timestamp('2020-01-01', tz='UTC')
+    interval = pandas.Timedelta(minutes=1)
+    return Timeframe(pd_start_date=start,
+                     pd_end_date=start + (iterations - 1) * interval,
+                     pd_interval=interval)
+
+
+async def run_a_or_sync(func, *args, **kwargs):
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def per_iteration_dispatch_loop(timeframe, algorithm):
+    # The dispatch of main_loop before it was decided once at startup
+    while not timeframe.finished():
+        await run_a_or_sync(algorithm.next_iteration)
+        timeframe.add_timedelta()
+    await run_a_or_sync(algorithm.exit, reason=None)
+
+
+def run_sync(iterations):
+    main_loop_sync(timeframe=create_timeframe(iterations),
+                   algorithm=EmptyAlgo(None, None))
+
+
+def run_async(iterations):
+    asyncio.run(main_loop(timeframe=create_timeframe(iterations),
+                          algorithm=EmptyAlgo(None, None)))
+
+
+def run_per_iteration_dispatch(iterations):
+    asyncio.run(per_iteration_dispatch_loop(
+        timeframe=create_timeframe(iterations),
+        algorithm=EmptyAlgo(None, None)))
+
+
+def measure(func, iterations, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(iterations)
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return iterations / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', default=100000, type=int)
+    parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parse_args()
+    logging.getLogger('btrccts').setLevel(logging.WARNING)
+    for name, func in [('main_loop_sync', run_sync),
+                       ('main_loop', run_async),
+                       ('per iteration dispatch', run_per_iteration_dispatch)]:
+        per_second = measure(func, args.iterations, args.repeat)
+        print('{:<24}{:>14.0f} iterations/s'.format(name, per_second))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import json
+import logging
+import numpy
+import os
+import pandas
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from btrccts.algorithm import AlgorithmBaseSync
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.run import load_ohlcvs, main_loop_sync
+from btrccts.synthetic import generate_ohlcv
+from btrccts.timeframe import Timeframe
+
+# Benchmarks of the backtest hot paths on synthetic 1 minute ohlcv data.
+# The results are stored as json, so runs of different commits can be
+# compared.
+# Usage: python benchmarks/suite.py --sizes day,week --output new.json
+#        python benchmarks/suite.py --compare old.json --output new.json
+
+SIZES = {'day': 24 * 60, 'week': 7 * 24 * 60, 'month': 30 * 24 * 60}
+MARKET = {'symbol': 'BTC/USD', 'base': 'BTC', 'quote': 'USD',
+          'maker': 0.001, 'taker': 0.002}
+BALANCES = {'USD': 10**9, 'BTC': 10**6}
+START = pandas.Timestamp('2020-01-01', tz='UTC')
+ORDERS = 200
+FETCHES = 200
+# Higher is better for these metrics, lower for the others
+HIGHER_IS_BETTER = ['iterations_per_second', 'orders_per_second',
+                    'batch_orders_per_second', 'cancels_per_second',
+                    'fills_per_second']
+
+
+def create_ohlcv(minutes, seed=0):
+    return pandas.concat(generate_ohlcv(
+        pd_start_date=START,
+        pd_end_date=START + pandas.Timedelta(minutes=minutes - 1),
+        seed=seed))
+
+
+def create_timeframe(minutes, pd_start_date=START,
+                     pd_interval=pandas.Timedelta(minutes=1)):
+    return Timeframe(pd_start_date=pd_start_date,
+                     pd_end_date=START + pandas.Timedelta(minutes=minutes - 1),
+                     pd_interval=pd_interval)
+
+
+def create_backend(minutes, ohlcv, **kwargs):
+    timeframe = create_timeframe(minutes, **kwargs)
+    backend = ExchangeBackend(timeframe=timeframe, balances=BALANCES,
+                              ohlcvs={'BTC/USD': ohlcv})
+    return timeframe, backend
+
+
+class TickerAlgo(AlgorithmBaseSync):
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def next_iteration(self):
+        self.backend.fetch_ticker('BTC/USD')
+
+
+def load_backend(minutes, ohlcv):
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, 'kraken', 'BTC')
+        os.makedirs(path)
+        ohlcv.to_csv(os.path.join(path, 'USD.csv'))
+        start = time.perf_counter()
+        ohlcvs = load_ohlcvs(ohlcv_dir=data_dir, exchange_names=['kraken'],
+                             symbols=['BTC/USD'])
+        timeframe, backend = create_backend(minutes,
+                                            ohlcvs['kraken']['BTC/USD'])
+        return timeframe, backend, time.perf_counter() - start
+
+
+def bench_load(minutes, ohlcv):
+    _, _, duration = load_backend(minutes, ohlcv)
+    return {'load_seconds': duration}
+
+
+def bench_memory(minutes, ohlcv):
+    # Peak of the memory allocated to load the data and run the backtest
+    tracemalloc.start()
+    try:
+        timeframe, backend, _ = load_backend(minutes, ohlcv)
+        main_loop_sync(timeframe=timeframe, algorithm=TickerAlgo(backend))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_memory_mb': peak / 2**20}
+
+
+def bench_main_loop(minutes, ohlcv):
+    timeframe, backend = create_backend(minutes, ohlcv)
+    start = time.perf_counter()
+    main_loop_sync(timeframe=timeframe, algorithm=TickerAlgo(backend))
+    return {'iterations_per_second': minutes / (time.perf_counter() - start)}
+
+
+def bench_orders(minutes, ohlcv):
+    # Limit orders, which never get filled, and their cancellation
+    _, backend = create_backend(minutes, ohlcv)
+    price = ohlcv['low'].min() / 2
+    start = time.perf_counter()
+    ids = [backend.create_order(market=MARKET, type='limit', side='buy',
+                                price=price, amount=1)['id']
+           for _ in range(ORDERS)]
+    created = time.perf_counter()
+    for id in ids:
+        backend.cancel_order(id=id)
+    cancelled = time.perf_counter()
+    backend.create_orders([{'market': MARKET, 'type': 'limit', 'side': 'buy',
+                            'price': price, 'amount': 1}
+                           for _ in range(ORDERS)])
+    batched = time.perf_counter()
+    return {'orders_per_second': ORDERS / (created - start),
+            'batch_orders_per_second': ORDERS / (batched - cancelled),
+            'cancels_per_second': ORDERS / (cancelled - created)}
+
+
+def bench_fills(minutes, ohlcv):
+    # Limit orders, which get filled during the timeframe. One step of the
+    # timeframe moves to the last candle, only the fills are timed.
+    timeframe, backend = create_backend(
+        minutes, ohlcv, pd_interval=pandas.Timedelta(minutes=minutes - 1))
+    close = ohlcv['close'].iloc[0]
+    random = numpy.random.default_rng(1)
+    prices = close * (1 + random.uniform(-0.01, 0.01, ORDERS))
+    for price in prices:
+        backend.create_order(market=MARKET, type='limit',
+                             side='buy' if price < close else 'sell',
+                             price=price, amount=1)
+    timeframe.add_timedelta()
+    start = time.perf_counter()
+    backend.fetch_open_orders()
+    return {'fills_per_second': ORDERS / (time.perf_counter() - start)}
+
+
+def bench_fetch_ohlcv(minutes, ohlcv):
+    # The timeframe starts at the last candle
+    timeframe, backend = create_backend(
+        minutes, ohlcv,
+        pd_start_date=START + pandas.Timedelta(minutes=minutes - 1))
+    since = int((timeframe.date() - pandas.Timedelta(hours=10)).value / 10**6)
+    start = time.perf_counter()
+    for _ in range(FETCHES):
+        backend.fetch_ohlcv_dataframe('BTC/USD', timeframe='5m',
+                                      since=since, limit=100)
+    return {'fetch_ohlcv_ms': (time.perf_counter() - start) / FETCHES * 1000}
+
+
+BENCHMARKS = [bench_load, bench_main_loop, bench_orders, bench_fills,
+              bench_fetch_ohlcv, bench_memory]
+
+
+def best(results):
+    # Best of the repeated runs of a benchmark
+    merged = {}
+    for result in results:
+        for name, value in result.items():
+            if name not in merged:
+                merged[name] = value
+            elif name in HIGHER_IS_BETTER:
+                merged[name] = max(merged[name], value)
+            else:
+                merged[name] = min(merged[name], value)
+    return merged
+
+
+def run(sizes, repeat):
+    results = {}
+    for size in sizes:
+        minutes = SIZES[size]
+        ohlcv = create_ohlcv(minutes)
+        results[size] = {}
+        for benchmark in BENCHMARKS:
+            results[size].update(best(benchmark(minutes, ohlcv)
+                                      for _ in range(repeat)))
+    return results
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, compare=None):
+    for size, metrics in results.items():
+        for name, value in metrics.items():
+            line = '{:<8}{:<24}{:>14.3f}'.format(size, name, value)
+            old = (compare or {}).get(size, {}).get(name)
+            if old:
+                line += '{:>14.3f}{:>+9.1f}%'.format(
+                    old, (value - old) / old * 100)
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='day,week',
+                        help='Comma separated: {}'.format(','.join(SIZES)))
+    parser.add_argument('--repeat', default=3, type=int)
+    parser.add_argument('--output', default=None,
+                        help='File to store the results (json)')
+    parser.add_argument('--compare', default=None,
+                        help='Results of an earlier run (json)')
+    args = parser.parse_args()
+    logging.getLogger('btrccts').setLevel(logging.WARNING)
+    sizes = args.sizes.split(',')
+    for size in sizes:
+        if size not in SIZES:
+            parser.error('Unknown size: {}'.format(size))
+    compare = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        compare = old['results']
+        print('Compare with {} ({})'.format(old['commit'], old['date']))
+    results = run(sizes=sizes, repeat=args.repeat)
+    print_results(results, compare)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': commit(),
+                       'date': pandas.Timestamp.now(tz='UTC').isoformat(),
+                       'python': platform.python_version(),
+                       'numpy': numpy.__version__,
+                       'pandas': pandas.__version__,
+                       'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import logging
+import numpy
+import pandas
+import time
+from btrccts.algorithm import AlgorithmBaseSync
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.run import main_loop_sync
+from btrccts.timeframe import Timeframe
+from btrccts.vectorized import simulate_positions
+
+# Duration of a backtest with a moving average crossover strategy,
+# with main_loop_sync and with the vectorized simulation.
+# Usage: python benchmarks/vectorized.py --days 30
+
+MARKET = {'symbol': 'BTC/USD', 'base': 'BTC', 'quote': 'USD',
+          'maker': 0.001, 'taker': 0.002}
+# Some BTC to pay the fees of the buy orders
+BALANCES = {'USD': 10**6, 'BTC': 1}
+
+
+def create_data(days):
+    start = pandas.Timestamp('2020-01-01', tz='UTC')
+    minutes = days * 24 * 60
+    end = start + pandas.Timedelta(minutes=minutes - 1)
+    timeframe = Timeframe(pd_start_date=start, pd_end_date=end,
+                          pd_interval=pandas.Timedelta(minutes=1))
+    random = numpy.random.default_rng(0)
+    close = 100 * numpy.exp(numpy.cumsum(random.normal(0, 0.001, minutes)))
+    ohlcv = pandas.DataFrame(
+        data={'open': close, 'high': close * 1.001, 'low': close * 0.999,
+              'close': close, 'volume': numpy.ones(minutes)},
+        index=pandas.date_range(start, periods=minutes, freq='1min'))
+    return timeframe, ohlcv
+
+
+def signal(close):
+    fast = pandas.Series(close).rolling(60, min_periods=1).mean()
+    slow = pandas.Series(close).rolling(240, min_periods=1).mean()
+    return (fast > slow).astype(float).values
+
+
+class CrossoverAlgo(AlgorithmBaseSync):
+
+    def __init__(self, backend, positions):
+        self.backend = backend
+        self.positions = positions
+        self.index = 0
+        self.position = 0
+
+    def next_iteration(self):
+        # A typical algorithm looks at the prices every iteration
+        self.backend.fetch_ticker('BTC/USD')
+        target = self.positions[self.index]
+        if target != self.position:
+            self.backend.create_order(
+                market=MARKET, type='market', price=None,
+                side='buy' if target > self.position else 'sell',
+                amount=abs(target - self.position))
+            self.position = target
+        self.index += 1
+
+
+def run_loop(timeframe, ohlcv, positions):
+    backend = ExchangeBackend(timeframe=timeframe, balances=BALANCES,
+                              ohlcvs={'BTC/USD': ohlcv})
+    main_loop_sync(timeframe=timeframe,
+                   algorithm=CrossoverAlgo(backend, positions))
+
+
+def run_vectorized(timeframe, ohlcv, positions):
+    simulate_positions(timeframe=timeframe, ohlcvs={'BTC/USD': ohlcv},
+                       markets={'BTC/USD': MARKET},
+                       positions={'BTC/USD': positions},
+                       balances=BALANCES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', default=30, type=int)
+    args = parser.parse_args()
+    logging.getLogger('btrccts').setLevel(logging.WARNING)
+    timeframe, ohlcv = create_data(args.days)
+    positions = signal(ohlcv['close'].values)
+    for name, func in [('vectorized', run_vectorized),
+                       ('main_loop_sync', run_loop)]:
+        timeframe.set_state(dict(timeframe.get_state(),
+                                 current_date=timeframe.start_date()))
+        start = time.perf_counter()
+        func(timeframe, ohlcv, positions)
+        duration = time.perf_counter() - start
+        print('{:<24}{:>10.3f} s'.format(name, duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,32 @@
 import sys
 import os
+import importlib
 import importlib.util
-from btrccts.run import parse_params_and_execute_algorithm
-from btrccts.algorithm import AlgorithmBase  # noqa
-from unittest.mock import patch
 
 
 __all__ = ['AlgorithmBase', 'parse_params_and_execute_algorithm']
 
+# The exports are imported on first access, so importing btrccts does not
+# import ccxt and pandas
+_LAZY_EXPORTS = {
+    'AlgorithmBase': 'btrccts.algorithm',
+    'parse_params_and_execute_algorithm': 'btrccts.cli',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(
+            "module 'btrccts' has no attribute '{}'".format(name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
+
 
 # TODO: Test these functions
 def _load_algorithm_from_file(filepath):
@@ -19,6 +38,8 @@ def _load_algorithm_from_file(filepath):
 
 
 def _main():
+    from unittest.mock import patch
+    from btrccts.cli import parse_params_and_execute_algorithm
     if len(sys.argv) < 2:
         print('File to load needs to be first parameter')
         sys.exit(1)
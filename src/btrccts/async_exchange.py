@@ -1,4 +1,6 @@
 from ccxt.base.errors import InvalidOrder, BadRequest
+from btrccts.exchange import _stop_price
+from btrccts.watch import wait_for_date_after, wait_for_next_date
 
 
 class AsyncBacktestExchangeBase:
@@ -6,6 +8,11 @@ class AsyncBacktestExchangeBase:
     def __init__(self, config, exchange_backend):
         super().__init__(config=config)
         self._exchange_backend = exchange_backend
+        # Last date returned per watched stream and
+        # next order event per watched symbol
+        self._watch_dates = {}
+        self._watch_order_events = {}
+        self._watch_restore_count = exchange_backend.restore_count()
 
     def _check_has(self, name):
         if not self.has[name]:
@@ -35,6 +42,27 @@ class AsyncBacktestExchangeBase:
                            params={}):
         self._check_has('createOrder')
         await super().load_markets()
+        market = self._order_market(symbol, type)
+        return self._exchange_backend.create_order(
+            market=market, side=side, amount=amount, type=type, price=price,
+            stop_price=_stop_price(params))
+
+    async def create_orders(self, orders, params={}):
+        # orders: list of dicts with symbol, type, side, amount, price and
+        # params
+        self._check_has('createOrders')
+        await super().load_markets()
+        return self._exchange_backend.create_orders(orders=[{
+            'market': self._order_market(order.get('symbol'),
+                                         order.get('type')),
+            'type': order.get('type'),
+            'side': order.get('side'),
+            'amount': order.get('amount'),
+            'price': order.get('price'),
+            'stop_price': _stop_price(order.get('params', {})),
+        } for order in orders])
+
+    def _order_market(self, symbol, type):
         if type == 'market':
             if not self.has['createMarketOrder']:
                 raise NotImplementedError(
@@ -49,8 +77,7 @@ class AsyncBacktestExchangeBase:
         if market is None:
             raise InvalidOrder('Exchange: market does not exist: {}'.format(
                 symbol))
-        return self._exchange_backend.create_order(
-            market=market, side=side, amount=amount, type=type, price=price)
+        return market
 
     async def deposit(self, *args, **kwargs):
         self._check_has('deposit')
@@ -156,10 +183,9 @@ class AsyncBacktestExchangeBase:
         self._check_has('fetchTicker')
         return self._exchange_backend.fetch_ticker(symbol=symbol)
 
-    async def fetch_tickers(self, *args, **kwargs):
+    async def fetch_tickers(self, symbols=None, params={}):
         self._check_has('fetchTickers')
-        raise NotImplementedError('BacktestExchange does not support method '
-                                  'fetch_tickers')
+        return self._exchange_backend.fetch_tickers(symbols=symbols)
 
     async def fetch_time(self, *args, **kwargs):
         self._check_has('fetchTime')
@@ -206,6 +232,86 @@ class AsyncBacktestExchangeBase:
         raise NotImplementedError('BacktestExchange does not support method '
                                   'fetch_withdrawals')
 
+    # The watch methods emulate the ccxtpro methods: they wait for the next
+    # update of the stream. In backtesting, there is one update per date of
+    # the timeframe. If a watcher waits, the timeframe moves to the next
+    # date after the ready tasks ran, without returning from next_iteration.
+    # When the timeframe is finished, TimeframeFinished is raised and
+    # main_loop finishes.
+
+    def _check_restored(self):
+        # After the backend state was restored (e.g. to run a branch), the
+        # streams start again at the restored date
+        backend = self._exchange_backend
+        restore_count = backend.restore_count()
+        if restore_count != self._watch_restore_count:
+            self._watch_restore_count = restore_count
+            self._watch_dates = {}
+            count = backend.order_event_count()
+            self._watch_order_events = {
+                symbol: count for symbol in self._watch_order_events}
+
+    async def _watch_date(self, key):
+        self._check_restored()
+        date = await wait_for_date_after(
+            self._exchange_backend.timeframe(), self._watch_dates.get(key))
+        previous = self._watch_dates.get(key)
+        self._watch_dates[key] = date
+        return previous
+
+    async def watch_ohlcv(self, symbol, timeframe='1m', since=None,
+                          limit=None, params={}):
+        self._check_has('fetchOHLCV')
+        if timeframe not in self.timeframes:
+            raise BadRequest('Timeframe {} not supported by exchange'.format(
+                timeframe))
+        previous = await self._watch_date(('ohlcv', symbol, timeframe))
+        data = self._exchange_backend.fetch_ohlcv_update_dataframe(
+            symbol=symbol, timeframe=timeframe, pd_after=previous)
+        result = [[int(values.Index.value / 10**6),
+                   values.open,
+                   values.high,
+                   values.low,
+                   values.close,
+                   values.volume] for values in data.itertuples()]
+        if since is not None:
+            result = [candle for candle in result if candle[0] >= since]
+        if limit is not None:
+            result = result[-limit:]
+        return result
+
+    async def watch_ticker(self, symbol, params={}):
+        self._check_has('fetchTicker')
+        await self._watch_date(('ticker', symbol))
+        return self._exchange_backend.fetch_ticker(symbol=symbol)
+
+    async def watch_orders(self, symbol=None, since=None, limit=None,
+                           params={}):
+        self._check_has('fetchOrder')
+        self._check_restored()
+        backend = self._exchange_backend
+        start = self._watch_order_events.get(symbol)
+        if start is None:
+            # Like a subscription: only changes after the first call
+            start = backend.order_event_count()
+            self._watch_order_events[symbol] = start
+        while True:
+            # The account keeps the events, which are not read yet
+            backend.set_order_event_reader(
+                reader=self,
+                position=min(self._watch_order_events.values()))
+            orders, start = backend.fetch_order_events(start=start,
+                                                       symbol=symbol)
+            self._watch_order_events[symbol] = start
+            if since is not None:
+                orders = [o for o in orders if o['timestamp'] >= since]
+            if len(orders) > 0:
+                break
+            await wait_for_next_date(backend.timeframe())
+        if limit is not None:
+            orders = orders[-limit:]
+        return orders
+
     async def withdraw(self, *args, **kwargs):
         self._check_has('withdraw')
         raise NotImplementedError('BacktestExchange does not support method '
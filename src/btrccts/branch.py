@@ -0,0 +1,143 @@
+import logging
+import os
+import pickle
+import sys
+from copy import deepcopy
+from btrccts.checkpoint import get_algorithm_state, restore_algorithm_state
+from btrccts.context import BacktestContext
+from btrccts.event_loop import run_backtest_loop
+from btrccts.features import data_feature_store
+from btrccts.markets import MARKETS_DIR
+from btrccts.run import ExitReason, USER_DATA_DIR, _async_callable, \
+    _backtest_main_loop, _create_exchange_backends, _fetch_balances, \
+    load_ohlcvs
+from btrccts.timeframe import Timeframe
+
+
+def _start_forked(func, *args):
+    read_fd, write_fd = os.pipe()
+    # Flush, so buffered output is not written by parent and child
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid != 0:
+        os.close(write_fd)
+        return pid, read_fd
+    status = 0
+    try:
+        os.close(read_fd)
+        try:
+            payload = ('result', func(*args))
+        except BaseException as e:
+            payload = ('error', e)
+            status = 1
+        try:
+            data = pickle.dumps(payload)
+        except Exception as e:
+            data = pickle.dumps(('error', RuntimeError(
+                'Branch result cannot be pickled: {}'.format(e))))
+            status = 1
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(data)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def _collect_forked(pid, read_fd):
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    if len(data) == 0:
+        raise RuntimeError('Branch process exited without result')
+    kind, value = pickle.loads(data)
+    if kind == 'error':
+        raise value
+    return value
+
+
+def execute_branches(exchange_names, symbols, AlgorithmClass, args,
+                     branches, collect, start_balances,
+                     pd_start_date, pd_branch_date, pd_end_date, pd_interval,
+                     data_dir=USER_DATA_DIR, use_fork=None, processes=None,
+                     volume_share=None):
+    # The algorithm runs with args until pd_branch_date. For every entry in
+    # branches, a new algorithm is created with the entry as args and
+    # continues from the exact state at pd_branch_date until pd_end_date.
+    # The prefix is simulated only once. The state of the algorithm is passed
+    # to the branches, if it implements __getstate__ (see checkpoint).
+    # With os.fork, the branches run in parallel child processes, which share
+    # the loaded data copy-on-write. Otherwise the branches run one after
+    # another from an in-memory copy of the state.
+    # collect is called with the algorithm and the balances at the end of
+    # each branch, the results are returned in the order of branches.
+    if not pd_start_date <= pd_branch_date <= pd_end_date:
+        raise ValueError('Branch date needs to be between start and end date')
+    if use_fork is None:
+        use_fork = hasattr(os, 'fork')
+    if processes is None:
+        processes = os.cpu_count() or 1
+    logger = logging.getLogger(__package__)
+    ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                         exchange_names=exchange_names,
+                         symbols=symbols)
+    timeframe = Timeframe(pd_start_date=pd_start_date,
+                          pd_end_date=pd_end_date,
+                          pd_interval=pd_interval)
+    exchange_backends = _create_exchange_backends(
+        timeframe=timeframe, exchange_names=exchange_names,
+        ohlcvs=ohlcvs, start_balances=start_balances,
+        volume_share=volume_share)
+    context = BacktestContext(timeframe=timeframe,
+                              exchange_backends=exchange_backends,
+                              markets_dir=os.path.join(data_dir, MARKETS_DIR),
+                              feature_store=data_feature_store(data_dir))
+    main_loop = _backtest_main_loop(AlgorithmClass)
+
+    async def run_prefix():
+        algorithm = AlgorithmClass(context=context, args=args)
+        timeframe.set_end_date(pd_branch_date)
+        await main_loop(timeframe=timeframe, algorithm=algorithm,
+                        finish=False)
+        if not timeframe.finished():
+            raise ValueError('Algorithm stopped before the branch date')
+        result = (context.get_state(), get_algorithm_state(algorithm))
+        await _async_callable(algorithm.exit)(reason=ExitReason.STOPPED)
+        return result
+
+    # Timers of async algorithms use the simulated time
+    context_state, algorithm_state = run_backtest_loop(run_prefix(),
+                                                       timeframe=timeframe)
+    logger.info('Branching at {} into {} branches'
+                .format(timeframe.date(), len(branches)))
+
+    def run_branch(branch_args):
+        context.set_state(context_state)
+        timeframe.set_end_date(pd_end_date)
+
+        async def func():
+            algorithm = AlgorithmClass(context=context, args=branch_args)
+            restore_algorithm_state(algorithm, deepcopy(algorithm_state))
+            await main_loop(timeframe=timeframe, algorithm=algorithm)
+            return collect(algorithm=algorithm,
+                           balances=_fetch_balances(exchange_backends))
+        return run_backtest_loop(func(), timeframe=timeframe)
+
+    if not use_fork:
+        return [run_branch(branch_args) for branch_args in branches]
+    results = []
+    running = []
+    try:
+        for branch_args in branches:
+            if len(running) >= processes:
+                results.append(_collect_forked(*running.pop(0)))
+            running.append(_start_forked(run_branch, branch_args))
+        while len(running) > 0:
+            results.append(_collect_forked(*running.pop(0)))
+    finally:
+        # Do not leave child processes behind, if a branch failed
+        for pid, read_fd in running:
+            os.close(read_fd)
+            os.waitpid(pid, 0)
+    return results
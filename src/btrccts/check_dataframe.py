@@ -13,7 +13,8 @@ def _check_dataframe(ohlcvs, timeframe, needed_columns=['low', 'high']):
     except ValueError:
         raise ValueError('ohlcv needs to be in 1min format')
     try:
-        result = ohlcvs.astype(numpy.float64)
+        # Without a copy, backends with the same data share the memory
+        result = ohlcvs.astype(numpy.float64, copy=False)
         if not numpy.isfinite(result).values.all():
             raise ValueError('ohlcv needs to finite')
     except ValueError as e:
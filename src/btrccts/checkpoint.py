@@ -0,0 +1,114 @@
+import os
+import pickle
+
+CHECKPOINT_VERSION = 1
+
+
+def get_algorithm_state(algorithm):
+    # Algorithms opt into checkpoints by implementing __getstate__.
+    # The state should only contain picklable values, exchanges are created
+    # again by the algorithm on resume.
+    getstate = getattr(type(algorithm), '__getstate__', None)
+    if getstate is None or getstate is getattr(object, '__getstate__', None):
+        return None
+    return algorithm.__getstate__()
+
+
+def restore_algorithm_state(algorithm, state):
+    if state is None:
+        return
+    setstate = getattr(algorithm, '__setstate__', None)
+    if setstate is None:
+        algorithm.__dict__.update(state)
+    else:
+        setstate(state)
+
+
+class Checkpointer:
+
+    def __init__(self, path, context, algorithm, every=1000):
+        if every <= 0:
+            raise ValueError('Checkpoint: every needs to be positive')
+        self._path = path
+        self._context = context
+        self._algorithm = algorithm
+        self._every = every
+        self._iterations = 0
+        self._file = None
+        self._written_closed_orders = {}
+
+    def iteration_finished(self):
+        self._iterations += 1
+        if self._iterations % self._every == 0:
+            self.write()
+
+    def write(self):
+        # Checkpoints are appended to the file. Closed orders do not change
+        # anymore, so only the orders closed since the last checkpoint
+        # are written.
+        state = self._context.get_state(closed_orders=False)
+        closed_orders = self._context.closed_orders_since(
+            self._written_closed_orders)
+        for key, orders in closed_orders.items():
+            self._written_closed_orders[key] = \
+                self._written_closed_orders.get(key, 0) + len(orders)
+        record = {
+            'version': CHECKPOINT_VERSION,
+            'context': state,
+            'closed_orders': closed_orders,
+            'algorithm': get_algorithm_state(self._algorithm),
+        }
+        if self._file is None:
+            # The first checkpoint replaces an existing file atomically,
+            # so there is always a valid checkpoint on disk
+            tmp_path = self._path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+            self._file = open(self._path, 'ab')
+        else:
+            pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_checkpoint(path):
+    closed_orders = {}
+    record = None
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                next_record = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                # The last record is incomplete, if the process crashed
+                # while writing it
+                break
+            if next_record.get('version') != CHECKPOINT_VERSION:
+                raise ValueError('Checkpoint version is not supported')
+            record = next_record
+            for key, orders in record['closed_orders'].items():
+                closed_orders.setdefault(key, {}).update(orders)
+    if record is None:
+        raise ValueError('Checkpoint file contains no checkpoint')
+    state = record['context']
+    for key, backend_state in state['exchange_backends'].items():
+        backend_state['closed_orders'] = closed_orders.get(key, {})
+    return {'context': state, 'algorithm': record['algorithm']}
+
+
+def restore_context(context, timeframe, checkpoint):
+    timeframe_state = checkpoint['context']['timeframe']
+    if timeframe_state['start_date'] != timeframe.start_date() or \
+            timeframe_state['interval'] != timeframe.interval():
+        raise ValueError('Checkpoint does not match the timeframe')
+    end_date = timeframe.end_date()
+    context.set_state(checkpoint['context'])
+    # The end date can be changed when resuming
+    timeframe.set_end_date(end_date)
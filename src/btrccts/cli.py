@@ -0,0 +1,122 @@
+import appdirs
+import argparse
+import json
+import logging
+
+USER_CONFIG_DIR = appdirs.user_config_dir(__package__)
+USER_DATA_DIR = appdirs.user_data_dir(__package__)
+HELP_EPILOG = """
+Default config directory: {data}
+Default data directory: {config}
+""".format(config=USER_CONFIG_DIR, data=USER_DATA_DIR)
+
+
+def parse_params_and_execute_algorithm(AlgorithmClass):
+    parser = argparse.ArgumentParser(
+        epilog=HELP_EPILOG, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--start-date', default='',
+                        help='Date to start backtesting, ignored in live mode')
+    parser.add_argument('--end-date', default='2009-01-01',
+                        help='Date to end backtesting')
+    parser.add_argument('--interval', default='1m',
+                        help='Timedelta between each iteration')
+    parser.add_argument('--exchanges', default='',
+                        help='Exchange ids comma separated to load ohlcv')
+    parser.add_argument('--symbols', default='',
+                        help='Symbols (comma separated) to load ohlcv '
+                             'per exchange')
+    parser.add_argument('--data-directory', default=USER_DATA_DIR,
+                        help='directory where data is stored'
+                             ' (e.g. ohlcv data')
+    parser.add_argument('--config-directory', default=USER_CONFIG_DIR,
+                        help='directory where config is stored'
+                             ' (e.g. exchange parameters')
+    parser.add_argument('--auth-aliases', default='{}',
+                        help='Auth aliases for different exchange'
+                             ' config files')
+    parser.add_argument('--live', action='store_true',
+                        help='Trade live on exchanges')
+    parser.add_argument('--start-balances', default='{}',
+                        help='Balance at start (json): '
+                             '{"exchange": {"BTC": 3}}')
+    parser.add_argument('--checkpoint-file', default=None,
+                        help='File to periodically save the backtest state')
+    parser.add_argument('--checkpoint-every', default=1000, type=int,
+                        help='Number of iterations between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the backtest from the checkpoint file')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time the iterations and exchange calls and '
+                             'log a summary at exit')
+    parser.add_argument('--metrics-file', default=None,
+                        help='File to write metrics to after every '
+                             'iteration (prometheus text format)')
+    parser.add_argument('--metrics-port', default=None, type=int,
+                        help='Serve metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--volume-share', default=None, type=float,
+                        help='Fill limit orders with at most this share of '
+                             'the volume of each candle')
+    AlgorithmClass.configure_argparser(parser)
+    args = parser.parse_args()
+    # Imported after parsing, so --help and invalid arguments are fast
+    import pandas
+    from ccxt.base.errors import NotSupported
+    from ccxt.base.exchange import Exchange
+    from btrccts import run
+    logger = logging.getLogger(__package__)
+
+    def split_parameters(p):
+        if p == '':
+            return []
+        return p.split(',')
+
+    exchange_names = split_parameters(args.exchanges)
+    symbols = split_parameters(args.symbols)
+    if not args.live:
+        if len(exchange_names) == 0:
+            logger.warning('No exchanges specified, do not load ohlcv')
+        if len(symbols) == 0:
+            logger.warning('No symbols specified, load all ohlcvs per each '
+                           'exchange. This can lead to long start times')
+    try:
+        pd_interval = pandas.Timedelta(
+            Exchange.parse_timeframe(args.interval), unit='s')
+    except (NotSupported, ValueError):
+        raise ValueError('Interval is not valid')
+    auth_aliases = {}
+    if args.live:
+        if args.start_date != '':
+            raise ValueError('Start date cannot be set in live mode')
+        if args.start_balances != '{}':
+            raise ValueError('Start balance cannot be set in live mode')
+        pd_start_date = pandas.Timestamp.now(tz='UTC').floor(pd_interval)
+        start_balances = None
+        auth_aliases = json.loads(args.auth_aliases)
+    else:
+        pd_start_date = pandas.to_datetime(args.start_date, utc=True)
+        start_balances = json.loads(args.start_balances)
+    pd_end_date = pandas.to_datetime(args.end_date, utc=True)
+    if pandas.isnull(pd_start_date):
+        raise ValueError('Start date is not valid')
+    if pandas.isnull(pd_end_date):
+        raise ValueError('End date is not valid')
+
+    return run.execute_algorithm(exchange_names=exchange_names,
+                                 symbols=symbols,
+                                 pd_start_date=pd_start_date,
+                                 pd_end_date=pd_end_date,
+                                 pd_interval=pd_interval,
+                                 conf_dir=args.config_directory,
+                                 data_dir=args.data_directory,
+                                 AlgorithmClass=AlgorithmClass,
+                                 args=args,
+                                 auth_aliases=auth_aliases,
+                                 live=args.live,
+                                 start_balances=start_balances,
+                                 checkpoint_file=args.checkpoint_file,
+                                 checkpoint_every=args.checkpoint_every,
+                                 resume=args.resume,
+                                 profile=args.profile,
+                                 metrics_file=args.metrics_file,
+                                 metrics_port=args.metrics_port,
+                                 volume_share=args.volume_share)
@@ -1,20 +1,43 @@
+import asyncio
 import ccxt
-import ccxt.async_support
 import pandas
 import os
 import json
 import functools
+import importlib
 import logging
+import threading
+import weakref
 from collections import defaultdict
 from enum import auto, Enum
 from btrccts.exchange import BacktestExchangeBase
 from btrccts.async_exchange import AsyncBacktestExchangeBase
 from btrccts.exchange_backend import ExchangeBackend
-try:
-    import ccxtpro
-except ImportError:
-    ccxtpro = None
-    pass
+from btrccts.indicators import BacktestIndicators, LiveIndicators
+from btrccts.markets import load_market_snapshot, market_config_digest
+from btrccts.window import LiveWindows
+
+# ccxtpro is imported, when the first live async exchange is created
+_NOT_IMPORTED = object()
+ccxtpro = _NOT_IMPORTED
+
+
+def _import_ccxtpro():
+    global ccxtpro
+    if ccxtpro is _NOT_IMPORTED:
+        try:
+            ccxtpro = importlib.import_module('ccxtpro')
+        except ImportError:
+            ccxtpro = None
+    return ccxtpro
+
+
+def _import_ccxt(async_ccxt):
+    # The async version of ccxt imports aiohttp, it is only imported,
+    # if an async exchange is created
+    if async_ccxt:
+        return importlib.import_module('ccxt.async_support')
+    return ccxt
 
 
 class StopException(BaseException):
@@ -27,32 +50,198 @@ class ContextState(Enum):
     LIVE = auto()
 
 
+# Attributes of ccxt exchanges, which hold the parsed markets
+MARKET_ATTRIBUTES = ['markets', 'markets_by_id', 'symbols', 'ids',
+                     'currencies', 'currencies_by_id', 'codes',
+                     'baseCurrencies', 'quoteCurrencies']
+
+_backtest_exchange_classes = {}
+
+
+def backtest_exchange_class(exchange_id, async_ccxt=False):
+    # The classes are created once per exchange and flavour, so all
+    # backtest exchanges of a process share them
+    key = (exchange_id, async_ccxt)
+    BacktestExchange = _backtest_exchange_classes.get(key)
+    if BacktestExchange is not None:
+        return BacktestExchange
+    use_ccxt = _import_ccxt(async_ccxt)
+    base = BacktestExchangeBase
+    if async_ccxt:
+        base = AsyncBacktestExchangeBase
+    if exchange_id not in use_ccxt.exchanges:
+        raise ValueError('Unknown exchange: {}'.format(exchange_id))
+    exchange = getattr(use_ccxt, exchange_id)
+
+    class BacktestExchange(base, exchange):
+        pass
+
+    _backtest_exchange_classes[key] = BacktestExchange
+    return BacktestExchange
+
+
+class MarketCache:
+
+    # Parsed markets, which are shared by the exchanges of all contexts
+    # using this cache, so the markets are parsed once per exchange id and
+    # market config (markets.MARKET_CONFIG_KEYS, e.g. options.defaultType).
+    # The markets are not copied: algorithms must not modify them.
+    # The exchanges, which may load the markets, are only weakly
+    # referenced, so exchanges which never load them are not kept alive.
+
+    def __init__(self):
+        self._markets = {}
+        self._sources = defaultdict(list)
+
+    def apply(self, exchange_id, config, instance):
+        # Returns False, if no exchange with this id and market config has
+        # loaded markets yet
+        key = _market_key(exchange_id, config)
+        markets = self._markets.get(key)
+        if markets is None:
+            markets = self._from_sources(key)
+            if markets is None:
+                return False
+        for name, value in markets.items():
+            setattr(instance, name, value)
+        return True
+
+    def add(self, exchange_id, config, instance):
+        # The markets of instance are used, as soon as they are loaded
+        key = _market_key(exchange_id, config)
+        if key not in self._markets:
+            self._sources[key].append(weakref.ref(instance))
+            self._from_sources(key)
+
+    def _from_sources(self, key):
+        sources = []
+        for ref in self._sources.pop(key, []):
+            instance = ref()
+            if instance is None:
+                continue
+            if instance.markets:
+                markets = {name: getattr(instance, name)
+                           for name in MARKET_ATTRIBUTES}
+                self._markets[key] = markets
+                return markets
+            sources.append(ref)
+        if len(sources) > 0:
+            self._sources[key] = sources
+        return None
+
+
+def _market_key(exchange_id, config):
+    return exchange_id, market_config_digest(config)
+
+
 class BacktestContext:
 
-    def __init__(self, timeframe, exchange_backends={}):
+    def __init__(self, timeframe, exchange_backends={}, profiler=None,
+                 markets_dir=None, market_cache=None, feature_store=None):
+        self._profiler = profiler
+        self._exchange_classes = {}
+        self._market_cache = market_cache
+        # Markets and currencies are read from snapshots in markets_dir
+        # instead of loading them from the exchange
+        self._markets_dir = markets_dir
+        self._market_snapshots = {}
         self._exchange_backends = defaultdict(functools.partial(
             ExchangeBackend, timeframe=timeframe))
         for key in exchange_backends:
             self._exchange_backends[key] = exchange_backends[key]
         self._timeframe = timeframe
+        # Indicators of ohlcv files are stored in the feature store
+        self._indicators = BacktestIndicators(
+            timeframe=timeframe, get_ohlcv=self._indicator_ohlcv,
+            feature_store=feature_store)
 
     def create_exchange(self, exchange_id, config={}, async_ccxt=False):
-        use_ccxt = ccxt
-        base = BacktestExchangeBase
-        if async_ccxt:
-            use_ccxt = ccxt.async_support
-            base = AsyncBacktestExchangeBase
-        if exchange_id not in use_ccxt.exchanges:
-            raise ValueError('Unknown exchange: {}'.format(exchange_id))
-        exchange = getattr(use_ccxt, exchange_id)
-
-        class BacktestExchange(base, exchange):
-            pass
-
+        key = (exchange_id, async_ccxt)
+        BacktestExchange = self._exchange_classes.get(key)
+        if BacktestExchange is None:
+            BacktestExchange = backtest_exchange_class(exchange_id,
+                                                       async_ccxt=async_ccxt)
+            if self._profiler is not None:
+                BacktestExchange = self._profiler.instrument_exchange_class(
+                    BacktestExchange)
+            self._exchange_classes[key] = BacktestExchange
         backend = self._exchange_backends[exchange_id]
         instance = BacktestExchange(config=config, exchange_backend=backend)
+        cache = self._market_cache
+        if cache is not None and cache.apply(exchange_id, config, instance):
+            return instance
+        snapshot = self._market_snapshot(exchange_id, config)
+        if snapshot is not None:
+            instance.set_markets(snapshot['markets'], snapshot['currencies'])
+        if cache is not None:
+            cache.add(exchange_id, config, instance)
         return instance
 
+    def _market_snapshot(self, exchange_id, config):
+        # Exchanges with another market config use another snapshot
+        if self._markets_dir is None:
+            return None
+        key = _market_key(exchange_id, config)
+        if key not in self._market_snapshots:
+            self._market_snapshots[key] = load_market_snapshot(
+                markets_dir=self._markets_dir, exchange_id=exchange_id,
+                config=config)
+        return self._market_snapshots[key]
+
+    def _indicator_ohlcv(self, exchange_id, symbol):
+        return self._exchange_backends[exchange_id].ohlcv_dataframe(symbol)
+
+    def register_indicator(self, exchange_id, symbol, name, func,
+                           warmup=None):
+        # func gets the 1 minute ohlcv dataframe and returns one value per
+        # candle, it must only use the current and earlier candles
+        self._indicators.register(exchange_id, symbol, name, func,
+                                  warmup=warmup)
+
+    def indicator(self, exchange_id, symbol, name):
+        return self._indicators.get(exchange_id, symbol, name)
+
+    def window(self, exchange_id, symbol, n, fields=None):
+        return self._exchange_backends[exchange_id].ohlcv_window(
+            symbol, n, fields)
+
+    # Async versions for async algorithms, which need to work in both modes
+
+    async def register_indicator_async(self, exchange_id, symbol, name, func,
+                                       warmup=None):
+        self.register_indicator(exchange_id, symbol, name, func,
+                                warmup=warmup)
+
+    async def indicator_async(self, exchange_id, symbol, name):
+        return self.indicator(exchange_id, symbol, name)
+
+    async def window_async(self, exchange_id, symbol, n, fields=None):
+        return self.window(exchange_id, symbol, n, fields)
+
+    def panel_symbols(self, exchange_id):
+        return self._exchange_backends[exchange_id].panel_symbols()
+
+    def panel(self, exchange_id, n=None, fields=None):
+        return self._exchange_backends[exchange_id].ohlcv_panel(n, fields)
+
+    def get_state(self, closed_orders=True):
+        return {
+            'timeframe': self._timeframe.get_state(),
+            'exchange_backends': {
+                key: backend.get_state(closed_orders=closed_orders)
+                for key, backend in self._exchange_backends.items()},
+        }
+
+    def closed_orders_since(self, counts):
+        return {
+            key: backend.closed_orders_since(counts.get(key, 0))
+            for key, backend in self._exchange_backends.items()}
+
+    def set_state(self, state):
+        self._timeframe.set_state(state['timeframe'])
+        for key, backend_state in state['exchange_backends'].items():
+            self._exchange_backends[key].set_state(backend_state)
+
     def date(self):
         return self._timeframe.date()
 
@@ -68,18 +257,29 @@ class BacktestContext:
 
 class LiveContext:
 
-    def __init__(self, timeframe, conf_dir, auth_aliases={}):
+    def __init__(self, timeframe, conf_dir, auth_aliases={}, profiler=None,
+                 metrics=None):
         self._timeframe = timeframe
+        self._profiler = profiler
+        self._metrics = metrics
         self._auth_aliases = auth_aliases
         self._conf_dir = conf_dir
+        self._indicators = LiveIndicators(
+            fetch_ohlcv=self._fetch_ohlcv, now=self.real_date)
+        self._windows = LiveWindows(fetch_ohlcv=self._fetch_ohlcv,
+                                    now=self.real_date)
+        self._ohlcv_exchanges = {}
+        # Indicators and windows are updated in executor threads by the
+        # async methods
+        self._fetch_lock = threading.Lock()
 
     def create_exchange(self, exchange_id, config={}, async_ccxt=False):
-        use_ccxt = ccxt
+        use_ccxt = _import_ccxt(async_ccxt)
         if async_ccxt:
-            use_ccxt = ccxt.async_support
-            if ccxtpro is not None:
-                if hasattr(ccxtpro, exchange_id):
-                    use_ccxt = ccxtpro
+            pro = _import_ccxtpro()
+            if pro is not None:
+                if hasattr(pro, exchange_id):
+                    use_ccxt = pro
         if exchange_id not in use_ccxt.exchanges:
             raise ValueError('Unknown exchange: {}'.format(exchange_id))
         exchange = getattr(use_ccxt, exchange_id)
@@ -94,8 +294,53 @@ class LiveContext:
             logger.warning('Config file for exchange {} does not exist: {}'
                            .format(exchange_id, config_file))
         exchange_config.update(config)
+        if self._profiler is not None:
+            exchange = self._profiler.instrument_exchange_class(exchange)
+        if self._metrics is not None:
+            exchange = self._metrics.instrument_exchange_class(exchange)
         return exchange(exchange_config)
 
+    def _fetch_ohlcv(self, exchange_id, symbol, since, limit):
+        exchange = self._ohlcv_exchanges.get(exchange_id)
+        if exchange is None:
+            exchange = self.create_exchange(exchange_id)
+            self._ohlcv_exchanges[exchange_id] = exchange
+        return exchange.fetch_ohlcv(symbol, '1m', since=since, limit=limit)
+
+    def register_indicator(self, exchange_id, symbol, name, func,
+                           warmup=None):
+        with self._fetch_lock:
+            self._indicators.register(exchange_id, symbol, name, func,
+                                      warmup=warmup)
+
+    def indicator(self, exchange_id, symbol, name):
+        with self._fetch_lock:
+            return self._indicators.get(exchange_id, symbol, name)
+
+    def window(self, exchange_id, symbol, n, fields=None):
+        with self._fetch_lock:
+            return self._windows.get(exchange_id, symbol, n, fields)
+
+    # The candles are fetched with sync exchanges, the async versions run
+    # in an executor, so the event loop is not blocked
+
+    async def _in_executor(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(func, *args, **kwargs))
+
+    async def register_indicator_async(self, exchange_id, symbol, name, func,
+                                       warmup=None):
+        await self._in_executor(self.register_indicator, exchange_id, symbol,
+                                name, func, warmup=warmup)
+
+    async def indicator_async(self, exchange_id, symbol, name):
+        return await self._in_executor(self.indicator, exchange_id, symbol,
+                                       name)
+
+    async def window_async(self, exchange_id, symbol, n, fields=None):
+        return await self._in_executor(self.window, exchange_id, symbol, n,
+                                       fields)
+
     def date(self):
         return self._timeframe.date()
 
@@ -0,0 +1,111 @@
+import asyncio
+import selectors
+import time
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        # Without timers (timeout is None), wait for real io
+        # e.g. from run_in_executor
+        if timeout is None or timeout <= 0:
+            return super().select(timeout)
+        if self.loop.waits_for_io():
+            # Real io or executor jobs are in flight: wait for them in real
+            # time, the clock moves forward with the real time
+            start = time.monotonic()
+            events = super().select(timeout)
+            self.loop.advance_time(min(time.monotonic() - start, timeout))
+            return events
+        events = super().select(0)
+        if len(events) == 0:
+            # Nothing to do until the next timer: jump to it
+            self.loop.advance_time(timeout)
+        return events
+
+
+class BacktestEventLoop(asyncio.SelectorEventLoop):
+
+    # Event loop, which uses the simulated time of the timeframe.
+    # The clock starts at the current date of the timeframe and moves
+    # forward with it. If the loop would wait for a timer (asyncio.sleep,
+    # asyncio.wait_for, ...), the clock jumps to the timer instead.
+    # The clock never goes backwards, even if a sleep goes past the next
+    # date of the timeframe.
+    # While sockets are registered or executor jobs are running, the loop
+    # waits in real time, because their results can not be simulated.
+
+    def __init__(self, timeframe):
+        selector = _VirtualTimeSelector()
+        super().__init__(selector=selector)
+        selector.loop = self
+        # The self pipe of the loop is no real io
+        self._self_pipe_fds = set(selector.get_map())
+        self._executor_jobs = set()
+        self._timeframe = timeframe
+        self._clock = self._timeframe_time()
+        # Timers are due, if they are before time() + resolution. The
+        # clock does not tick by itself, so the resolution needs to be bigger
+        # than the float precision of unix timestamps.
+        self._clock_resolution = 1e-6
+
+    def _timeframe_time(self):
+        return self._timeframe.date().value / 10**9
+
+    def time(self):
+        timeframe_time = self._timeframe_time()
+        if timeframe_time > self._clock:
+            self._clock = timeframe_time
+        return self._clock
+
+    def advance_time(self, seconds):
+        self._clock = self.time() + seconds
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._executor_jobs.add(future)
+        future.add_done_callback(self._executor_jobs.discard)
+        return future
+
+    def waits_for_io(self):
+        if len(self._executor_jobs) > 0:
+            return True
+        fd_map = self._selector.get_map()
+        return fd_map is not None and \
+            any(fd not in self._self_pipe_fds for fd in fd_map)
+
+
+def _cancel_all_tasks(loop):
+    tasks = asyncio.all_tasks(loop)
+    if len(tasks) == 0:
+        return
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            loop.call_exception_handler({
+                'message': 'unhandled exception during shutdown',
+                'exception': task.exception(),
+                'task': task,
+            })
+
+
+def run_backtest_loop(coro, timeframe):
+    # Like asyncio.run, but with a BacktestEventLoop
+    loop = BacktestEventLoop(timeframe=timeframe)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        try:
+            _cancel_all_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -1,6 +1,11 @@
 from ccxt.base.errors import InvalidOrder, BadRequest
 
 
+def _stop_price(params):
+    # Stop market and stop limit orders use the unified ccxt params
+    return params.get('stopPrice', params.get('triggerPrice'))
+
+
 class BacktestExchangeBase:
 
     def __init__(self, config, exchange_backend):
@@ -34,6 +39,27 @@ class BacktestExchangeBase:
     def create_order(self, symbol, type, side, amount, price=None, params={}):
         self._check_has('createOrder')
         super().load_markets()
+        market = self._order_market(symbol, type)
+        return self._exchange_backend.create_order(
+            market=market, side=side, amount=amount, type=type, price=price,
+            stop_price=_stop_price(params))
+
+    def create_orders(self, orders, params={}):
+        # orders: list of dicts with symbol, type, side, amount, price and
+        # params
+        self._check_has('createOrders')
+        super().load_markets()
+        return self._exchange_backend.create_orders(orders=[{
+            'market': self._order_market(order.get('symbol'),
+                                         order.get('type')),
+            'type': order.get('type'),
+            'side': order.get('side'),
+            'amount': order.get('amount'),
+            'price': order.get('price'),
+            'stop_price': _stop_price(order.get('params', {})),
+        } for order in orders])
+
+    def _order_market(self, symbol, type):
         if type == 'market':
             if not self.has['createMarketOrder']:
                 raise NotImplementedError(
@@ -48,8 +74,7 @@ class BacktestExchangeBase:
         if market is None:
             raise InvalidOrder('Exchange: market does not exist: {}'.format(
                 symbol))
-        return self._exchange_backend.create_order(
-            market=market, side=side, amount=amount, type=type, price=price)
+        return market
 
     def deposit(self, *args, **kwargs):
         self._check_has('deposit')
@@ -155,10 +180,9 @@ class BacktestExchangeBase:
         self._check_has('fetchTicker')
         return self._exchange_backend.fetch_ticker(symbol=symbol)
 
-    def fetch_tickers(self, *args, **kwargs):
+    def fetch_tickers(self, symbols=None, params={}):
         self._check_has('fetchTickers')
-        raise NotImplementedError('BacktestExchange does not support method '
-                                  'fetch_tickers')
+        return self._exchange_backend.fetch_tickers(symbols=symbols)
 
     def fetch_time(self, *args, **kwargs):
         self._check_has('fetchTime')
@@ -1,6 +1,9 @@
+import numpy
 import pandas
+import weakref
 from ccxt.base.exchange import Exchange
-from ccxt.base.errors import BadRequest, InvalidOrder, OrderNotFound
+from ccxt.base.errors import BadRequest, InsufficientFunds, InvalidOrder, \
+    OrderNotFound
 from collections import defaultdict
 from copy import deepcopy
 from decimal import Decimal
@@ -9,27 +12,91 @@ from btrccts.convert_float import _convert_float_or_raise, _convert_float
 from btrccts.balance import Balance
 
 DECIMAL_ONE = Decimal('1')
+# Market orders are filled a little worse than the current high/low
+MARKET_ORDER_FACTOR = Decimal('0.0015')
 
 
 class ExchangeAccount:
 
-    def __init__(self, timeframe, balances={}, ohlcvs={}):
+    def __init__(self, timeframe, balances={}, ohlcvs={}, volume_share=None):
         self._timeframe = timeframe
         self._start_balances = defaultdict(Balance)
         for key in balances:
             self._start_balances[key] = Balance(balances[key])
         self._balances = self._start_balances.copy()
+        # Limit orders are filled with at most volume_share of the volume of
+        # each candle, without volume_share they are filled all at once
+        needed_columns = ['low', 'high']
+        if volume_share is not None:
+            if not 0 < volume_share <= 1:
+                raise ValueError('ExchangeAccount: volume share needs to be '
+                                 'between 0 and 1')
+            needed_columns.append('volume')
+        self._volume_share = volume_share
         self._ohlcvs = {}
         for key in ohlcvs:
-            self._ohlcvs[key] = _check_dataframe(ohlcvs[key], timeframe)
+            self._ohlcvs[key] = _check_dataframe(ohlcvs[key], timeframe,
+                                                 needed_columns)
+        # _ohlcvs gets reduced while the timeframe moves forward,
+        # keep the complete data to be able to go back with set_state
+        self._complete_ohlcvs = self._ohlcvs.copy()
         self._last_order_id = 0
         self._open_orders = {}
         self._closed_orders = {}
+        # Ids of the closed orders in the order they were closed, so the
+        # recently closed orders can be read without iterating all of them
+        self._closed_order_ids = []
         self._private_order_info = {}
         self._next_private_order_to_update = None
+        # Ids of created, filled and canceled orders, for watch_orders.
+        # Events are numbered from the start of the account, the events
+        # before _order_events_start are not needed by any reader anymore.
+        self._order_events = []
+        self._order_events_start = 0
+        self._order_event_readers = weakref.WeakKeyDictionary()
+        # Number of set_state calls, readers of the streams start again
+        # after a restore
+        self._restore_count = 0
+
+    def get_state(self, closed_orders=True):
+        state = {
+            'balances': deepcopy(self._balances),
+            'last_order_id': self._last_order_id,
+            'open_orders': deepcopy(self._open_orders),
+            'private_order_info': deepcopy(self._private_order_info),
+        }
+        if closed_orders:
+            # Closed orders are not changed anymore, so they can be shared
+            state['closed_orders'] = self._closed_orders.copy()
+        return state
+
+    def closed_orders_since(self, count):
+        # Returns the (id, order) pairs of the orders closed after the
+        # first count closed orders
+        return [(id, self._closed_orders[id])
+                for id in self._closed_order_ids[count:]]
+
+    def set_state(self, state):
+        self._balances = deepcopy(state['balances'])
+        self._last_order_id = state['last_order_id']
+        self._open_orders = deepcopy(state['open_orders'])
+        self._closed_orders = state['closed_orders'].copy()
+        self._closed_order_ids = list(self._closed_orders)
+        self._private_order_info = deepcopy(state['private_order_info'])
+        self._ohlcvs = self._complete_ohlcvs.copy()
+        # The events of the replaced state are dropped, the numbering
+        # continues
+        self._order_events_start = self.order_event_count()
+        self._order_events = []
+        self._restore_count += 1
+        self._update_next_private_order_to_update()
+
+    def restore_count(self):
+        return self._restore_count
 
     def _move_to_closed_orders(self, id):
         self._closed_orders[id] = self._open_orders[id]
+        self._closed_order_ids.append(id)
         del self._open_orders[id]
         del self._private_order_info[id]
 
@@ -55,18 +122,35 @@ class ExchangeAccount:
             timestamp = int(fillable_date.value / 10e5)
             order = self._open_orders[order_id]
 
-            amount = order['amount']
+            fills = private_order.get('fills')
+            if fills is None:
+                amount = order['remaining']
+            else:
+                # Partial fill of the fill schedule
+                _, amount = fills.pop(0)
             price = private_order['price']
             base = private_order['base']
             quote = private_order['quote']
             buy = private_order['buy']
             fee_percentage = private_order['fee_percentage']
 
-            self._remove_used_balance(price, amount, base, quote, buy)
-            self._update_balance(price, amount, base, quote, buy,
-                                 fee_percentage)
-            self._fill_order(order, buy, price, timestamp, fee_percentage)
-            self._move_to_closed_orders(order_id)
+            self._remove_used_balance(private_order['reserved_price'], amount,
+                                      base, quote, buy)
+            try:
+                self._update_balance(price, amount, base, quote, buy,
+                                     fee_percentage)
+            except InsufficientFunds:
+                # Stop market orders can cost more than reserved
+                order['status'] = 'canceled'
+            else:
+                self._fill_order(order, buy, price, timestamp,
+                                 fee_percentage, amount)
+            if order['status'] == 'open':
+                private_order['fillable_date'] = fills[0][0] if fills \
+                    else None
+            else:
+                self._move_to_closed_orders(order_id)
+            self._add_order_event(order_id)
 
             self._update_next_private_order_to_update()
 
@@ -94,29 +178,92 @@ class ExchangeAccount:
                 'status': 'canceled',
             })
             private = self._private_order_info[id]
-            self._remove_used_balance(amount=open_order['amount'],
-                                      price=private['price'],
+            self._remove_used_balance(amount=open_order['remaining'],
+                                      price=private['reserved_price'],
                                       base=private['base'],
                                       quote=private['quote'],
                                       buy=private['buy'])
             self._move_to_closed_orders(id)
+            self._add_order_event(id)
             if private == self._next_private_order_to_update:
                 self._update_next_private_order_to_update()
             return {'id': id,
                     'info': {}}
 
-    def create_order(self, market, type, price, side, amount):
+    def create_order(self, market, type, price, side, amount,
+                     stop_price=None):
+        # Orders with stop_price are stop market or stop limit orders
         self._update_orders()
-        type_market = False
-        type_limit = False
+        order = self._check_order(market=market, type=type, price=price,
+                                  side=side, amount=amount,
+                                  stop_price=stop_price)
+        self._last_order_id += 1
+        order_id = str(self._last_order_id)
+        self._reserve_balance(order)
+        fill = (None, None, None)
+        if not order['fill_now']:
+            fill = self._pending_fills(order['symbol'], [order])[0]
+        result = self._add_order(order_id, order, *fill)
+        self._update_next_private_order_to_update()
+        return result
+
+    def create_orders(self, orders):
+        # All orders are checked and the balances of all orders are
+        # reserved, before an order is created. If one order fails, no
+        # order is created.
+        self._update_orders()
+        checked = [self._check_order(market=order.get('market'),
+                                     type=order.get('type'),
+                                     price=order.get('price'),
+                                     side=order.get('side'),
+                                     amount=order.get('amount'),
+                                     stop_price=order.get('stop_price'))
+                   for order in orders]
+        currencies = set()
+        for order in checked:
+            currencies.update([order['base'], order['quote']])
+        saved_balances = {currency: deepcopy(self._balances[currency])
+                          for currency in currencies
+                          if currency in self._balances}
+        try:
+            for order in checked:
+                self._reserve_balance(order)
+        except Exception:
+            for currency in currencies:
+                if currency in saved_balances:
+                    self._balances[currency] = saved_balances[currency]
+                else:
+                    self._balances.pop(currency, None)
+            raise
+        fills = [(None, None, None)] * len(checked)
+        symbols = {order['symbol'] for order in checked
+                   if not order['fill_now']}
+        for symbol in symbols:
+            indices = [i for i, order in enumerate(checked)
+                       if not order['fill_now'] and
+                       order['symbol'] == symbol]
+            symbol_fills = self._pending_fills(
+                symbol, [checked[i] for i in indices])
+            for i, fill in zip(indices, symbol_fills):
+                fills[i] = fill
+        result = []
+        for order, fill in zip(checked, fills):
+            self._last_order_id += 1
+            result.append(self._add_order(str(self._last_order_id), order,
+                                          *fill))
+        self._update_next_private_order_to_update()
+        return result
+
+    def _check_order(self, market, type, price, side, amount,
+                     stop_price=None):
+        # Raises, if the order is not valid. Returns the converted values
+        # of the order and the price of market orders
         if type == 'market':
             if price is not None:
                 raise InvalidOrder(
                     'ExchangeAccount: market order has no price')
-            type_market = True
         elif type == 'limit':
             price = _convert_float_or_raise(price, 'ExchangeAccount: price')
-            type_limit = True
             if price <= 0:
                 raise BadRequest('ExchangeAccount: price needs to be positive')
         else:
@@ -142,80 +289,144 @@ class ExchangeAccount:
             raise BadRequest('ExchangeAccount: market has no base')
         if quote is None:
             raise BadRequest('ExchangeAccount: market has no quote')
+        if stop_price is not None:
+            stop_price = _convert_float_or_raise(
+                stop_price, 'ExchangeAccount: stop price')
+            if stop_price <= 0:
+                raise BadRequest(
+                    'ExchangeAccount: stop price needs to be positive')
 
-        self._last_order_id += 1
-        order_id = str(self._last_order_id)
+        if stop_price is not None:
+            if type == 'market':
+                fee_percentage = market.get('taker', 0)
+                # The fill price is only known, when the order is
+                # triggered
+                reserved_price = self._stop_market_price(
+                    buy, stop_price, stop_price, stop_price)
+            else:
+                fee_percentage = market.get('maker', 0)
+                reserved_price = price
+        elif type == 'market':
+            # Determinie the price of the market order
+            # We could use the next low/high to fill the order, but then we
+            # need to wait for the next date to fill the order, otherwise we
+            # would introduce a possibility to see the future price
+            # (Look-Ahead Bias)
+            # If we wait for the next date, we would return a market order that
+            # is pending, but this should never happen in reality
+            # Maybe the factor should depend on the volume
+            date = self._timeframe.date()
+            if buy:
+                price = ((1 + MARKET_ORDER_FACTOR) *
+                         _convert_float(ohlcv['high'][date]))
+            else:
+                price = ((1 - MARKET_ORDER_FACTOR) *
+                         _convert_float(ohlcv['low'][date]))
+            fee_percentage = market.get('taker', 0)
+            reserved_price = price
+        else:
+            # TODO Probably use taker fee, if the order can be filled now
+            fee_percentage = market.get('maker', 0)
+            reserved_price = price
+        fee_percentage = _convert_float_or_raise(fee_percentage,
+                                                 'ExchangeAccount: fee')
+        return {
+            'symbol': symbol,
+            'type': type,
+            'side': side,
+            'buy': buy,
+            'price': price,
+            'reserved_price': reserved_price,
+            'stop_price': stop_price,
+            'fill_now': type == 'market' and stop_price is None,
+            'amount': amount,
+            'base': base,
+            'quote': quote,
+            'fee_percentage': fee_percentage,
+        }
+
+    def _stop_market_price(self, buy, stop_price, low, high):
+        # Filled a little worse than the stop price, or than the low (high)
+        # of the candle, if the price jumped over the stop price
+        if buy:
+            return (1 + MARKET_ORDER_FACTOR) * max(stop_price, low)
+        return (1 - MARKET_ORDER_FACTOR) * min(stop_price, high)
+
+    def _reserve_balance(self, order):
+        # Market orders are filled, other orders use the balance until they
+        # are filled or canceled
+        amount = order['amount']
+        if order['fill_now']:
+            self._update_balance(order['price'], amount, order['base'],
+                                 order['quote'], order['buy'],
+                                 order['fee_percentage'])
+            return
+        price = order['reserved_price']
+        if order['buy']:
+            self._balances[order['quote']].change_used(price * amount)
+        else:
+            self._balances[order['base']].change_used(amount)
+
+    def _add_order(self, order_id, order, fillable_date=None,
+                   fill_price=None, fill_schedule=None):
+        # The balance of the order needs to be reserved
+        buy = order['buy']
         date = self._timeframe.date()
         timestamp = int(date.value / 10e5)
-        order = {
+        result = {
             'info': {},
             'id': order_id,
             'timestamp': timestamp,
             'datetime': Exchange.iso8601(timestamp),
             'lastTradeTimestamp': None,
-            'symbol': symbol,
-            'type': type,
-            'side': side,
+            'symbol': order['symbol'],
+            'type': order['type'],
+            'side': order['side'],
             'price': None,
-            'amount': amount,
+            'amount': order['amount'],
             'cost': None,
             'average': None,
             'filled': 0,
-            'remaining': amount,
+            'remaining': order['amount'],
             'status': 'open',
-            'fee': {'currency': base if buy else quote,
+            'fee': {'currency': order['base'] if buy else order['quote'],
                     'cost': None,
                     'rate': None},
             'trades': None,
         }
-
-        if type_market:
-            # Determinie the price of the market order
-            # We could use the next low/high to fill the order, but then we
-            # need to wait for the next date to fill the order, otherwise we
-            # would introduce a possibility to see the future price
-            # (Look-Ahead Bias)
-            # If we wait for the next date, we would return a market order that
-            # is pending, but this should never happen in reality
-            # Maybe the factor should depend on the volume
-            factor = Decimal('0.0015')
-            if buy:
-                price = (1 + factor) * _convert_float(ohlcv['high'][date])
-            else:
-                price = (1 - factor) * _convert_float(ohlcv['low'][date])
-            fee_percentage = market.get('taker', 0)
-            fee_percentage = _convert_float_or_raise(fee_percentage,
-                                                     'ExchangeAccount: fee')
-            self._update_balance(price, amount, base, quote, buy,
-                                 fee_percentage)
-            self._fill_order(order, buy, price, timestamp, fee_percentage)
-            self._closed_orders[order_id] = order
-        if type_limit:
-            # TODO Probably use taker fee, if the order can be filled now
-            fee_percentage = market.get('maker', 0)
-            fee_percentage = _convert_float_or_raise(fee_percentage,
-                                                     'ExchangeAccount: fee')
-            if buy:
-                self._balances[quote].change_used(price * amount)
-            else:
-                self._balances[base].change_used(amount)
-            self._open_orders[order_id] = order
+        if order['stop_price'] is not None:
+            result['stopPrice'] = order['stop_price']
+            result['triggerPrice'] = order['stop_price']
+        if order['fill_now']:
+            self._fill_order(result, buy, order['price'], timestamp,
+                             order['fee_percentage'])
+            self._closed_orders[order_id] = result
+            self._closed_order_ids.append(order_id)
+        else:
+            self._open_orders[order_id] = result
             self._private_order_info[order_id] = {
                 'id': order_id,
-                'base': base,
-                'quote': quote,
-                'price': price,
+                'base': order['base'],
+                'quote': order['quote'],
+                'price': fill_price,
+                'reserved_price': order['reserved_price'],
                 'buy': buy,
-                'fee_percentage': fee_percentage,
-                'fillable_date': self._limit_order_fillable_date(
-                    symbol, buy, price),
+                'fee_percentage': order['fee_percentage'],
+                'fillable_date': fillable_date,
             }
-            self._update_next_private_order_to_update()
+            if fill_schedule is not None:
+                self._private_order_info[order_id]['fills'] = fill_schedule
+        self._add_order_event(order_id)
 
         return {'id': order_id,
                 'info': {}}
 
-    def _limit_order_fillable_date(self, symbol, buy, price):
+    def _pending_fills(self, symbol, orders):
+        # Date, price and schedule of the partial fills (or None) of limit
+        # and stop orders after the current date. The running minimum of
+        # the lows (maximum of the highs) is monotonic, so the first date,
+        # at which a price is reached, is found for all orders with one pass
+        # over the data and a binary search per order.
         ohlcv = self._ohlcvs[symbol]
         date = self._timeframe.date()
         if ohlcv.index[0] != date:
@@ -224,16 +435,76 @@ class ExchangeAccount:
             self._ohlcvs[symbol] = ohlcv
         # only look at the future
         ohlcv = ohlcv[date + pandas.Timedelta(1, unit='ns'):]
-        if buy:
-            low = ohlcv.low
-            use = low[low <= price]
-        else:
-            high = ohlcv.high
-            use = high[high >= price]
-        if use is not None and len(use.index) > 0:
-            return use.index[0]
-        else:
-            return None
+        index = ohlcv.index
+        lows = ohlcv['low'].to_numpy()
+        highs = ohlcv['high'].to_numpy()
+        running = {}
+
+        def first_reached(price, above):
+            if above not in running:
+                running[above] = (numpy.maximum.accumulate(highs) if above
+                                  else -numpy.minimum.accumulate(lows))
+            return numpy.searchsorted(running[above],
+                                      price if above else -price)
+
+        result = []
+        for order in orders:
+            buy = order['buy']
+            price = order['price']
+            stop_price = order['stop_price']
+            schedule = None
+            if stop_price is None:
+                position = first_reached(float(price), above=not buy)
+            else:
+                # Buy stops trigger, when the price rises to the stop price
+                position = first_reached(float(stop_price), above=buy)
+                if position < len(index) and order['type'] == 'market':
+                    price = self._stop_market_price(
+                        buy, stop_price, _convert_float(lows[position]),
+                        _convert_float(highs[position]))
+                elif position < len(index):
+                    # The limit order can be filled from the trigger candle
+                    if buy:
+                        reached = lows[position:] <= float(price)
+                    else:
+                        reached = highs[position:] >= float(price)
+                    if reached.any():
+                        position += int(numpy.argmax(reached))
+                    else:
+                        position = len(index)
+            if self._volume_share is not None and position < len(index) and \
+                    order['type'] == 'limit':
+                if buy:
+                    reached = lows[position:] <= float(price)
+                else:
+                    reached = highs[position:] >= float(price)
+                schedule = self._fill_schedule(
+                    index[position:], ohlcv['volume'].to_numpy()[position:],
+                    reached, order['amount'])
+                # Candles without volume do not fill the order
+                fillable_date = schedule[0][0] if schedule else None
+            elif position < len(index):
+                fillable_date = index[position]
+            else:
+                fillable_date = None
+            result.append((fillable_date, price, schedule))
+        return result
+
+    def _fill_schedule(self, index, volumes, reached, amount):
+        # Dates and amounts of the partial fills: volume_share of the volume
+        # of every candle, which reaches the price, until amount is filled.
+        # The cumulative sum limits the conversion to the needed candles.
+        available = numpy.where(reached, volumes * self._volume_share, 0)
+        end = numpy.searchsorted(numpy.cumsum(available), float(amount))
+        schedule = []
+        remaining = amount
+        for i in numpy.flatnonzero(available[:end + 2]):
+            fill = min(remaining, _convert_float(available[i]))
+            schedule.append([index[i], fill])
+            remaining -= fill
+            if remaining == 0:
+                break
+        return schedule
 
     def _update_balance(self, price, amount, base, quote, buy, fee_percentage):
         # First decrease balance, then increase, so
@@ -252,21 +523,26 @@ class ExchangeAccount:
         else:
             self._balances[base].change_used(- amount)
 
-    def _fill_order(self, order, buy, price, timestamp, fee_percentage):
-        amount = order['amount']
-        amount_price = amount * price
+    def _fill_order(self, order, buy, price, timestamp, fee_percentage,
+                    amount=None):
+        # Fills amount (default the remaining amount) of the order
+        if amount is None:
+            amount = order['remaining']
+        filled = order['filled'] + amount
+        remaining = order['amount'] - filled
+        amount_price = filled * price
         order.update({
             'average': price,
             'cost': amount_price,
-            'filled': amount,
+            'filled': filled,
             'lastTradeTimestamp': timestamp,
             'price': price,
-            'remaining': 0,
-            'status': 'closed',
+            'remaining': remaining,
+            'status': 'closed' if remaining == 0 else 'open',
         })
         order['fee'].update({
             'rate': fee_percentage,
-            'cost': fee_percentage * (amount if buy else amount_price),
+            'cost': fee_percentage * (filled if buy else amount_price),
         })
 
     def fetch_balance(self):
@@ -313,3 +589,36 @@ class ExchangeAccount:
                                           filter_non_zero=None,
                                           since_get='timestamp')
         return [self._return_decimal_to_float(deepcopy(o)) for o in orders]
+
+    def order_event_count(self):
+        return self._order_events_start + len(self._order_events)
+
+    def _add_order_event(self, order_id):
+        if len(self._order_event_readers) == 0:
+            # Readers start with the events after their first call
+            self._order_events_start += 1
+        else:
+            self._order_events.append(order_id)
+
+    def set_order_event_reader(self, reader, position):
+        # reader needs the events from the event number position. Events,
+        # which no reader needs, are removed.
+        self._order_event_readers[reader] = position
+        needed = min(self._order_event_readers.values())
+        if needed > self._order_events_start:
+            del self._order_events[:needed - self._order_events_start]
+            self._order_events_start = needed
+
+    def fetch_order_events(self, start, symbol=None):
+        # Orders changed since the event number start, in the order of their
+        # first change. Returns the orders and the next event number.
+        self._update_orders()
+        result = []
+        events = self._order_events[max(0, start - self._order_events_start):]
+        for id in dict.fromkeys(events):
+            order = self._closed_orders.get(id)
+            if order is None:
+                order = self._open_orders[id]
+            if symbol is None or order['symbol'] == symbol:
+                result.append(self._return_decimal_to_float(deepcopy(order)))
+        return result, self.order_event_count()
@@ -3,15 +3,27 @@ from ccxt.base.exchange import Exchange
 from ccxt.base.errors import BadRequest, BadSymbol
 from btrccts.check_dataframe import _check_dataframe
 from btrccts.exchange_account import ExchangeAccount
+from btrccts.window import OhlcvArrayCache, backtest_window, panel_window
 
 
 class ExchangeBackend:
 
-    def __init__(self, timeframe, balances={}, ohlcvs={}):
+    def __init__(self, timeframe, balances={}, ohlcvs={}, volume_share=None,
+                 array_cache=None):
         self._account = ExchangeAccount(timeframe=timeframe,
                                         balances=balances,
-                                        ohlcvs=ohlcvs)
+                                        ohlcvs=ohlcvs,
+                                        volume_share=volume_share)
         self._ohlcvs = {}
+        # Backends with the same array cache and dataframes share the
+        # arrays of ohlcv_window and ohlcv_panel
+        if array_cache is None:
+            array_cache = OhlcvArrayCache()
+        self._array_cache = array_cache
+        self._ohlcv_sources = dict(ohlcvs)
+        self._ohlcv_arrays = {}
+        self._panel = None
+        self._panel_symbol_positions = None
         self._timeframe = timeframe
         for key in ohlcvs:
             self._ohlcvs[key] = _check_dataframe(
@@ -19,15 +31,35 @@ class ExchangeBackend:
                 timeframe,
                 ['open', 'low', 'high', 'close', 'volume'])
 
+    def timeframe(self):
+        return self._timeframe
+
+    def get_state(self, closed_orders=True):
+        return self._account.get_state(closed_orders=closed_orders)
+
+    def closed_orders_since(self, count):
+        return self._account.closed_orders_since(count)
+
+    def set_state(self, state):
+        self._account.set_state(state)
+
+    def restore_count(self):
+        return self._account.restore_count()
+
     def fetch_order(self, id, symbol=None):
         return self._account.fetch_order(id=id, symbol=symbol)
 
     def fetch_balance(self):
         return self._account.fetch_balance()
 
-    def create_order(self, market, type, price, side, amount):
+    def create_order(self, market, type, price, side, amount,
+                     stop_price=None):
         return self._account.create_order(market=market, type=type, side=side,
-                                          price=price, amount=amount)
+                                          price=price, amount=amount,
+                                          stop_price=stop_price)
+
+    def create_orders(self, orders):
+        return self._account.create_orders(orders=orders)
 
     def cancel_order(self, id, symbol=None):
         return self._account.cancel_order(id=id, symbol=symbol)
@@ -40,26 +72,56 @@ class ExchangeBackend:
         return self._account.fetch_closed_orders(symbol=symbol, since=since,
                                                  limit=limit)
 
+    def order_event_count(self):
+        return self._account.order_event_count()
+
+    def fetch_order_events(self, start, symbol=None):
+        return self._account.fetch_order_events(start=start, symbol=symbol)
+
+    def set_order_event_reader(self, reader, position):
+        self._account.set_order_event_reader(reader=reader, position=position)
+
     def fetch_ticker(self, symbol):
         ohlcv = self._ohlcvs.get(symbol)
         if ohlcv is None:
             raise BadSymbol('ExchangeBackend: no prices for {}'.format(symbol))
         current_date = self._timeframe.date().floor('1min')
         row = ohlcv.loc[current_date]
-        timestamp = int(current_date.value / 10**6)
+        return self._ticker(symbol, current_date, row['open'], row['high'],
+                            row['low'], row['close'])
+
+    def fetch_tickers(self, symbols=None):
+        # The current candles of all symbols are read from the panel at once
+        if symbols is None:
+            symbols = sorted(self._ohlcvs)
+        for symbol in symbols:
+            if symbol not in self._ohlcvs:
+                raise BadSymbol('ExchangeBackend: no prices for {}'
+                                .format(symbol))
+        if len(symbols) == 0:
+            return {}
+        current_date = self._timeframe.date().floor('1min')
+        positions = self._panel_positions()
+        rows = self.ohlcv_panel()[
+            [positions[symbol] for symbol in symbols]].tolist()
+        return {symbol: self._ticker(symbol, current_date, *row[:4])
+                for symbol, row in zip(symbols, rows)}
+
+    def _ticker(self, symbol, date, open, high, low, close):
+        timestamp = int(date.value / 10**6)
         return {
             'symbol': symbol,
             'timestamp': timestamp,
             'datetime': Exchange.iso8601(timestamp),
-            'high': row['high'],
-            'low': row['low'],
+            'high': high,
+            'low': low,
             'bid': None,
             'bidVolume': None,
             'ask': None,
             'askVolume': None,
             'vwap': None,
-            'open': row['open'],
-            'close': row['close'],
+            'open': open,
+            'close': close,
             'last': None,
             'previousClose': None,
             'change': None,
@@ -70,6 +132,50 @@ class ExchangeBackend:
             'info': {},
         }
 
+    def ohlcv_dataframe(self, symbol):
+        # All data of the symbol including the future, the context uses it
+        # for precomputations
+        ohlcv = self._ohlcvs.get(symbol)
+        if ohlcv is None:
+            raise BadSymbol('ExchangeBackend: no prices for {}'.format(symbol))
+        return ohlcv
+
+    def ohlcv_window(self, symbol, n, fields=None):
+        # Read only view of the last n 1 minute candles until the current
+        # date, the array is created once per symbol
+        array = self._ohlcv_arrays.get(symbol)
+        if array is None:
+            array = self._array_cache.array(self._ohlcv_sources.get(symbol),
+                                            self.ohlcv_dataframe(symbol))
+            self._ohlcv_arrays[symbol] = array
+        return backtest_window(array, self._ohlcvs[symbol].index[0],
+                               self._timeframe.date(), n, fields)
+
+    def panel_symbols(self):
+        # Order of the symbols in the first dimension of ohlcv_panel
+        return self._ohlcv_panel()[0]
+
+    def ohlcv_panel(self, n=None, fields=None):
+        # Read only view of the candles of all symbols: the current candle
+        # (symbol x field) or the last n candles (symbol x candle x field)
+        _, first_date, panel = self._ohlcv_panel()
+        return panel_window(panel, first_date, self._timeframe.date(), n,
+                            fields)
+
+    def _panel_positions(self):
+        if self._panel_symbol_positions is None:
+            self._panel_symbol_positions = {
+                symbol: i for i, symbol in enumerate(self.panel_symbols())}
+        return self._panel_symbol_positions
+
+    def _ohlcv_panel(self):
+        if self._panel is None:
+            if len(self._ohlcvs) == 0:
+                raise BadSymbol('ExchangeBackend: no prices')
+            self._panel = self._array_cache.panel(self._ohlcv_sources,
+                                                  self._ohlcvs)
+        return self._panel
+
     def fetch_ohlcv_dataframe(self, symbol, timeframe='1m', since=None,
                               limit=None, params={}):
         # Exchanges in the real world have different behaviour, when there is
@@ -110,3 +216,25 @@ class ExchangeBackend:
             'low': 'min',
             'close': 'last',
             'volume': 'sum'})
+
+    def fetch_ohlcv_update_dataframe(self, symbol, timeframe, pd_after):
+        # Candles, which changed after pd_after until the current date.
+        # The last candle is incomplete, if the timeframe is not finished.
+        # Without pd_after, only the current candle is returned.
+        ohlcv = self._ohlcvs.get(symbol)
+        if ohlcv is None:
+            raise BadSymbol('ExchangeBackend: no prices for {}'.format(symbol))
+        pd_current_date = self._timeframe.date().floor('1min')
+        pd_timeframe = pandas.Timedelta(Exchange.parse_timeframe(timeframe),
+                                        unit='s')
+        if pd_after is None:
+            pd_start = pd_current_date.floor(pd_timeframe)
+        else:
+            pd_start = (pd_after + pandas.Timedelta('1m')).floor(pd_timeframe)
+        data = ohlcv[pd_start:pd_current_date]
+        return data.resample(pd_timeframe).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'})
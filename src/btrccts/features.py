@@ -0,0 +1,239 @@
+import hashlib
+import inspect
+import json
+import marshal
+import numpy
+import os
+import pandas
+
+FEATURES_DIR = 'features'
+MAX_BYTES = 2**30
+CONSTANT_TYPES = (int, float, complex, str, bytes, tuple, frozenset,
+                  numpy.ndarray, numpy.generic, pandas.Series,
+                  pandas.DataFrame, pandas.Index)
+
+
+def _file_checksum(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _code_names(code):
+    # Global names used by the code and its nested functions
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _update_value(sha, value, seen):
+    # Arrays and pandas objects are hashed byte exact, their repr is
+    # shortened. Values without a stable repr change the hash in every
+    # process, the feature is then computed again.
+    sha.update(type(value).__qualname__.encode())
+    if inspect.isfunction(value):
+        _update_function(sha, value, seen)
+    elif inspect.ismodule(value):
+        sha.update(value.__name__.encode())
+    elif isinstance(value, (pandas.Series, pandas.DataFrame, pandas.Index)):
+        if isinstance(value, pandas.DataFrame):
+            meta = (list(value.columns), [str(d) for d in value.dtypes])
+        else:
+            meta = (value.name, str(value.dtype))
+        sha.update(repr(meta).encode())
+        sha.update(pandas.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, (numpy.ndarray, numpy.generic)) and \
+            value.dtype != object:
+        array = numpy.ascontiguousarray(value)
+        sha.update(repr((array.dtype.str, array.shape)).encode())
+        sha.update(array.tobytes())
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _update_value(sha, item, seen)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _update_value(sha, key, seen)
+            _update_value(sha, item, seen)
+    else:
+        sha.update(repr(value).encode())
+
+
+def _update_function(sha, func, seen):
+    if func in seen:
+        return
+    seen.add(func)
+    try:
+        sha.update(inspect.getsource(func).encode())
+    except (OSError, TypeError):
+        sha.update(marshal.dumps(func.__code__))
+    # An explicit version changes the hash without changes of the source
+    _update_value(sha, getattr(func, 'version', None), seen)
+    _update_value(sha, [cell.cell_contents for cell in func.__closure__ or []],
+                  seen)
+    _update_value(sha, func.__defaults__, seen)
+    _update_value(sha, func.__kwdefaults__, seen)
+    # Referenced functions and constants of the module. Other globals
+    # (e.g. lists or objects) can be state, which changes while running.
+    for name in sorted(_code_names(func.__code__)):
+        value = func.__globals__.get(name)
+        if inspect.isfunction(value) or isinstance(value, CONSTANT_TYPES):
+            sha.update(name.encode())
+            _update_value(sha, value, seen)
+
+
+def has_source(func):
+    # Functions without source (e.g. defined in the interpreter) can not
+    # be identified across processes
+    try:
+        inspect.getsource(func)
+    except (OSError, TypeError):
+        return False
+    return True
+
+
+def function_hash(func):
+    # The source of the function, the values it uses from closures,
+    # defaults and globals and its version attribute. Referenced functions
+    # are hashed the same way.
+    if not has_source(func):
+        raise ValueError('Feature store: source of {} is not available'
+                         .format(getattr(func, '__qualname__', func)))
+    sha = hashlib.sha256()
+    _update_function(sha, func, set())
+    return sha.hexdigest()
+
+
+class FeatureStore:
+
+    # Features (one value or one row per candle) are stored in
+    # features_dir as .npy files and loaded memory mapped.
+    # The key combines the checksum of the ohlcv file, the hash of the
+    # function and the parameters. The least recently used features are
+    # removed, if the features need more than max_bytes.
+
+    def __init__(self, features_dir, ohlcv_dir, max_bytes=MAX_BYTES):
+        self._features_dir = features_dir
+        self._ohlcv_dir = ohlcv_dir
+        self._max_bytes = max_bytes
+        self._checksums = {}
+
+    def data_path(self, exchange_id, symbol):
+        return os.path.join(self._ohlcv_dir, exchange_id,
+                            '{}.csv'.format(symbol))
+
+    def _data_checksum(self, path):
+        # The checksum is computed once per file version
+        stat = os.stat(path)
+        version = (path, stat.st_size, stat.st_mtime_ns)
+        checksum = self._checksums.get(version)
+        if checksum is None:
+            checksum = _file_checksum(path)
+            self._checksums[version] = checksum
+        return checksum
+
+    def key(self, exchange_id, symbol, func, params={}):
+        sha = hashlib.sha256()
+        sha.update(self._data_checksum(
+            self.data_path(exchange_id, symbol)).encode())
+        sha.update(function_hash(func).encode())
+        sha.update(json.dumps(params, sort_keys=True, default=repr).encode())
+        return sha.hexdigest()
+
+    def _paths(self, key):
+        path = os.path.join(self._features_dir, key)
+        return path + '.npy', path + '.json'
+
+    def get(self, exchange_id, symbol, func, ohlcv, params={}, check=None):
+        # Returns func(ohlcv, **params) as series or dataframe with the
+        # index of ohlcv. ohlcv needs to be the data of the ohlcv file.
+        # check is called with computed values, before they are stored.
+        key = self.key(exchange_id, symbol, func, params)
+        array_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            values = numpy.load(array_path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            result = func(ohlcv, **params)
+            if check is not None:
+                check(result)
+            values, meta = self._convert(func, result, params)
+            self._save(array_path, meta_path, values, meta)
+            self._evict(keep=key)
+            values = numpy.load(array_path, mmap_mode='r')
+        else:
+            # The modification time orders the features for the eviction
+            os.utime(array_path)
+        if len(values) != len(ohlcv.index):
+            raise ValueError('Feature store: {} needs to return one value '
+                             'per candle'.format(meta['function']))
+        if meta['columns'] is None:
+            return pandas.Series(values, index=ohlcv.index,
+                                 name=meta['name'], copy=False)
+        return pandas.DataFrame(values, index=ohlcv.index,
+                                columns=meta['columns'], copy=False)
+
+    def _convert(self, func, result, params):
+        meta = {'function': getattr(func, '__qualname__', repr(func)),
+                'params': json.loads(json.dumps(params, default=repr)),
+                'name': None, 'columns': None}
+        if isinstance(result, pandas.DataFrame):
+            meta['columns'] = [str(column) for column in result.columns]
+        elif isinstance(result, pandas.Series):
+            meta['name'] = result.name
+        return numpy.asarray(result, dtype=numpy.float64), meta
+
+    def _save(self, array_path, meta_path, values, meta):
+        os.makedirs(self._features_dir, exist_ok=True)
+        # Written to temporary files, so other processes never load
+        # incomplete features
+        tmp_array_path = array_path + '.tmp.npy'
+        numpy.save(tmp_array_path, values)
+        os.replace(tmp_array_path, array_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f, default=repr)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        # (modification time, key, size) of the stored features
+        entries = []
+        for name in os.listdir(self._features_dir):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            key = name[:-4]
+            array_path, meta_path = self._paths(key)
+            try:
+                stat = os.stat(array_path)
+                size = stat.st_size + os.path.getsize(meta_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, key, size))
+        return entries
+
+    def _evict(self, keep):
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total <= self._max_bytes:
+                break
+            if key == keep:
+                continue
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def data_feature_store(data_dir, max_bytes=MAX_BYTES):
+    return FeatureStore(features_dir=os.path.join(data_dir, FEATURES_DIR),
+                        ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                        max_bytes=max_bytes)
@@ -0,0 +1,213 @@
+import numpy
+import os
+import pandas
+from btrccts.features import has_source
+
+LIVE_FETCH_LIMIT = 500
+# Live indicators keep the values of the last LIVE_MAX_VALUES candles
+LIVE_MAX_VALUES = 10000
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _with_warmup(func, warmup):
+    # Number of candles the indicator needs to compute its latest value
+    func.warmup = warmup
+    return func
+
+
+def sma(window, column='close'):
+    def func(ohlcv):
+        return ohlcv[column].rolling(window).mean()
+    return _with_warmup(func, window)
+
+
+def ema(span, column='close', warmup=None):
+    # The ema depends on all candles, in live mode it starts after warmup
+    # (default 10 * span) candles
+    def func(ohlcv):
+        return ohlcv[column].ewm(span=span, adjust=False).mean()
+    return _with_warmup(func, warmup or 10 * span)
+
+
+def atr(window):
+    # Average of the true range over window candles
+    def func(ohlcv):
+        previous_close = ohlcv['close'].shift(1)
+        true_range = pandas.concat([
+            ohlcv['high'] - ohlcv['low'],
+            (ohlcv['high'] - previous_close).abs(),
+            (ohlcv['low'] - previous_close).abs()], axis=1).max(axis=1)
+        return true_range.rolling(window).mean()
+    return _with_warmup(func, window + 1)
+
+
+def _warmup(func, warmup):
+    if warmup is None:
+        warmup = getattr(func, 'warmup', 1)
+    if warmup < 1:
+        raise ValueError('Indicator: warmup needs to be positive')
+    return warmup
+
+
+def last_complete_candle(now):
+    # Date of the last 1 minute candle, which is complete
+    return now.floor('1min') - pandas.Timedelta(minutes=1)
+
+
+def fetch_candles(fetch_ohlcv, exchange_id, symbol, pd_since, pd_until):
+    # Candles from pd_since until pd_until (inclusive) as dataframe, in
+    # pages of LIVE_FETCH_LIMIT candles.
+    # fetch_ohlcv(exchange_id, symbol, since, limit) returns ccxt ohlcvs.
+    frames = []
+    while pd_since <= pd_until:
+        result = fetch_ohlcv(exchange_id, symbol,
+                             since=int(pd_since.value / 10**6),
+                             limit=LIVE_FETCH_LIMIT)
+        frame = pandas.DataFrame(
+            [row[1:] for row in result], columns=OHLCV_COLUMNS,
+            index=pandas.to_datetime([row[0] for row in result],
+                                     unit='ms', utc=True),
+            dtype=float)
+        frame = frame[(frame.index >= pd_since) & (frame.index <= pd_until)]
+        if len(frame.index) == 0:
+            break
+        frames.append(frame)
+        pd_since = frame.index[-1] + pandas.Timedelta(minutes=1)
+    if len(frames) == 0:
+        return pandas.DataFrame(columns=OHLCV_COLUMNS, dtype=float)
+    return pandas.concat(frames)
+
+
+class BacktestIndicators:
+
+    # Indicators are computed once over the whole ohlcv data. indicator()
+    # returns the values until the current date, like fetch_ohlcv.
+
+    def __init__(self, timeframe, get_ohlcv, feature_store=None):
+        self._timeframe = timeframe
+        self._get_ohlcv = get_ohlcv
+        self._feature_store = feature_store
+        self._values = {}
+
+    def register(self, exchange_id, symbol, name, func, warmup=None):
+        _warmup(func, warmup)
+        ohlcv = self._get_ohlcv(exchange_id, symbol)
+
+        def check(values):
+            if len(values.index) != len(ohlcv.index):
+                raise ValueError('Indicator: {} needs to return one value '
+                                 'per candle'.format(name))
+            # A function, which looks at later candles, returns different
+            # values, if the later candles are missing
+            half = len(ohlcv.index) // 2
+            if half > 0:
+                prefix = numpy.asarray(func(ohlcv.iloc[:half]), dtype=float)
+                full = numpy.asarray(values.iloc[:half], dtype=float)
+                if not numpy.allclose(prefix, full, equal_nan=True):
+                    raise ValueError('Indicator: {} uses future data'
+                                     .format(name))
+
+        store = self._feature_store
+        if store is not None and \
+                os.path.isfile(store.data_path(exchange_id, symbol)) and \
+                has_source(func):
+            # Checked only, when the values are computed
+            values = store.get(exchange_id, symbol, func, ohlcv=ohlcv,
+                               check=check)
+        else:
+            values = func(ohlcv)
+            check(values)
+        self._values[(exchange_id, symbol, name)] = values
+
+    def get(self, exchange_id, symbol, name):
+        values = self._values.get((exchange_id, symbol, name))
+        if values is None:
+            raise ValueError('Indicator: {} is not registered for {} {}'
+                             .format(name, exchange_id, symbol))
+        end = values.index.searchsorted(self._timeframe.date().floor('1min'),
+                                        side='right')
+        return values.iloc[:end]
+
+
+class LiveIndicators:
+
+    # Indicators are updated with the candles, which were completed since
+    # the last call. The indicator functions get the last warmup candles
+    # and the new candles, so their work does not grow with the runtime.
+
+    def __init__(self, fetch_ohlcv, now):
+        self._fetch_ohlcv = fetch_ohlcv
+        self._now = now
+        self._candles = {}
+        self._indicators = {}
+
+    def _last_complete(self):
+        return last_complete_candle(self._now())
+
+    def _fetch(self, exchange_id, symbol, pd_since, pd_until):
+        return fetch_candles(self._fetch_ohlcv, exchange_id, symbol,
+                             pd_since, pd_until)
+
+    def _symbol_indicators(self, exchange_id, symbol):
+        return [(key[2], indicator)
+                for key, indicator in self._indicators.items()
+                if key[:2] == (exchange_id, symbol)]
+
+    def _update(self, exchange_id, symbol):
+        key = (exchange_id, symbol)
+        candles = self._candles[key]
+        pd_until = self._last_complete()
+        if len(candles.index) > 0:
+            pd_since = candles.index[-1] + pandas.Timedelta(minutes=1)
+        else:
+            pd_since = pd_until
+        new = self._fetch(exchange_id, symbol, pd_since, pd_until)
+        count = len(new.index)
+        if count == 0:
+            return
+        candles = pandas.concat([candles, new])
+        indicators = self._symbol_indicators(exchange_id, symbol)
+        for _, indicator in indicators:
+            values = indicator['func'](
+                candles.iloc[-(indicator['warmup'] + count):])
+            indicator['values'] = pandas.concat(
+                [indicator['values'], values.iloc[-count:]]
+            ).iloc[-LIVE_MAX_VALUES:]
+        keep = max([indicator['warmup'] for _, indicator in indicators] +
+                   [1])
+        self._candles[key] = candles.iloc[-keep:]
+
+    def register(self, exchange_id, symbol, name, func, warmup=None):
+        warmup = _warmup(func, warmup)
+        key = (exchange_id, symbol)
+        if key in self._candles:
+            self._update(exchange_id, symbol)
+        candles = self._candles.get(key)
+        pd_until = self._last_complete()
+        if candles is None or len(candles.index) == 0:
+            candles = self._fetch(
+                exchange_id, symbol,
+                pd_until - pandas.Timedelta(minutes=warmup - 1), pd_until)
+        elif len(candles.index) < warmup:
+            # Older candles for the warmup of this indicator
+            first = candles.index[0]
+            older = self._fetch(
+                exchange_id, symbol,
+                first - pandas.Timedelta(minutes=warmup - len(candles.index)),
+                first - pandas.Timedelta(minutes=1))
+            candles = pandas.concat([older, candles])
+        self._candles[key] = candles
+        self._indicators[(exchange_id, symbol, name)] = {
+            'func': func,
+            'warmup': warmup,
+            # The values before warmup candles are not complete
+            'values': func(candles).iloc[warmup - 1:],
+        }
+
+    def get(self, exchange_id, symbol, name):
+        indicator = self._indicators.get((exchange_id, symbol, name))
+        if indicator is None:
+            raise ValueError('Indicator: {} is not registered for {} {}'
+                             .format(name, exchange_id, symbol))
+        self._update(exchange_id, symbol)
+        return indicator['values']
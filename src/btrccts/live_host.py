@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import pandas
+from btrccts.context import LiveContext
+from btrccts.profiling import Profiler
+from btrccts.run import CLOCK_CHECK_SECONDS, SPIN_SECONDS, \
+    USER_CONFIG_DIR, _create_metrics, _run_async, main_loop
+from btrccts.timeframe import Timeframe
+
+
+class Scheduler:
+
+    # One timer for all algorithms of a host: wakes the waiters, when their
+    # date is reached. Like sleep_until, the wall clock is checked at least
+    # every CLOCK_CHECK_SECONDS, so a changed system clock is noticed.
+
+    def __init__(self):
+        self._waiters = []
+        self._counter = itertools.count()
+        self._timer = None
+
+    async def sleep_until(self, date):
+        if date <= pandas.Timestamp.now(tz='UTC'):
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (date, next(self._counter), future))
+        if self._waiters[0][2] is future:
+            self._schedule()
+        await future
+
+    def waiting(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Waiters, which were cancelled, do not need a wakeup
+        while len(self._waiters) > 0 and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if len(self._waiters) == 0:
+            return
+        now = pandas.Timestamp.now(tz='UTC')
+        diff = (self._waiters[0][0] - now).value / 10**9
+        loop = asyncio.get_running_loop()
+        if diff > SPIN_SECONDS:
+            self._timer = loop.call_later(
+                min(diff - SPIN_SECONDS, CLOCK_CHECK_SECONDS), self._wake)
+        else:
+            self._timer = loop.call_soon(self._wake)
+
+    def _wake(self):
+        self._timer = None
+        now = pandas.Timestamp.now(tz='UTC')
+        while len(self._waiters) > 0 and self._waiters[0][0] <= now:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+        self._schedule()
+
+
+class SharedExchanges:
+
+    # Exchange instances of a host. Algorithms, which create the same
+    # exchange with the same auth alias and config, get the same instance,
+    # so they share the http session and the rate limit.
+    # Async exchanges are closed by the host, the algorithms get them
+    # wrapped in a SharedExchange.
+
+    def __init__(self, conf_dir, profiler=None, metrics=None):
+        self._conf_dir = conf_dir
+        self._profiler = profiler
+        self._metrics = metrics
+        self._exchanges = {}
+        self._async_exchanges = []
+
+    def get(self, exchange_id, auth_aliases, config, async_ccxt):
+        alias = auth_aliases.get(exchange_id, exchange_id)
+        key = (exchange_id, alias, async_ccxt,
+               json.dumps(config, sort_keys=True, default=repr))
+        exchange = self._exchanges.get(key)
+        if exchange is None:
+            context = LiveContext(timeframe=None, conf_dir=self._conf_dir,
+                                  auth_aliases={exchange_id: alias},
+                                  profiler=self._profiler,
+                                  metrics=self._metrics)
+            exchange = context.create_exchange(exchange_id, config=config,
+                                               async_ccxt=async_ccxt)
+            if async_ccxt:
+                self._async_exchanges.append(exchange)
+                exchange = SharedExchange(exchange)
+            self._exchanges[key] = exchange
+        return exchange
+
+    def count(self):
+        return len(self._exchanges)
+
+    async def close(self):
+        for exchange in self._async_exchanges:
+            await exchange.close()
+        self._exchanges = {}
+        self._async_exchanges = []
+
+
+class SharedExchange:
+
+    # Async exchange of a host for the algorithms: close() does nothing,
+    # everything else is done by the exchange
+
+    def __init__(self, exchange):
+        object.__setattr__(self, '_exchange', exchange)
+
+    def __getattr__(self, name):
+        return getattr(self._exchange, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._exchange, name, value)
+
+    async def close(self):
+        pass
+
+
+class HostedContext(LiveContext):
+
+    def __init__(self, timeframe, shared_exchanges, auth_aliases={}):
+        super().__init__(timeframe=timeframe, conf_dir=None,
+                         auth_aliases=auth_aliases)
+        self._shared_exchanges = shared_exchanges
+
+    def create_exchange(self, exchange_id, config={}, async_ccxt=False):
+        return self._shared_exchanges.get(
+            exchange_id, auth_aliases=self._auth_aliases, config=config,
+            async_ccxt=async_ccxt)
+
+
+async def host_algorithms(algorithms, conf_dir=USER_CONFIG_DIR,
+                          auth_aliases={}, profiler=None, metrics=None):
+    # Runs live algorithms in the running event loop.
+    # algorithms: list of (AlgorithmClass, args, pd_interval, pd_end_date)
+    # or (AlgorithmClass, args, pd_interval, pd_end_date, auth_aliases),
+    # every algorithm runs on its own interval. The auth aliases of an
+    # algorithm override auth_aliases. Returns per algorithm the algorithm
+    # or the exception, which stopped it.
+    # The iterations are reported to profiler and metrics per algorithm,
+    # labeled with the class name and the position in algorithms
+    # (e.g. algorithm="Trend-0"). metrics needs the labelnames
+    # ['algorithm'].
+    logger = logging.getLogger(__package__)
+    labels = ['{}-{}'.format(algorithm[0].__name__, i)
+              for i, algorithm in enumerate(algorithms)]
+    profilers = [None] * len(algorithms)
+    if profiler is not None:
+        profilers = [profiler.labeled(label) for label in labels]
+    run_metrics = [None] * len(algorithms)
+    if metrics is not None:
+        run_metrics = [metrics.labeled(algorithm=label) for label in labels]
+    scheduler = Scheduler()
+    shared_exchanges = SharedExchanges(conf_dir=conf_dir, profiler=profiler,
+                                       metrics=metrics)
+
+    async def run(algorithm_profiler, algorithm_metrics,
+                  AlgorithmClass, args, pd_interval, pd_end_date,
+                  algorithm_auth_aliases={}):
+        pd_start_date = pandas.Timestamp.now(tz='UTC').floor(pd_interval)
+        timeframe = Timeframe(pd_start_date=pd_start_date,
+                              pd_end_date=pd_end_date,
+                              pd_interval=pd_interval)
+        context = HostedContext(timeframe=timeframe,
+                                shared_exchanges=shared_exchanges,
+                                auth_aliases={**auth_aliases,
+                                              **algorithm_auth_aliases})
+        algorithm = AlgorithmClass(context=context, args=args)
+        return await main_loop(timeframe=timeframe, algorithm=algorithm,
+                               live=True, scheduler=scheduler,
+                               profiler=algorithm_profiler,
+                               metrics=algorithm_metrics)
+
+    try:
+        results = await asyncio.gather(
+            *[run(algorithm_profiler, algorithm_metrics, *algorithm)
+              for algorithm_profiler, algorithm_metrics, algorithm
+              in zip(profilers, run_metrics, algorithms)],
+            return_exceptions=True)
+    finally:
+        await shared_exchanges.close()
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.error('Algorithm stopped with exception',
+                         exc_info=result)
+    return results
+
+
+def execute_live_algorithms(algorithms, conf_dir=USER_CONFIG_DIR,
+                            auth_aliases={}, profile=False,
+                            metrics_file=None, metrics_port=None):
+    profiler = None
+    if profile:
+        profiler = Profiler()
+    metrics = _create_metrics(metrics_file=metrics_file,
+                              metrics_port=metrics_port,
+                              labelnames=['algorithm'])
+    if metrics is not None:
+        metrics.start()
+    try:
+        return _run_async(host_algorithms(algorithms=algorithms,
+                                          conf_dir=conf_dir,
+                                          auth_aliases=auth_aliases,
+                                          profiler=profiler,
+                                          metrics=metrics))
+    finally:
+        if metrics is not None:
+            metrics.close()
+        if profiler is not None:
+            logger = logging.getLogger(__package__)
+            logger.info(profiler.summary())
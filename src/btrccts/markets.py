@@ -0,0 +1,119 @@
+import argparse
+import ccxt
+import hashlib
+import json
+import logging
+import os
+import pandas
+from btrccts.cli import USER_DATA_DIR
+
+SNAPSHOT_VERSION = 1
+MARKETS_DIR = 'markets'
+# Config entries, which change the loaded markets
+MARKET_CONFIG_KEYS = ['options', 'hostname', 'urls']
+
+
+def market_config(config):
+    return {name: config[name] for name in MARKET_CONFIG_KEYS
+            if name in config}
+
+
+def market_config_digest(config):
+    # None for the default markets, otherwise a digest of the config
+    # entries, which change the markets
+    entries = market_config(config)
+    if len(entries) == 0:
+        return None
+    data = json.dumps(entries, sort_keys=True, default=repr)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def _snapshot_path(markets_dir, exchange_id, config):
+    digest = market_config_digest(config)
+    if digest is None:
+        return os.path.join(markets_dir, '{}.json'.format(exchange_id))
+    return os.path.join(markets_dir, '{}-{}.json'.format(exchange_id, digest))
+
+
+def load_market_snapshot(markets_dir, exchange_id, config={}):
+    # Returns None, if there is no snapshot for the exchange and the
+    # market config
+    path = _snapshot_path(markets_dir, exchange_id, config)
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        raise ValueError('Market snapshot: cannot parse {}'.format(path))
+    version = snapshot.get('version')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('Market snapshot: version {} of {} is not supported'
+                         .format(version, path))
+    return snapshot
+
+
+def save_market_snapshot(markets_dir, exchange_id, markets, currencies,
+                         config={}):
+    os.makedirs(markets_dir, exist_ok=True)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'exchange': exchange_id,
+        'config': market_config(config),
+        'ccxt_version': ccxt.__version__,
+        'created': pandas.Timestamp.now(tz='UTC').isoformat(),
+        'markets': markets,
+        'currencies': currencies,
+    }
+    path = _snapshot_path(markets_dir, exchange_id, config)
+    # Write to a temporary file, so a failed refresh keeps the old snapshot
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def refresh_market_snapshots(markets_dir, exchange_names, configs={}):
+    # configs: config per exchange id, the snapshot is stored for the
+    # market config of it
+    logger = logging.getLogger(__package__)
+    for exchange_name in exchange_names:
+        if exchange_name not in ccxt.exchanges:
+            raise ValueError('Unknown exchange: {}'.format(exchange_name))
+        config = configs.get(exchange_name, {})
+        exchange = getattr(ccxt, exchange_name)(config)
+        currencies = None
+        if exchange.has['fetchCurrencies']:
+            currencies = exchange.fetch_currencies()
+        markets = exchange.to_array(exchange.fetch_markets())
+        save_market_snapshot(markets_dir=markets_dir,
+                             exchange_id=exchange_name,
+                             markets=markets, currencies=currencies,
+                             config=config)
+        logger.info('Saved {} markets of {}'.format(len(markets),
+                                                    exchange_name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Download the markets of exchanges, so backtests '
+                    'do not need to load them from the exchange')
+    parser.add_argument('exchanges', nargs='+',
+                        help='Exchange ids to refresh')
+    parser.add_argument('--data-directory', default=USER_DATA_DIR,
+                        help='directory where data is stored')
+    parser.add_argument('--configs', default='{}',
+                        help='Exchange config per exchange (json), e.g. '
+                             '{"binance": {"options": '
+                             '{"defaultType": "future"}}}')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    refresh_market_snapshots(
+        markets_dir=os.path.join(args.data_directory, MARKETS_DIR),
+        exchange_names=args.exchanges,
+        configs=json.loads(args.configs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+import copy
+import http.server
+import os
+import pandas
+import threading
+import time
+from btrccts.profiling import instrument_exchange_class
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, _escape(value))
+                          for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames, lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or \
+                any(name not in labels for name in self.labelnames):
+            raise ValueError('Metric {}: labels need to be {}'.format(
+                self.name, list(self.labelnames)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self, key, value):
+        return [(self.name, list(zip(self.labelnames, key)), value)]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, _escape(self.documentation)),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        with self._lock:
+            items = sorted(self._copy_values().items())
+        for key, value in items:
+            for name, pairs, sample in self._samples(key, value):
+                lines.append('{}{} {}'.format(name, _format_labels(pairs),
+                                              _format_value(sample)))
+        return '\n'.join(lines)
+
+    def _copy_values(self):
+        return dict(self._values)
+
+
+class Counter(_Metric):
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError('Counter {}: amount needs to be positive'
+                             .format(self.name))
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, lock,
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'), )
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = {'buckets': [0] * len(self.buckets),
+                         'sum': 0, 'count': 0}
+                self._values[key] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def value(self, **labels):
+        entry = self._values.get(self._key(labels))
+        if entry is None:
+            return {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+        cumulative = []
+        total = 0
+        for count in entry['buckets']:
+            total += count
+            cumulative.append(total)
+        return {'buckets': cumulative, 'sum': entry['sum'],
+                'count': entry['count']}
+
+    def _copy_values(self):
+        return {key: {'buckets': list(entry['buckets']),
+                      'sum': entry['sum'], 'count': entry['count']}
+                for key, entry in self._values.items()}
+
+    def _samples(self, key, value):
+        pairs = list(zip(self.labelnames, key))
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, value['buckets']):
+            total += count
+            result.append(('{}_bucket'.format(self.name),
+                           pairs + [('le', _format_value(bound))], total))
+        result.append(('{}_sum'.format(self.name), pairs, value['sum']))
+        result.append(('{}_count'.format(self.name), pairs, value['count']))
+        return result
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.RLock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, self._lock,
+                             **kwargs)
+                self._metrics[name] = metric
+            elif type(metric) is not cls or \
+                    metric.labelnames != tuple(labelnames):
+                raise ValueError('Metric {} is already registered'
+                                 .format(name))
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets=buckets)
+
+    def render(self):
+        # Prometheus text exposition format
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return ''.join(metric.render() + '\n' for name, metric in metrics)
+
+
+class TextFileExporter:
+
+    # Writes the metrics to a file, e.g. for the textfile collector
+    # of the prometheus node exporter
+
+    def __init__(self, registry, path):
+        self._registry = registry
+        self._path = path
+
+    def start(self):
+        pass
+
+    def export(self):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self._registry.render())
+        # Scrapers should never see a partially written file
+        os.replace(tmp_path, self._path)
+
+    def close(self):
+        pass
+
+
+class HttpExporter:
+
+    # Serves the metrics on http://host:port/metrics from a background thread
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self._registry = registry
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self._registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(handler):
+                if handler.path not in ['/', '/metrics']:
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type',
+                                    'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(self._address,
+                                                       Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def port(self):
+        return self._server.server_address[1]
+
+    def export(self):
+        pass
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+
+class RunMetrics:
+
+    # The metrics of main_loop and the exchange calls. The exporters are
+    # updated after every iteration.
+    # Several main loops can share the metrics (e.g. hosted algorithms):
+    # with labelnames, every main loop gets its own labeled metrics, see
+    # labeled.
+
+    def __init__(self, registry=None, exporters=[], labelnames=()):
+        if registry is None:
+            registry = MetricsRegistry()
+        self.registry = registry
+        self._exporters = list(exporters)
+        self._labelnames = tuple(sorted(labelnames))
+        self._labels = {}
+        labelnames = self._labelnames
+        self._iterations = registry.counter(
+            'btrccts_iterations_total', 'Finished iterations', labelnames)
+        self._iteration_errors = registry.counter(
+            'btrccts_iteration_errors_total',
+            'Iterations where next_iteration raised an exception',
+            labelnames)
+        self._iteration_duration = registry.histogram(
+            'btrccts_iteration_duration_seconds',
+            'Wall time of an iteration', labelnames)
+        self._iteration_lag = registry.gauge(
+            'btrccts_iteration_lag_seconds',
+            'Delay between the scheduled and the real start of the last '
+            'iteration', labelnames)
+        self._skipped_iterations = registry.counter(
+            'btrccts_skipped_iterations_total',
+            'Iterations skipped, because the previous iteration took '
+            'longer than the interval', labelnames)
+        self._sleep_overshoot = registry.histogram(
+            'btrccts_sleep_overshoot_seconds',
+            'Time sleep_until woke up after the requested date', labelnames)
+        self._sleep_miss = registry.gauge(
+            'btrccts_sleep_miss_seconds',
+            'Difference between the last wakeup and the requested date',
+            labelnames)
+        self._clock_jumps = registry.counter(
+            'btrccts_clock_jumps_total',
+            'Jumps of the system clock detected while sleeping', labelnames)
+        self._interval = registry.gauge(
+            'btrccts_interval_seconds', 'Interval between iterations',
+            labelnames)
+        self._last_iteration = registry.gauge(
+            'btrccts_last_iteration_timestamp_seconds',
+            'Unix time of the end of the last iteration', labelnames)
+        self._call_duration = registry.histogram(
+            'btrccts_exchange_call_duration_seconds',
+            'Duration of exchange method calls', ['exchange', 'method'])
+        self._call_errors = registry.counter(
+            'btrccts_exchange_call_errors_total',
+            'Exchange method calls which raised an exception',
+            ['exchange', 'method', 'error'])
+        self._iteration_start = None
+        self._last_date = None
+
+    def labeled(self, **labels):
+        # Metrics of one main loop, which share the registry, the exporters
+        # and the exchange call metrics
+        if tuple(sorted(labels)) != self._labelnames:
+            raise ValueError('RunMetrics: labels need to be {}'.format(
+                list(self._labelnames)))
+        metrics = copy.copy(self)
+        metrics._labels = labels
+        metrics._iteration_start = None
+        metrics._last_date = None
+        return metrics
+
+    def iteration_started(self, timeframe, live):
+        self._iteration_start = time.perf_counter()
+        date = timeframe.date()
+        interval = timeframe.interval()
+        self._interval.set(interval.value / 10**9, **self._labels)
+        if live:
+            now = pandas.Timestamp.now(tz='UTC')
+            self._iteration_lag.set((now - date).value / 10**9,
+                                    **self._labels)
+        if self._last_date is not None:
+            skipped = (date - self._last_date) // interval - 1
+            if skipped > 0:
+                self._skipped_iterations.inc(skipped, **self._labels)
+        self._last_date = date
+
+    def iteration_failed(self):
+        self._iteration_errors.inc(**self._labels)
+
+    def iteration_finished(self):
+        self._iterations.inc(**self._labels)
+        self._iteration_duration.observe(
+            time.perf_counter() - self._iteration_start, **self._labels)
+        self._last_iteration.set(time.time(), **self._labels)
+        self.export()
+
+    def slept(self, date, clock_jump=None):
+        miss = (pandas.Timestamp.now(tz='UTC') - date).value / 10**9
+        self._sleep_overshoot.observe(max(miss, 0), **self._labels)
+        self._sleep_miss.set(miss, **self._labels)
+        if clock_jump:
+            self._clock_jumps.inc(**self._labels)
+
+    def call_started(self):
+        pass
+
+    def call_finished(self, exchange_id, method, seconds, error=None):
+        self._call_duration.observe(seconds, exchange=exchange_id,
+                                    method=method)
+        if error is not None:
+            self._call_errors.inc(exchange=exchange_id, method=method,
+                                  error=type(error).__name__)
+
+    def instrument_exchange_class(self, exchange_class):
+        return instrument_exchange_class(exchange_class, self)
+
+    def start(self):
+        for exporter in self._exporters:
+            exporter.start()
+
+    def export(self):
+        for exporter in self._exporters:
+            exporter.export()
+
+    def close(self):
+        for exporter in self._exporters:
+            exporter.close()
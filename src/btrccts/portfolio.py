@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from btrccts.check_dataframe import _check_dataframe
+from btrccts.context import BacktestContext, MarketCache, StopException
+from btrccts.event_loop import run_backtest_loop
+from btrccts.features import data_feature_store
+from btrccts.markets import MARKETS_DIR
+from btrccts.run import ExitReason, USER_DATA_DIR, _async_callable, \
+    _create_exchange_backends, load_ohlcvs
+from btrccts.timeframe import Timeframe
+from btrccts.watch import step
+from btrccts.window import OhlcvArrayCache
+
+OHLCV_COLUMNS = ['open', 'low', 'high', 'close', 'volume']
+
+
+class _Run:
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.next_iteration = _async_callable(algorithm.next_iteration)
+        self.handle_exception = _async_callable(algorithm.handle_exception)
+        self.exit = _async_callable(algorithm.exit)
+
+
+async def main_loop_many(timeframe, algorithms):
+    # Like main_loop, but every iteration calls all algorithms, which share
+    # the timeframe. An algorithm, which stops, exits and the others
+    # continue. If handle_exception of an algorithm raises, all algorithms
+    # exit and the exception is raised.
+    # The algorithms are called one after another, so they cannot wait for
+    # the next date in watch methods.
+    logger = logging.getLogger(__package__)
+    logger.info('Starting main_loop with {} algorithms'
+                .format(len(algorithms)))
+    running = [_Run(algorithm) for algorithm in algorithms]
+
+    async def exit_all(reason):
+        for run in running:
+            await run.exit(reason=reason)
+        running.clear()
+
+    while not timeframe.finished() and len(running) > 0:
+        try:
+            for run in list(running):
+                try:
+                    await run.next_iteration()
+                except StopException as e:
+                    logger.info('Stopped because of {}: {}'.format(
+                        type(e).__name__, e))
+                    running.remove(run)
+                    await run.exit(reason=ExitReason.STOPPED)
+                except (SystemExit, KeyboardInterrupt,
+                        asyncio.CancelledError):
+                    raise
+                except BaseException as e:
+                    logger.error('Error occurred during next_iteration')
+                    logger.exception(e)
+                    try:
+                        await run.handle_exception(e)
+                    except BaseException as e:
+                        logger.error('Exiting because of exception in '
+                                     'handle_exception')
+                        logger.exception(e)
+                        running.remove(run)
+                        await run.exit(reason=ExitReason.EXCEPTION)
+                        await exit_all(reason=ExitReason.STOPPED)
+                        raise e
+        except (SystemExit, KeyboardInterrupt, asyncio.CancelledError) as e:
+            logger.info('Stopped because of {}: {}'.format(
+                type(e).__name__, e))
+            await exit_all(reason=ExitReason.STOPPED)
+            return algorithms
+        step(timeframe)
+    await exit_all(reason=ExitReason.FINISHED)
+    logger.info('Finished main_loop')
+    return algorithms
+
+
+def execute_algorithms(exchange_names, symbols, algorithms,
+                       pd_start_date, pd_end_date, pd_interval,
+                       data_dir=USER_DATA_DIR, volume_share=None):
+    # Backtest a portfolio of algorithms in one process.
+    # algorithms: list of (AlgorithmClass, args, start_balances), every
+    # algorithm gets its own context and exchange accounts. The ohlcv data
+    # is loaded once and shared by all exchange backends.
+    # Returns the algorithms in the same order.
+    timeframe = Timeframe(pd_start_date=pd_start_date,
+                          pd_end_date=pd_end_date,
+                          pd_interval=pd_interval)
+    ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                         exchange_names=exchange_names,
+                         symbols=symbols)
+    # Convert once, the backends use the converted data without a copy
+    ohlcvs = {exchange: {symbol: _check_dataframe(ohlcv, timeframe,
+                                                  OHLCV_COLUMNS)
+                         for symbol, ohlcv in exchange_ohlcvs.items()}
+              for exchange, exchange_ohlcvs in ohlcvs.items()}
+    # The algorithms share the parsed markets and the read only arrays
+    # of the ohlcv data
+    market_cache = MarketCache()
+    array_cache = OhlcvArrayCache()
+    feature_store = data_feature_store(data_dir)
+    contexts = []
+    for _, _, start_balances in algorithms:
+        exchange_backends = _create_exchange_backends(
+            timeframe=timeframe, exchange_names=exchange_names,
+            ohlcvs=ohlcvs, start_balances=start_balances,
+            volume_share=volume_share, array_cache=array_cache)
+        contexts.append(BacktestContext(
+            timeframe=timeframe, exchange_backends=exchange_backends,
+            markets_dir=os.path.join(data_dir, MARKETS_DIR),
+            market_cache=market_cache, feature_store=feature_store))
+
+    async def func():
+        instances = [AlgorithmClass(context=context, args=args)
+                     for (AlgorithmClass, args, _), context
+                     in zip(algorithms, contexts)]
+        return await main_loop_many(timeframe=timeframe,
+                                    algorithms=instances)
+    return run_backtest_loop(func(), timeframe=timeframe)
@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import time
+from btrccts.async_exchange import AsyncBacktestExchangeBase
+from btrccts.exchange import BacktestExchangeBase
+
+# Methods of the exchanges which get timed. These are the ccxt methods
+# implemented or rejected by the sync and async backtest exchanges
+# (including the watch methods of the async exchanges).
+EXCHANGE_METHODS = sorted(
+    {'load_markets'} |
+    {name for base in [BacktestExchangeBase, AsyncBacktestExchangeBase]
+     for name in vars(base) if not name.startswith('_')})
+HISTOGRAM_BUCKETS = 48
+
+
+class _Timing:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Bucket i counts durations below 2**i microseconds
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[min(bucket, HISTOGRAM_BUCKETS - 1)] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket containing the quantile
+        needed = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= needed and count > 0:
+                return min(2 ** i / 1e6, self.max)
+        return self.max
+
+
+def _wrap_method(method, name, record):
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            record.call_started()
+            error = None
+            try:
+                return await method(self, *args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                record.call_finished(self.id, name,
+                                     time.perf_counter() - start, error)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        record.call_started()
+        error = None
+        try:
+            return method(self, *args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            record.call_finished(self.id, name, time.perf_counter() - start,
+                                 error)
+    return wrapper
+
+
+def instrument_exchange_class(exchange_class, recorder):
+    # Returns a subclass, which reports the duration and the raised
+    # exception of every exchange method call to recorder
+    # (call_started, call_finished)
+    namespace = {}
+    for name in EXCHANGE_METHODS:
+        method = getattr(exchange_class, name, None)
+        if method is not None:
+            namespace[name] = _wrap_method(method, name, recorder)
+    return type(exchange_class.__name__, (exchange_class,), namespace)
+
+
+class Profiler:
+
+    def __init__(self, slowest_calls=10):
+        self._start = time.perf_counter()
+        self._iteration = _Timing()
+        self._iteration_start = None
+        self._calls = {}
+        # Exchange methods can call other exchange methods, only the
+        # outermost call of a task is an active call. Calls of concurrent
+        # tasks overlap, the exchange time is the time of the iterations,
+        # in which at least one call is active.
+        self._call_depth = contextvars.ContextVar('call_depth', default=0)
+        self._active_calls = 0
+        # Iterations of labeled main loops (see labeled) can overlap, the
+        # profiler is in an iteration while one of them runs
+        self._running_iterations = 0
+        self._labeled = {}
+        self._active_start = None
+        self._exchange_time = 0.0
+        self._slowest_calls = slowest_calls
+        self._slowest = []
+
+    def iteration_started(self):
+        self._running_iterations += 1
+        if self._running_iterations > 1:
+            return
+        self._iteration_start = time.perf_counter()
+        if self._active_calls > 0:
+            self._active_start = self._iteration_start
+
+    def iteration_finished(self):
+        self._running_iterations -= 1
+        if self._running_iterations > 0:
+            return
+        end = time.perf_counter()
+        self._iteration.add(end - self._iteration_start)
+        self._iteration_start = None
+        if self._active_calls > 0:
+            self._exchange_time += end - self._active_start
+
+    def call_started(self):
+        depth = self._call_depth.get()
+        self._call_depth.set(depth + 1)
+        if depth > 0:
+            return
+        if self._active_calls == 0 and self._iteration_start is not None:
+            self._active_start = time.perf_counter()
+        self._active_calls += 1
+
+    def call_finished(self, exchange_id, method, seconds, error=None):
+        depth = self._call_depth.get() - 1
+        self._call_depth.set(depth)
+        if depth == 0:
+            self._active_calls -= 1
+            if self._active_calls == 0 and \
+                    self._iteration_start is not None:
+                self._exchange_time += \
+                    time.perf_counter() - self._active_start
+        name = '{}.{}'.format(exchange_id, method)
+        timing = self._calls.get(name)
+        if timing is None:
+            timing = _Timing()
+            self._calls[name] = timing
+        timing.add(seconds)
+        entry = (seconds, name, self._iteration.count)
+        if len(self._slowest) < self._slowest_calls:
+            heapq.heappush(self._slowest, entry)
+        elif self._slowest_calls > 0:
+            heapq.heappushpop(self._slowest, entry)
+
+    def instrument_exchange_class(self, exchange_class):
+        return instrument_exchange_class(exchange_class, self)
+
+    def labeled(self, label):
+        # Profiler of one of several concurrent main loops, e.g. hosted
+        # algorithms, the iterations are timed per label
+        timing = self._labeled.get(label)
+        if timing is None:
+            timing = _Timing()
+            self._labeled[label] = timing
+        return _LabeledProfiler(self, timing)
+
+    def summary(self):
+        duration = time.perf_counter() - self._start
+        iterations = self._iteration.count
+        per_second = iterations / duration if duration > 0 else 0
+        algorithm_time = self._iteration.total - self._exchange_time
+        other_time = duration - self._iteration.total
+
+        def percent(value):
+            if duration <= 0:
+                return 0
+            return 100 * value / duration
+
+        lines = [
+            'Profile: {} iterations in {:.3f}s ({:.1f} iterations/s)'.format(
+                iterations, duration, per_second),
+            'Algorithm time: {:.3f}s ({:.1f}%), exchange time: {:.3f}s '
+            '({:.1f}%), other: {:.3f}s ({:.1f}%)'.format(
+                algorithm_time, percent(algorithm_time),
+                self._exchange_time, percent(self._exchange_time),
+                other_time, percent(other_time)),
+            '{:<40}{:>10}{:>12}{:>12}{:>12}{:>12}'.format(
+                'Name', 'Count', 'Total s', 'Mean ms', 'p99 ms', 'Max ms'),
+        ]
+        timings = [('next_iteration', self._iteration)]
+        timings += [('{}.next_iteration'.format(label), timing)
+                    for label, timing in sorted(self._labeled.items())]
+        timings += sorted(self._calls.items(),
+                          key=lambda x: x[1].total, reverse=True)
+        for name, timing in timings:
+            if timing.count == 0:
+                continue
+            lines.append('{:<40}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}'
+                         .format(name, timing.count, timing.total,
+                                 1000 * timing.total / timing.count,
+                                 1000 * timing.quantile(0.99),
+                                 1000 * timing.max))
+        if len(self._slowest) > 0:
+            lines.append('Slowest calls:')
+            for seconds, name, iteration in sorted(self._slowest,
+                                                   reverse=True):
+                lines.append('{:>12.3f} ms {} (iteration {})'.format(
+                    1000 * seconds, name, iteration + 1))
+        return '\n'.join(lines)
+
+
+class _LabeledProfiler:
+
+    def __init__(self, profiler, timing):
+        self._profiler = profiler
+        self._timing = timing
+        self._start = None
+
+    def iteration_started(self):
+        self._profiler.iteration_started()
+        self._start = time.perf_counter()
+
+    def iteration_finished(self):
+        self._timing.add(time.perf_counter() - self._start)
+        self._profiler.iteration_finished()
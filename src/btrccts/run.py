@@ -1,35 +1,53 @@
-import appdirs
-import argparse
 import asyncio
-import json
 import logging
 import numpy
 import os
 import pandas
-from ccxt.base.errors import NotSupported
-from ccxt.base.exchange import Exchange
+import time
 from enum import Enum, auto
+from btrccts import cli
+from btrccts.cli import USER_CONFIG_DIR, USER_DATA_DIR
+from btrccts.checkpoint import Checkpointer, load_checkpoint, \
+    restore_algorithm_state, restore_context
 from btrccts.context import BacktestContext, LiveContext, StopException
+from btrccts.event_loop import run_backtest_loop
 from btrccts.exchange_backend import ExchangeBackend
+from btrccts.features import data_feature_store
+from btrccts.markets import MARKETS_DIR
+from btrccts.profiling import Profiler
 from btrccts.timeframe import Timeframe
+from btrccts.watch import TimeframeFinished, step
 
-USER_CONFIG_DIR = appdirs.user_config_dir(__package__)
-USER_DATA_DIR = appdirs.user_data_dir(__package__)
-SLEEP_SECONDS = 1
-HELP_EPILOG = """
-Default config directory: {data}
-Default data directory: {config}
-""".format(config=USER_CONFIG_DIR, data=USER_DATA_DIR)
+# Longest sleep without comparing the wall clock with the monotonic clock
+CLOCK_CHECK_SECONDS = 60
+# Changes of the wall clock, which are bigger, are logged as clock jumps
+CLOCK_JUMP_SECONDS = 0.1
+# Timers of the event loop have a resolution of about one millisecond,
+# the rest is waited by yielding to the event loop
+SPIN_SECONDS = 0.002
+# The command line entry point is in btrccts.cli, so the arguments are
+# parsed without importing ccxt and pandas
+parse_params_and_execute_algorithm = cli.parse_params_and_execute_algorithm
 
 
-async def _run_a_or_sync(func, *args, **kwargs):
+_run_async = asyncio.run
+ALGORITHM_METHODS = ['next_iteration', 'exit', 'handle_exception']
+
+
+def _async_callable(func):
+    # Decide once, so the iterations do not need to check the type
     if asyncio.iscoroutinefunction(func):
-        return await func(*args, **kwargs)
-    else:
+        return func
+
+    async def wrapper(*args, **kwargs):
         return func(*args, **kwargs)
+    return wrapper
 
 
-_run_async = asyncio.run
+def _is_sync_algorithm(algorithm):
+    # Works with the algorithm class and instance
+    return not any(asyncio.iscoroutinefunction(getattr(algorithm, name))
+                   for name in ALGORITHM_METHODS)
 
 
 def load_ohlcvs(ohlcv_dir, exchange_names, symbols):
@@ -81,46 +99,86 @@ class ExitReason(Enum):
     FINISHED = auto()
 
 
+def _clock_offset():
+    # Difference between the wall clock and the monotonic clock
+    return time.time() - time.monotonic()
+
+
 async def sleep_until(date):
-    # Use a loop, so if the system clock changes, we dont sleep too long/short
+    # Sleeps with the monotonic clock, which does not jump, until the wall
+    # clock reaches date. Slow corrections of the wall clock (ntp) are
+    # followed, jumps of the wall clock are detected when waking up, at
+    # least every CLOCK_CHECK_SECONDS.
+    # Returns the sum of the detected clock jumps in seconds.
+    logger = logging.getLogger(__package__)
+    target = date.value / 10**9
+    offset = _clock_offset()
+    jumped = 0
     while True:
-        now = pandas.Timestamp.now(tz='UTC')
-        if date <= now:
-            return
-        sleep_sec = SLEEP_SECONDS
-        diff = (date - now).value / 10**9
-        if diff < SLEEP_SECONDS:
-            sleep_sec = diff
-        await asyncio.sleep(sleep_sec)
+        remaining = target - offset - time.monotonic()
+        if remaining <= 0:
+            return jumped
+        if remaining > SPIN_SECONDS:
+            await asyncio.sleep(min(remaining - SPIN_SECONDS,
+                                    CLOCK_CHECK_SECONDS))
+        else:
+            await asyncio.sleep(0)
+        new_offset = _clock_offset()
+        if abs(new_offset - offset) > CLOCK_JUMP_SECONDS:
+            logger.warning('System clock jumped by {:.3f} seconds'
+                           .format(new_offset - offset))
+            jumped += new_offset - offset
+        offset = new_offset
 
 
-async def main_loop(timeframe, algorithm, live=False):
+async def main_loop(timeframe, algorithm, live=False, finish=True,
+                    checkpointer=None, profiler=None, metrics=None,
+                    scheduler=None):
     logger = logging.getLogger(__package__)
     logger.info('Starting main_loop')
+    next_iteration = _async_callable(algorithm.next_iteration)
+    handle_exception = _async_callable(algorithm.handle_exception)
+    exit = _async_callable(algorithm.exit)
     while not timeframe.finished():
+        if metrics is not None:
+            metrics.iteration_started(timeframe, live=live)
         try:
             try:
-                await _run_a_or_sync(algorithm.next_iteration)
+                if profiler is not None:
+                    profiler.iteration_started()
+                try:
+                    await next_iteration()
+                finally:
+                    if profiler is not None:
+                        profiler.iteration_finished()
+            except TimeframeFinished:
+                # A watch method reached the end of the timeframe
+                break
             except (SystemExit, KeyboardInterrupt, StopException,
                     asyncio.CancelledError) as e:
                 logger.info('Stopped because of {}: {}'.format(
                     type(e).__name__, e))
-                await _run_a_or_sync(algorithm.exit,
-                                     reason=ExitReason.STOPPED)
+                await exit(reason=ExitReason.STOPPED)
                 return algorithm
             except BaseException as e:
+                if metrics is not None:
+                    metrics.iteration_failed()
                 logger.error('Error occurred during next_iteration')
                 logger.exception(e)
                 try:
-                    await _run_a_or_sync(algorithm.handle_exception, e)
+                    await handle_exception(e)
                 except BaseException as e:
                     logger.error(
                         'Exiting because of exception in handle_exception')
                     logger.exception(e)
-                    await _run_a_or_sync(algorithm.exit,
-                                         reason=ExitReason.EXCEPTION)
+                    await exit(reason=ExitReason.EXCEPTION)
                     raise e
-            timeframe.add_timedelta()
+            # A watcher of a background task can wait for the next date
+            step(timeframe)
+            if checkpointer is not None:
+                checkpointer.iteration_finished()
+            if metrics is not None:
+                metrics.iteration_finished()
             if live:
                 # We already added a timedelta.
                 # If the algo took longer then timedelta,
@@ -128,130 +186,224 @@ async def main_loop(timeframe, algorithm, live=False):
                 timeframe.add_timedelta_until(pandas.Timestamp.now(tz='UTC'))
                 next_date = timeframe.date()
                 if next_date is not None:
-                    await sleep_until(next_date)
+                    if scheduler is None:
+                        clock_jump = await sleep_until(next_date)
+                    else:
+                        clock_jump = await scheduler.sleep_until(next_date)
+                    if metrics is not None:
+                        metrics.slept(next_date, clock_jump=clock_jump)
         except (SystemExit, KeyboardInterrupt, asyncio.CancelledError) as e:
             logger.info('Stopped because of {}: {}'.format(
                 type(e).__name__, e))
-            await _run_a_or_sync(algorithm.exit, reason=ExitReason.STOPPED)
+            await exit(reason=ExitReason.STOPPED)
+            return algorithm
+    if not finish:
+        # The caller wants to continue later with an extended timeframe
+        logger.info('Paused main_loop')
+        return algorithm
+    await exit(reason=ExitReason.FINISHED)
+    logger.info('Finished main_loop')
+    return algorithm
+
+
+def main_loop_sync(timeframe, algorithm, finish=True,
+                   checkpointer=None, profiler=None, metrics=None):
+    # Same as main_loop for backtests, but without an event loop.
+    # Only for algorithms, which do not have async methods.
+    if not _is_sync_algorithm(algorithm):
+        raise ValueError('main_loop_sync: algorithm needs to be synchronous')
+    logger = logging.getLogger(__package__)
+    logger.info('Starting main_loop')
+    next_iteration = algorithm.next_iteration
+    while not timeframe.finished():
+        if metrics is not None:
+            metrics.iteration_started(timeframe, live=False)
+        try:
+            if profiler is not None:
+                profiler.iteration_started()
+            try:
+                next_iteration()
+            finally:
+                if profiler is not None:
+                    profiler.iteration_finished()
+        except (SystemExit, KeyboardInterrupt, StopException,
+                asyncio.CancelledError) as e:
+            logger.info('Stopped because of {}: {}'.format(
+                type(e).__name__, e))
+            algorithm.exit(reason=ExitReason.STOPPED)
             return algorithm
-    await _run_a_or_sync(algorithm.exit, reason=ExitReason.FINISHED)
+        except BaseException as e:
+            if metrics is not None:
+                metrics.iteration_failed()
+            logger.error('Error occurred during next_iteration')
+            logger.exception(e)
+            try:
+                algorithm.handle_exception(e)
+            except BaseException as e:
+                logger.error(
+                    'Exiting because of exception in handle_exception')
+                logger.exception(e)
+                algorithm.exit(reason=ExitReason.EXCEPTION)
+                raise e
+        timeframe.add_timedelta()
+        if checkpointer is not None:
+            checkpointer.iteration_finished()
+        if metrics is not None:
+            metrics.iteration_finished()
+    if not finish:
+        logger.info('Paused main_loop')
+        return algorithm
+    algorithm.exit(reason=ExitReason.FINISHED)
     logger.info('Finished main_loop')
     return algorithm
 
 
+def _backtest_main_loop(AlgorithmClass):
+    # Sync algorithms run in main_loop_sync, so their iterations are not
+    # dispatched through the event loop
+    if not _is_sync_algorithm(AlgorithmClass):
+        return main_loop
+
+    async def loop(**kwargs):
+        return main_loop_sync(**kwargs)
+    return loop
+
+
+def _create_exchange_backends(timeframe, exchange_names, ohlcvs,
+                              start_balances, volume_share=None,
+                              array_cache=None):
+    exchange_backends = {}
+    for exchange_name in exchange_names:
+        exchange_backends[exchange_name] = ExchangeBackend(
+            timeframe=timeframe,
+            balances=start_balances.get(exchange_name, {}),
+            ohlcvs=ohlcvs.get(exchange_name, {}),
+            volume_share=volume_share,
+            array_cache=array_cache)
+    return exchange_backends
+
+
+def _fetch_balances(exchange_backends):
+    return {name: backend.fetch_balance()
+            for name, backend in exchange_backends.items()}
+
+
+def _create_metrics(metrics_file, metrics_port, labelnames=()):
+    if metrics_file is None and metrics_port is None:
+        return None
+    # Imported here, the http server is not needed without metrics
+    from btrccts.metrics import HttpExporter, MetricsRegistry, \
+        RunMetrics, TextFileExporter
+    registry = MetricsRegistry()
+    exporters = []
+    if metrics_file is not None:
+        exporters.append(TextFileExporter(registry=registry,
+                                          path=metrics_file))
+    if metrics_port is not None:
+        exporters.append(HttpExporter(registry=registry, port=metrics_port))
+    return RunMetrics(registry=registry, exporters=exporters,
+                      labelnames=labelnames)
+
+
 def execute_algorithm(exchange_names, symbols, AlgorithmClass, args,
                       start_balances,
                       pd_start_date, pd_end_date, pd_interval,
                       live, auth_aliases,
                       data_dir=USER_DATA_DIR,
-                      conf_dir=USER_CONFIG_DIR):
+                      conf_dir=USER_CONFIG_DIR,
+                      checkpoint_file=None, checkpoint_every=1000,
+                      resume=False, profile=False,
+                      metrics_file=None, metrics_port=None,
+                      volume_share=None):
     timeframe = Timeframe(pd_start_date=pd_start_date,
                           pd_end_date=pd_end_date,
                           pd_interval=pd_interval)
     ohlcv_dir = os.path.join(data_dir, 'ohlcv')
+    if resume and checkpoint_file is None:
+        raise ValueError('Resume needs a checkpoint file')
+    checkpoint = None
+    profiler = None
+    if profile:
+        profiler = Profiler()
+    metrics = _create_metrics(metrics_file=metrics_file,
+                              metrics_port=metrics_port)
     if live:
+        if checkpoint_file is not None:
+            raise ValueError('Checkpoints cannot be used in live mode')
         context = LiveContext(timeframe=timeframe,
                               conf_dir=conf_dir,
-                              auth_aliases=auth_aliases)
+                              auth_aliases=auth_aliases,
+                              profiler=profiler,
+                              metrics=metrics)
     else:
         ohlcvs = load_ohlcvs(ohlcv_dir=ohlcv_dir,
                              exchange_names=exchange_names,
                              symbols=symbols)
-        exchange_backends = {}
-        for exchange_name in exchange_names:
-            exchange_backends[exchange_name] = ExchangeBackend(
-                timeframe=timeframe,
-                balances=start_balances.get(exchange_name, {}),
-                ohlcvs=ohlcvs.get(exchange_name, {}))
+        exchange_backends = _create_exchange_backends(
+            timeframe=timeframe, exchange_names=exchange_names,
+            ohlcvs=ohlcvs, start_balances=start_balances,
+            volume_share=volume_share)
         context = BacktestContext(timeframe=timeframe,
-                                  exchange_backends=exchange_backends)
+                                  exchange_backends=exchange_backends,
+                                  profiler=profiler,
+                                  markets_dir=os.path.join(data_dir,
+                                                           MARKETS_DIR),
+                                  feature_store=data_feature_store(data_dir))
+        if resume:
+            checkpoint = load_checkpoint(checkpoint_file)
+            restore_context(context=context, timeframe=timeframe,
+                            checkpoint=checkpoint)
 
-    async def func():
+    def start():
         algorithm = AlgorithmClass(context=context,
                                    args=args)
-        return await main_loop(timeframe=timeframe,
-                               algorithm=algorithm,
-                               live=live)
-    return _run_async(func())
-
-
-def parse_params_and_execute_algorithm(AlgorithmClass):
-    parser = argparse.ArgumentParser(
-        epilog=HELP_EPILOG, formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument('--start-date', default='',
-                        help='Date to start backtesting, ignored in live mode')
-    parser.add_argument('--end-date', default='2009-01-01',
-                        help='Date to end backtesting')
-    parser.add_argument('--interval', default='1m',
-                        help='Timedelta between each iteration')
-    parser.add_argument('--exchanges', default='',
-                        help='Exchange ids comma separated to load ohlcv')
-    parser.add_argument('--symbols', default='',
-                        help='Symbols (comma separated) to load ohlcv '
-                             'per exchange')
-    parser.add_argument('--data-directory', default=USER_DATA_DIR,
-                        help='directory where data is stored'
-                             ' (e.g. ohlcv data')
-    parser.add_argument('--config-directory', default=USER_CONFIG_DIR,
-                        help='directory where config is stored'
-                             ' (e.g. exchange parameters')
-    parser.add_argument('--auth-aliases', default='{}',
-                        help='Auth aliases for different exchange'
-                             ' config files')
-    parser.add_argument('--live', action='store_true',
-                        help='Trade live on exchanges')
-    parser.add_argument('--start-balances', default='{}',
-                        help='Balance at start (json): '
-                             '{"exchange": {"BTC": 3}}')
-    AlgorithmClass.configure_argparser(parser)
-    args = parser.parse_args()
-    logger = logging.getLogger(__package__)
+        checkpointer = None
+        if checkpoint is not None:
+            restore_algorithm_state(algorithm, checkpoint['algorithm'])
+        if checkpoint_file is not None:
+            checkpointer = Checkpointer(path=checkpoint_file,
+                                        context=context,
+                                        algorithm=algorithm,
+                                        every=checkpoint_every)
+        return algorithm, checkpointer
 
-    def split_parameters(p):
-        if p == '':
-            return []
-        return p.split(',')
-
-    exchange_names = split_parameters(args.exchanges)
-    symbols = split_parameters(args.symbols)
-    if not args.live:
-        if len(exchange_names) == 0:
-            logger.warning('No exchanges specified, do not load ohlcv')
-        if len(symbols) == 0:
-            logger.warning('No symbols specified, load all ohlcvs per each '
-                           'exchange. This can lead to long start times')
-    try:
-        pd_interval = pandas.Timedelta(
-            Exchange.parse_timeframe(args.interval), unit='s')
-    except (NotSupported, ValueError):
-        raise ValueError('Interval is not valid')
-    auth_aliases = {}
-    if args.live:
-        if args.start_date != '':
-            raise ValueError('Start date cannot be set in live mode')
-        if args.start_balances != '{}':
-            raise ValueError('Start balance cannot be set in live mode')
-        pd_start_date = pandas.Timestamp.now(tz='UTC').floor(pd_interval)
-        start_balances = None
-        auth_aliases = json.loads(args.auth_aliases)
-    else:
-        pd_start_date = pandas.to_datetime(args.start_date, utc=True)
-        start_balances = json.loads(args.start_balances)
-    pd_end_date = pandas.to_datetime(args.end_date, utc=True)
-    if pandas.isnull(pd_start_date):
-        raise ValueError('Start date is not valid')
-    if pandas.isnull(pd_end_date):
-        raise ValueError('End date is not valid')
-
-    return execute_algorithm(exchange_names=exchange_names,
-                             symbols=symbols,
-                             pd_start_date=pd_start_date,
-                             pd_end_date=pd_end_date,
-                             pd_interval=pd_interval,
-                             conf_dir=args.config_directory,
-                             data_dir=args.data_directory,
-                             AlgorithmClass=AlgorithmClass,
-                             args=args,
-                             auth_aliases=auth_aliases,
-                             live=args.live,
-                             start_balances=start_balances)
+    def stop(checkpointer):
+        if metrics is not None:
+            metrics.close()
+        if checkpointer is not None:
+            checkpointer.close()
+        if profiler is not None:
+            logger = logging.getLogger(__package__)
+            logger.info(profiler.summary())
+
+    if not live and _is_sync_algorithm(AlgorithmClass):
+        # Sync algorithms do not need an event loop in backtests
+        algorithm, checkpointer = start()
+        try:
+            if metrics is not None:
+                metrics.start()
+            return main_loop_sync(timeframe=timeframe,
+                                  algorithm=algorithm,
+                                  checkpointer=checkpointer,
+                                  profiler=profiler,
+                                  metrics=metrics)
+        finally:
+            stop(checkpointer)
+
+    async def func():
+        algorithm, checkpointer = start()
+        try:
+            if metrics is not None:
+                metrics.start()
+            return await main_loop(timeframe=timeframe,
+                                   algorithm=algorithm,
+                                   live=live,
+                                   checkpointer=checkpointer,
+                                   profiler=profiler,
+                                   metrics=metrics)
+        finally:
+            stop(checkpointer)
+    if live:
+        return _run_async(func())
+    # Timers of async algorithms use the simulated time
+    return run_backtest_loop(func(), timeframe=timeframe)
@@ -0,0 +1,131 @@
+import logging
+import os
+from btrccts.context import BacktestContext, MarketCache
+from btrccts.event_loop import run_backtest_loop
+from btrccts.features import data_feature_store
+from btrccts.markets import MARKETS_DIR
+from btrccts.run import ExitReason, USER_DATA_DIR, _async_callable, \
+    _backtest_main_loop, _create_exchange_backends, _fetch_balances, \
+    load_ohlcvs
+from btrccts.timeframe import Timeframe
+from btrccts.window import OhlcvArrayCache
+
+
+class _RunClock:
+
+    # The clock of the event loop follows the timeframe of the running
+    # candidate. The clock does not go backwards, when the next candidate
+    # starts at an earlier date, but timers only depend on the differences.
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+
+    def date(self):
+        return self.timeframe.date()
+
+
+def successive_halving(exchange_names, symbols, AlgorithmClass, candidates,
+                       score, start_balances,
+                       pd_start_date, pd_end_date, pd_interval,
+                       pd_first_duration, keep_fraction=0.5,
+                       data_dir=USER_DATA_DIR, volume_share=None):
+    # All candidates run on a short prefix of the timeframe, the best
+    # keep_fraction of them get extended. Runs are not restarted, the
+    # surviving algorithms continue from their state at the end of the
+    # previous round. score is called with the algorithm and the balances
+    # of all exchanges, a higher score is better.
+    # Scores of different rounds cover different periods, so the result is
+    # ranked by the last round of the candidates and then by score.
+    if not 0 < keep_fraction < 1:
+        raise ValueError('keep_fraction needs to be between 0 and 1')
+    if pd_first_duration.value <= 0:
+        raise ValueError('first duration needs to be positive')
+    logger = logging.getLogger(__package__)
+    ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                         exchange_names=exchange_names,
+                         symbols=symbols)
+    # The candidates share the parsed markets and the read only arrays
+    # of the ohlcv data
+    market_cache = MarketCache()
+    array_cache = OhlcvArrayCache()
+    feature_store = data_feature_store(data_dir)
+    runs = []
+    for args in candidates:
+        # The timeframe covers the whole period, so the ohlcv data gets
+        # checked once for all rounds
+        timeframe = Timeframe(pd_start_date=pd_start_date,
+                              pd_end_date=pd_end_date,
+                              pd_interval=pd_interval)
+        exchange_backends = _create_exchange_backends(
+            timeframe=timeframe, exchange_names=exchange_names,
+            ohlcvs=ohlcvs, start_balances=start_balances,
+            volume_share=volume_share, array_cache=array_cache)
+        context = BacktestContext(timeframe=timeframe,
+                                  exchange_backends=exchange_backends,
+                                  markets_dir=os.path.join(data_dir,
+                                                           MARKETS_DIR),
+                                  market_cache=market_cache,
+                                  feature_store=feature_store)
+        runs.append({
+            'args': args,
+            'timeframe': timeframe,
+            'exchange_backends': exchange_backends,
+            'context': context,
+            'algorithm': None,
+            'score': None,
+            'round': None,
+        })
+
+    main_loop = _backtest_main_loop(AlgorithmClass)
+    clock = _RunClock(Timeframe(pd_start_date=pd_start_date,
+                                pd_end_date=pd_end_date,
+                                pd_interval=pd_interval))
+
+    async def func():
+        for run in runs:
+            run['algorithm'] = AlgorithmClass(context=run['context'],
+                                              args=run['args'])
+        active = runs
+        pd_duration = pd_first_duration
+        round_number = 0
+        while len(active) > 0:
+            pd_round_end = pd_start_date + pd_duration
+            last_round = pd_round_end >= pd_end_date or len(active) == 1
+            if last_round:
+                pd_round_end = pd_end_date
+            logger.info('Successive halving: run {} candidates until {}'
+                        .format(len(active), pd_round_end))
+            for run in active:
+                timeframe = run['timeframe']
+                timeframe.set_end_date(pd_round_end)
+                clock.timeframe = timeframe
+                await main_loop(timeframe=timeframe,
+                                algorithm=run['algorithm'],
+                                finish=last_round)
+                run['score'] = score(
+                    algorithm=run['algorithm'],
+                    balances=_fetch_balances(run['exchange_backends']))
+                run['round'] = round_number
+            if last_round:
+                break
+            # Candidates which stopped themselves already exited,
+            # they cannot be extended
+            running = [run for run in active if run['timeframe'].finished()]
+            running.sort(key=lambda run: run['score'], reverse=True)
+            keep = max(1, int(len(running) * keep_fraction))
+            for run in running[keep:]:
+                await _async_callable(run['algorithm'].exit)(
+                    reason=ExitReason.STOPPED)
+            active = running[:keep]
+            pd_duration = pd_duration / keep_fraction
+            round_number += 1
+        return sorted(runs, key=lambda run: (run['round'], run['score']),
+                      reverse=True)
+
+    # Timers of async algorithms use the simulated time
+    result = run_backtest_loop(func(), timeframe=clock)
+    return [{'args': run['args'],
+             'algorithm': run['algorithm'],
+             'score': run['score'],
+             'round': run['round'],
+             'end_date': run['timeframe'].date()} for run in result]
@@ -0,0 +1,125 @@
+import argparse
+import logging
+import numpy
+import os
+import pandas
+import zlib
+from btrccts.cli import USER_DATA_DIR
+
+MINUTES_PER_YEAR = 365 * 24 * 60
+CHUNK_MINUTES = 24 * 60 * 7
+
+
+def _generators(seed):
+    # One generator per random component: the output does not depend on
+    # the chunk size
+    return [numpy.random.default_rng(s)
+            for s in numpy.random.SeedSequence(seed).spawn(4)]
+
+
+def generate_ohlcv(pd_start_date, pd_end_date, seed=0, start_price=100,
+                   drift=0, volatility=0.8, volume=10,
+                   chunk_minutes=CHUNK_MINUTES):
+    # Yields dataframes with 1 minute candles from pd_start_date until
+    # pd_end_date (inclusive). The close prices follow a geometric brownian
+    # motion with the yearly drift and volatility, open is the previous
+    # close, high and low lie outside of open and close.
+    # Volume is lognormal distributed around volume.
+    pd_start_date = pd_start_date.floor('1min')
+    pd_end_date = pd_end_date.floor('1min')
+    if pd_end_date < pd_start_date:
+        raise ValueError('Synthetic: end date needs to be after start date')
+    if start_price <= 0:
+        raise ValueError('Synthetic: start price needs to be positive')
+    if chunk_minutes <= 0:
+        raise ValueError('Synthetic: chunk minutes needs to be positive')
+    returns, highs, lows, volumes = _generators(seed)
+    sigma = volatility / numpy.sqrt(MINUTES_PER_YEAR)
+    mu = drift / MINUTES_PER_YEAR - sigma**2 / 2
+    minutes = int((pd_end_date - pd_start_date) / pandas.Timedelta('1min')) + 1
+    price = float(start_price)
+    for start in range(0, minutes, chunk_minutes):
+        size = min(chunk_minutes, minutes - start)
+        close = price * numpy.exp(numpy.cumsum(
+            returns.normal(mu, sigma, size)))
+        opens = numpy.concatenate([[price], close[:-1]])
+        price = close[-1]
+        yield pandas.DataFrame(
+            data={
+                'open': opens,
+                'high': numpy.maximum(opens, close) * numpy.exp(
+                    numpy.abs(highs.normal(0, sigma / 2, size))),
+                'low': numpy.minimum(opens, close) * numpy.exp(
+                    -numpy.abs(lows.normal(0, sigma / 2, size))),
+                'close': close,
+                'volume': volume * volumes.lognormal(0, 1, size),
+            },
+            index=pandas.date_range(
+                pd_start_date + pandas.Timedelta(minutes=start),
+                periods=size, freq='1min'))
+
+
+def write_ohlcv_csv(path, chunks):
+    # Writes the chunks one after another, so only one chunk is in memory
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = 0
+    with open(path, 'w') as f:
+        for index, chunk in enumerate(chunks):
+            chunk.to_csv(f, header=index == 0, float_format='%.10g')
+            rows += len(chunk.index)
+    return rows
+
+
+def _symbol_seed(seed, exchange_name, symbol):
+    # Every file has its own seed, which does not change, if other
+    # exchanges or symbols are generated
+    return [seed, zlib.crc32('{}/{}'.format(exchange_name, symbol).encode())]
+
+
+def generate_data_directory(data_dir, exchange_names, symbols,
+                            pd_start_date, pd_end_date, seed=0, **kwargs):
+    # Writes data_dir/ohlcv/EXCHANGE/BASE/QUOTE.csv for every exchange and
+    # symbol. kwargs are passed to generate_ohlcv.
+    logger = logging.getLogger(__package__)
+    for exchange_name in exchange_names:
+        for symbol in symbols:
+            path = os.path.join(data_dir, 'ohlcv', exchange_name,
+                                '{}.csv'.format(symbol))
+            rows = write_ohlcv_csv(path, generate_ohlcv(
+                pd_start_date=pd_start_date, pd_end_date=pd_end_date,
+                seed=_symbol_seed(seed, exchange_name, symbol), **kwargs))
+            logger.info('Wrote {} candles to {}'.format(rows, path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write synthetic 1 minute ohlcv data to the data '
+                    'directory')
+    parser.add_argument('--exchanges', required=True,
+                        help='Exchange ids comma separated')
+    parser.add_argument('--symbols', required=True,
+                        help='Symbols comma separated')
+    parser.add_argument('--start-date', required=True)
+    parser.add_argument('--end-date', required=True)
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--start-price', default=100, type=float)
+    parser.add_argument('--drift', default=0, type=float,
+                        help='Yearly drift of the price')
+    parser.add_argument('--volatility', default=0.8, type=float,
+                        help='Yearly volatility of the price')
+    parser.add_argument('--data-directory', default=USER_DATA_DIR,
+                        help='directory where data is stored')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    generate_data_directory(
+        data_dir=args.data_directory,
+        exchange_names=args.exchanges.split(','),
+        symbols=args.symbols.split(','),
+        pd_start_date=pandas.to_datetime(args.start_date, utc=True),
+        pd_end_date=pandas.to_datetime(args.end_date, utc=True),
+        seed=args.seed, start_price=args.start_price, drift=args.drift,
+        volatility=args.volatility)
+
+
+if __name__ == '__main__':
+    main()
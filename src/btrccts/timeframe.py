@@ -25,8 +25,30 @@ class Timeframe:
     def start_date(self):
         return self._pd_start_date
 
+    def set_end_date(self, pd_end_date):
+        if pd_end_date < self._pd_start_date:
+            raise ValueError('Timeframe: end date is smaller then start date')
+        self._pd_end_date = pd_end_date
+
     def end_date(self):
         return self._pd_end_date
 
+    def interval(self):
+        return self._pd_interval
+
     def finished(self):
         return self._pd_current_date > self._pd_end_date
+
+    def get_state(self):
+        return {
+            'start_date': self._pd_start_date,
+            'current_date': self._pd_current_date,
+            'end_date': self._pd_end_date,
+            'interval': self._pd_interval,
+        }
+
+    def set_state(self, state):
+        self._pd_start_date = state['start_date']
+        self._pd_current_date = state['current_date']
+        self._pd_end_date = state['end_date']
+        self._pd_interval = state['interval']
@@ -0,0 +1,213 @@
+import numpy
+import pandas
+from ccxt.base.errors import InsufficientFunds
+from btrccts.check_dataframe import _check_dataframe
+from btrccts.exchange_account import MARKET_ORDER_FACTOR
+
+# Simulates orders over the whole timeframe at once, without calling an
+# algorithm every iteration. The orders are given as arrays with one value
+# per date of the timeframe (see timeframe_dates). Orders are filled with
+# the same rules as in ExchangeAccount:
+# - market orders are filled immediately, a little worse than the high/low
+# - limit orders are filled at the limit price at the first minute after
+#   the order date, where the low (buy) or high (sell) reaches the price
+# - market orders pay the taker fee, limit orders the maker fee
+
+_MARKET_FACTOR = float(MARKET_ORDER_FACTOR)
+# Float results are not exact like the Decimals in ExchangeAccount
+_BALANCE_TOLERANCE = 1e-9
+
+
+def timeframe_dates(timeframe):
+    return pandas.date_range(timeframe.start_date(), timeframe.end_date(),
+                             freq=timeframe.interval())
+
+
+def _check_values(values, name, symbol, length):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if values.shape != (length,):
+        raise ValueError('Vectorized: {} of {} need one value per date'
+                         .format(name, symbol))
+    return values
+
+
+def _first_fill_rows(values, rows, prices, buy):
+    # First row after every order row, where the price is reached.
+    # Most limit orders are filled soon or never, so search in growing chunks
+    result = numpy.full(len(rows), -1)
+    for i, (row, price) in enumerate(zip(rows, prices)):
+        start = row + 1
+        chunk = 64
+        while start < len(values):
+            window = values[start:start + chunk]
+            reached = window <= price if buy else window >= price
+            if reached.any():
+                result[i] = start + reached.argmax()
+                break
+            start += chunk
+            chunk *= 4
+    return result
+
+
+def simulate_orders(timeframe, ohlcvs, markets, amounts, prices={},
+                    balances={}):
+    # amounts: per symbol, positive amounts buy, negative amounts sell,
+    #          0 or nan create no order
+    # prices: per symbol, limit price of the order, nan for market orders.
+    #         Symbols without prices only create market orders
+    if timeframe.interval() % pandas.Timedelta(minutes=1) != \
+            pandas.Timedelta(0):
+        raise ValueError('Vectorized: interval needs to be a multiple of '
+                         '1 minute')
+    dates = timeframe_dates(timeframe)
+    start_date = timeframe.start_date()
+    minutes = int((timeframe.end_date() - start_date) /
+                  pandas.Timedelta(minutes=1)) + 1
+    grid_rows = numpy.asarray((dates - start_date) //
+                              pandas.Timedelta(minutes=1))
+    currencies = {}
+    changes = []
+    order_frames = []
+    for symbol in amounts:
+        market = markets.get(symbol)
+        if market is None:
+            raise ValueError('Vectorized: no market for {}'.format(symbol))
+        ohlcv = ohlcvs.get(symbol)
+        if ohlcv is None:
+            raise ValueError('Vectorized: no prices for {}'.format(symbol))
+        ohlcv = _check_dataframe(ohlcv, timeframe)[
+            start_date:timeframe.end_date()]
+        if ohlcv.index[0] != start_date:
+            raise ValueError('Vectorized: start date needs to be a full '
+                             'minute')
+        high = ohlcv['high'].values
+        low = ohlcv['low'].values
+        amount = _check_values(amounts[symbol], 'amounts', symbol,
+                               len(dates))
+        if symbol in prices:
+            price = _check_values(prices[symbol], 'prices', symbol,
+                                  len(dates))
+        else:
+            price = numpy.full(len(dates), numpy.nan)
+        has_order = numpy.isfinite(amount) & (amount != 0)
+        if (price[has_order] <= 0).any():
+            raise ValueError('Vectorized: prices need to be positive')
+        rows = grid_rows[has_order]
+        amount = amount[has_order]
+        price = price[has_order]
+        buy = amount > 0
+        amount = numpy.abs(amount)
+        limit = numpy.isfinite(price)
+
+        fill_rows = rows.copy()
+        fill_rows[limit & buy] = _first_fill_rows(
+            low, rows[limit & buy], price[limit & buy], buy=True)
+        fill_rows[limit & ~buy] = _first_fill_rows(
+            high, rows[limit & ~buy], price[limit & ~buy], buy=False)
+        fill_price = price.copy()
+        fill_price[~limit & buy] = \
+            (1 + _MARKET_FACTOR) * high[rows[~limit & buy]]
+        fill_price[~limit & ~buy] = \
+            (1 - _MARKET_FACTOR) * low[rows[~limit & ~buy]]
+        fee = numpy.where(limit, float(market.get('maker', 0)),
+                          float(market.get('taker', 0)))
+        filled = fill_rows >= 0
+
+        base = currencies.setdefault(market['base'], len(currencies))
+        quote = currencies.setdefault(market['quote'], len(currencies))
+        cost = fill_price * amount
+        # Limit orders block the balance from creation until the fill
+        blocked = numpy.where(buy, cost, amount)
+        blocked_currency = numpy.where(buy, quote, base)
+        changes.append((rows[limit], blocked_currency[limit],
+                        0, blocked[limit]))
+        changes.append((fill_rows[limit & filled],
+                        blocked_currency[limit & filled],
+                        0, -blocked[limit & filled]))
+        # Filled orders pay with one currency and receive the other
+        f_rows = fill_rows[filled]
+        f_buy = buy[filled]
+        f_amount = amount[filled]
+        f_cost = cost[filled]
+        f_fee = fee[filled]
+        changes.append((f_rows, numpy.where(f_buy, quote, base),
+                        -numpy.where(f_buy, f_cost, f_amount), 0))
+        changes.append((f_rows, numpy.where(f_buy, base, quote),
+                        numpy.where(f_buy, f_amount, f_cost) * (1 - f_fee),
+                        0))
+
+        fill_dates = pandas.DatetimeIndex(
+            start_date + pandas.to_timedelta(numpy.maximum(fill_rows, 0),
+                                             unit='min'))
+        order_frames.append(pandas.DataFrame({
+            'date': start_date + pandas.to_timedelta(rows, unit='min'),
+            'symbol': symbol,
+            'type': numpy.where(limit, 'limit', 'market'),
+            'side': numpy.where(buy, 'buy', 'sell'),
+            'amount': amount,
+            'price': fill_price,
+            'fee_rate': fee,
+            'status': numpy.where(filled, 'closed', 'open'),
+            'fill_date': fill_dates.where(filled),
+        }))
+
+    for currency in balances:
+        currencies.setdefault(currency, len(currencies))
+    names = list(currencies)
+    total = numpy.zeros((minutes, len(names)))
+    used = numpy.zeros((minutes, len(names)))
+    for rows, currency, total_change, used_change in changes:
+        if len(rows) == 0:
+            continue
+        index = (rows, numpy.broadcast_to(currency, rows.shape))
+        numpy.add.at(total, index,
+                     numpy.broadcast_to(total_change, rows.shape))
+        numpy.add.at(used, index,
+                     numpy.broadcast_to(used_change, rows.shape))
+    start = numpy.array([float(balances.get(name, 0)) for name in names])
+    total = start + numpy.cumsum(total, axis=0)
+    used_increased = used > 0
+    used = numpy.cumsum(used, axis=0)
+    # Like Balance: the used balance is only checked, when it increases
+    insufficient = (total < -_BALANCE_TOLERANCE) | \
+        (used_increased & (used > total + _BALANCE_TOLERANCE))
+    if insufficient.any():
+        row, column = numpy.argwhere(insufficient)[0]
+        raise InsufficientFunds(
+            'Vectorized: balance of {} too little at {}'.format(
+                names[column], start_date + pandas.Timedelta(minutes=row)))
+
+    if len(order_frames) > 0:
+        orders = pandas.concat(order_frames, ignore_index=True)
+        orders = orders.sort_values(['date', 'symbol'], kind='stable',
+                                    ignore_index=True)
+    else:
+        orders = pandas.DataFrame(columns=['date', 'symbol', 'type', 'side',
+                                           'amount', 'price', 'fee_rate',
+                                           'status', 'fill_date'])
+    return {
+        'balances': pandas.DataFrame(total[grid_rows], index=dates,
+                                     columns=names),
+        'used_balances': pandas.DataFrame(used[grid_rows], index=dates,
+                                          columns=names),
+        'orders': orders,
+    }
+
+
+def positions_to_amounts(positions, start_position=0):
+    # Market order amounts, which move from one target position to the next
+    positions = numpy.asarray(positions, dtype=numpy.float64)
+    return numpy.diff(positions, prepend=start_position)
+
+
+def simulate_positions(timeframe, ohlcvs, markets, positions, balances={},
+                       start_positions={}):
+    # positions: per symbol, the target amount of base currency at every
+    # date. The difference gets traded with market orders, fees are not
+    # included in the target.
+    amounts = {symbol: positions_to_amounts(
+        positions[symbol], start_positions.get(symbol, 0))
+        for symbol in positions}
+    return simulate_orders(timeframe=timeframe, ohlcvs=ohlcvs,
+                           markets=markets, amounts=amounts,
+                           balances=balances)
@@ -0,0 +1,86 @@
+import asyncio
+import weakref
+
+
+class TimeframeFinished(BaseException):
+    pass
+
+
+class _Stepper:
+
+    # Moves the timeframe to the next date, when a watch method waits for an
+    # update. The step is done after the callbacks, which are ready, so all
+    # watchers, which start waiting in the same pass of the event loop,
+    # share one step. Watchers, which are busy with other awaits, do not
+    # delay the step.
+
+    def __init__(self, timeframe):
+        self._timeframe = timeframe
+        self._future = None
+        self._handle = None
+
+    def next_date(self):
+        if self._future is None:
+            loop = asyncio.get_running_loop()
+            self._future = loop.create_future()
+            self._handle = loop.call_soon(self._step)
+        # A cancelled watcher should not cancel the step for the others
+        return asyncio.shield(self._future)
+
+    def step_now(self):
+        # A pending step is done now instead of later, so the timeframe is
+        # not moved twice
+        if self._future is None:
+            self._timeframe.add_timedelta()
+        else:
+            self._handle.cancel()
+            self._step()
+
+    def _step(self):
+        future = self._future
+        self._future = None
+        self._handle = None
+        self._timeframe.add_timedelta()
+        if self._timeframe.finished():
+            future.set_exception(TimeframeFinished())
+        else:
+            future.set_result(None)
+
+
+_steppers = weakref.WeakKeyDictionary()
+
+
+def _get_stepper(timeframe):
+    stepper = _steppers.get(timeframe)
+    if stepper is None:
+        stepper = _Stepper(timeframe)
+        _steppers[timeframe] = stepper
+    return stepper
+
+
+def step(timeframe):
+    # Moves the timeframe to the next date and wakes the watchers, which
+    # wait for it
+    stepper = _steppers.get(timeframe)
+    if stepper is None:
+        timeframe.add_timedelta()
+    else:
+        stepper.step_now()
+
+
+async def wait_for_date_after(timeframe, date):
+    # Returns the current date of the timeframe, as soon as it is after date.
+    # If date is None, the current date is returned immediately.
+    while True:
+        if timeframe.finished():
+            raise TimeframeFinished()
+        current_date = timeframe.date()
+        if date is None or current_date > date:
+            return current_date
+        await _get_stepper(timeframe).next_date()
+
+
+async def wait_for_next_date(timeframe):
+    if timeframe.finished():
+        raise TimeframeFinished()
+    await _get_stepper(timeframe).next_date()
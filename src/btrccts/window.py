@@ -0,0 +1,179 @@
+import numpy
+import pandas
+from btrccts.indicators import OHLCV_COLUMNS, fetch_candles, \
+    last_complete_candle
+
+MINUTE_NS = pandas.Timedelta(minutes=1).value
+
+
+def ohlcv_array(ohlcv):
+    # Read only 2d array (one row per candle, OHLCV_COLUMNS), every window
+    # is a view into it
+    array = numpy.array(ohlcv[OHLCV_COLUMNS], dtype=numpy.float64, order='C')
+    array.flags.writeable = False
+    return array
+
+
+def ohlcv_panel(ohlcvs):
+    # Read only 3d array (symbol, candle, OHLCV_COLUMNS) of the candles,
+    # which all symbols have. Returns the sorted symbols, the date of the
+    # first candle and the array.
+    symbols = sorted(ohlcvs)
+    first_date = max(ohlcvs[symbol].index[0] for symbol in symbols)
+    last_date = min(ohlcvs[symbol].index[-1] for symbol in symbols)
+    length = max(0, (last_date.value - first_date.value) // MINUTE_NS + 1)
+    array = numpy.empty((len(symbols), length, len(OHLCV_COLUMNS)))
+    for i, symbol in enumerate(symbols):
+        array[i] = ohlcv_array(ohlcvs[symbol].loc[first_date:last_date])
+    array.flags.writeable = False
+    return symbols, first_date, array
+
+
+class OhlcvArrayCache:
+
+    # Read only arrays and panels of ohlcv dataframes, which are shared by
+    # the exchange backends using this cache, so the same data is converted
+    # once. The dataframes are keyed by id and kept alive by the cache, so
+    # the ids are not reused.
+
+    def __init__(self):
+        self._arrays = {}
+        self._panels = {}
+
+    def array(self, source, ohlcv):
+        # source is the dataframe given to the backend, ohlcv the checked
+        # dataframe of it
+        entry = self._arrays.get(id(source))
+        if entry is None:
+            entry = (source, ohlcv_array(ohlcv))
+            self._arrays[id(source)] = entry
+        return entry[1]
+
+    def panel(self, sources, ohlcvs):
+        key = tuple(sorted((symbol, id(source))
+                           for symbol, source in sources.items()))
+        entry = self._panels.get(key)
+        if entry is None:
+            entry = (list(sources.values()), ohlcv_panel(ohlcvs))
+            self._panels[key] = entry
+        return entry[1]
+
+
+def select_fields(view, fields=None):
+    # None: view with all columns, a column name: view without the column
+    # dimension, a list of column names: tuple of views
+    if fields is None:
+        return view
+    if isinstance(fields, str):
+        return view[..., _column(fields)]
+    return tuple(view[..., _column(field)] for field in fields)
+
+
+def _column(field):
+    try:
+        return OHLCV_COLUMNS.index(field)
+    except ValueError:
+        raise ValueError('Window: unknown field {}'.format(field))
+
+
+def _check_size(n):
+    if n < 1:
+        raise ValueError('Window: n needs to be positive')
+
+
+def _end(first_date, date, length):
+    # The data has one candle per minute, so the position after the
+    # candle of date is computed without a search
+    end = (date.floor('1min').value - first_date.value) // MINUTE_NS + 1
+    return max(0, min(end, length))
+
+
+def backtest_window(array, first_date, date, n, fields=None):
+    # The last n candles until date
+    _check_size(n)
+    end = _end(first_date, date, len(array))
+    return select_fields(array[max(0, end - n):end], fields)
+
+
+def panel_window(panel, first_date, date, n=None, fields=None):
+    # The candle of date of every symbol (n is None) or the last n
+    # candles until date of every symbol
+    end = _end(first_date, date, panel.shape[1])
+    if n is None:
+        if end == 0:
+            raise ValueError('Window: no candle until {}'.format(date))
+        return select_fields(panel[:, end - 1], fields)
+    _check_size(n)
+    return select_fields(panel[:, max(0, end - n):end], fields)
+
+
+class RingBuffer:
+
+    # Every row is written twice (at position and position + capacity),
+    # so the last rows are always a contiguous view
+
+    def __init__(self, capacity, width):
+        self._capacity = capacity
+        self._data = numpy.full((2 * capacity, width), numpy.nan)
+        self._position = 0
+        self._count = 0
+
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._count
+
+    def append(self, rows):
+        for row in rows[-self._capacity:]:
+            self._data[self._position] = row
+            self._data[self._position + self._capacity] = row
+            self._position = (self._position + 1) % self._capacity
+        self._count = min(self._count + len(rows), self._capacity)
+
+    def last(self, n):
+        n = min(n, self._count)
+        end = self._position + self._capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+
+class LiveWindows:
+
+    # The completed candles of every symbol are kept in a ring buffer with
+    # the size of the largest requested window. Only candles, which were
+    # completed since the last call, are fetched.
+
+    def __init__(self, fetch_ohlcv, now):
+        self._fetch_ohlcv = fetch_ohlcv
+        self._now = now
+        self._buffers = {}
+
+    def _fetch(self, exchange_id, symbol, pd_since, pd_until):
+        candles = fetch_candles(self._fetch_ohlcv, exchange_id, symbol,
+                                pd_since, pd_until)
+        return candles.index, candles[OHLCV_COLUMNS].to_numpy()
+
+    def get(self, exchange_id, symbol, n, fields=None):
+        _check_size(n)
+        key = (exchange_id, symbol)
+        pd_until = last_complete_candle(self._now())
+        entry = self._buffers.get(key)
+        if entry is None or entry['buffer'].capacity() < n:
+            dates, rows = self._fetch(
+                exchange_id, symbol,
+                pd_until - pandas.Timedelta(minutes=n - 1), pd_until)
+            entry = {'buffer': RingBuffer(n, len(OHLCV_COLUMNS)),
+                     'last': None}
+            self._buffers[key] = entry
+        elif entry['last'] is None:
+            dates, rows = self._fetch(exchange_id, symbol, pd_until, pd_until)
+        else:
+            dates, rows = self._fetch(
+                exchange_id, symbol,
+                entry['last'] + pandas.Timedelta(minutes=1), pd_until)
+        if len(dates) > 0:
+            entry['buffer'].append(rows)
+            entry['last'] = dates[-1]
+        return select_fields(entry['buffer'].last(n), fields)
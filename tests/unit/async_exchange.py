@@ -36,6 +36,7 @@ class AsyncBacktestExchangeBaseTest(unittest.TestCase):
             'cancelOrder': ['id'],
             'fetchOrder': ['id'],
             'fetchTicker': ['BTC/USD'],
+            'createOrders': [[]],
         }
         mock.side_effect = async_noop
         exchange = self.backtest.create_exchange('binance', async_ccxt=True)
@@ -73,6 +74,10 @@ class AsyncBacktestExchangeBaseTest(unittest.TestCase):
         self.template__propagate_method_call(
             'fetch_order', {'id': 'some_id', 'symbol': 'BTC/USD'})
 
+    def test__fetch_tickers(self):
+        self.template__propagate_method_call(
+            'fetch_tickers', {'symbols': ['BTC/USD', 'ETH/BTC']})
+
     def test__fetch_closed_orders(self):
         self.template__propagate_method_call(
             'fetch_closed_orders',
@@ -128,7 +133,7 @@ class AsyncBacktestExchangeBaseTest(unittest.TestCase):
         fetch_markets_mock.assert_called_once_with({})
         self.binance_backend_mock.create_order.assert_called_once_with(
             amount=5, price=None, side='sell', type='market',
-            market=exchange.markets['BTC/USD'])
+            market=exchange.markets['BTC/USD'], stop_price=None)
         self.assertEqual(result, self.binance_backend_mock.create_order())
 
     @patch.object(ccxt.async_support.binance, 'fetch_markets')
@@ -141,9 +146,57 @@ class AsyncBacktestExchangeBaseTest(unittest.TestCase):
         fetch_markets_mock.assert_called_once_with({})
         self.binance_backend_mock.create_order.assert_called_once_with(
             amount=2, price=17, side='buy', type='limit',
-            market=exchange.markets['BTC/USD'])
+            market=exchange.markets['BTC/USD'], stop_price=None)
         self.assertEqual(result, self.binance_backend_mock.create_order())
 
+    @patch.object(ccxt.async_support.binance, 'fetch_markets')
+    @async_test
+    async def test__create_order__stop_market(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance', async_ccxt=True)
+        fetch_markets_mock.side_effect = async_func_result([BTC_USD_MARKET])
+        result = await exchange.create_order(symbol='BTC/USD', type='market',
+                                             side='sell', amount=2,
+                                             params={'triggerPrice': 15})
+        fetch_markets_mock.assert_called_once_with({})
+        self.binance_backend_mock.create_order.assert_called_once_with(
+            amount=2, price=None, side='sell', type='market',
+            market=exchange.markets['BTC/USD'], stop_price=15)
+        self.assertEqual(result, self.binance_backend_mock.create_order())
+
+    @patch.object(ccxt.async_support.binance, 'fetch_markets')
+    @async_test
+    async def test__create_orders(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance', async_ccxt=True)
+        fetch_markets_mock.side_effect = async_func_result([BTC_USD_MARKET])
+        result = await exchange.create_orders([
+            {'symbol': 'BTC/USD', 'type': 'limit', 'side': 'buy',
+             'amount': 2, 'price': 17, 'params': {'stopPrice': 16}},
+            {'symbol': 'BTC/USD', 'type': 'market', 'side': 'sell',
+             'amount': 5}])
+        fetch_markets_mock.assert_called_once_with({})
+        market = exchange.markets['BTC/USD']
+        self.binance_backend_mock.create_orders.assert_called_once_with(
+            orders=[{'market': market, 'type': 'limit', 'side': 'buy',
+                     'amount': 2, 'price': 17, 'stop_price': 16},
+                    {'market': market, 'type': 'market', 'side': 'sell',
+                     'amount': 5, 'price': None, 'stop_price': None}])
+        self.assertEqual(result, self.binance_backend_mock.create_orders())
+
+    @patch.object(ccxt.async_support.binance, 'fetch_markets')
+    @async_test
+    async def test__create_orders__no_market(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance', async_ccxt=True)
+        fetch_markets_mock.side_effect = async_func_result([BTC_USD_MARKET])
+        with self.assertRaises(InvalidOrder) as e:
+            await exchange.create_orders([
+                {'symbol': 'BTC/USD', 'type': 'market', 'side': 'sell',
+                 'amount': 5},
+                {'symbol': 'ETH/USD', 'type': 'market', 'side': 'sell',
+                 'amount': 5}])
+        self.assertEqual(str(e.exception),
+                         'Exchange: market does not exist: ETH/USD')
+        self.binance_backend_mock.create_orders.assert_not_called()
+
     @patch.object(ccxt.async_support.binance, 'fetch_markets')
     @async_test
     async def test__create_order__no_market(self, fetch_markets_mock):
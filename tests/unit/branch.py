@@ -0,0 +1,183 @@
+import asyncio
+import ccxt
+import os
+import pandas
+import time
+import unittest
+from btrccts.algorithm import AlgorithmBase, AlgorithmBaseSync
+from btrccts.branch import execute_branches
+from btrccts.run import main_loop_sync
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, fetch_markets_return, pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class BranchAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.args = args
+        self.dates = []
+        self.kraken = context.create_exchange('kraken')
+
+    def __getstate__(self):
+        return {'dates': self.dates}
+
+    def next_iteration(self):
+        self.dates.append(self.context.date())
+        if self.args.get('fail'):
+            raise ValueError('branch failed')
+        if self.args['amount'] > 0:
+            self.kraken.create_order(type='market', side='buy',
+                                     symbol='BTC/USD',
+                                     amount=self.args['amount'])
+        if self.args.get('stop'):
+            self.context.stop('stop')
+
+
+class SyncBranchAlgo(BranchAlgo):
+
+    exit = AlgorithmBaseSync.exit
+    handle_exception = AlgorithmBaseSync.handle_exception
+
+
+class SleepingBranchAlgo(BranchAlgo):
+
+    async def next_iteration(self):
+        await asyncio.sleep(0.2)
+        super().next_iteration()
+
+
+def collect(algorithm, balances):
+    return (len(algorithm.dates), algorithm.dates[-1],
+            balances['kraken']['BTC']['total'])
+
+
+class ExecuteBranchesTest(unittest.TestCase):
+
+    def run_branches(self, branches, args={'amount': 1}, **kwargs):
+        params = {
+            'exchange_names': ['kraken'],
+            'symbols': ['BTC/USD'],
+            'AlgorithmClass': BranchAlgo,
+            'args': args,
+            'branches': branches,
+            'collect': collect,
+            'start_balances': {'kraken': {'USD': 100}},
+            'pd_start_date': pd_ts('2019-10-01 10:10'),
+            'pd_branch_date': pd_ts('2019-10-01 10:12'),
+            'pd_end_date': pd_ts('2019-10-01 10:16'),
+            'pd_interval': pandas.Timedelta(minutes=1),
+            'data_dir': data_dir,
+        }
+        params.update(kwargs)
+        with self.assertLogs('btrccts'):
+            return execute_branches(**params)
+
+    def assert_branch_results(self, result):
+        self.assertEqual(len(result), 3)
+        for r in result:
+            self.assertEqual(r[0], 7)
+            self.assertEqual(r[1], pd_ts('2019-10-01 10:16'))
+        # The prefix bought 3 * 1 BTC with 0.2% fee
+        self.assertAlmostEqual(result[0][2], 2.994)
+        self.assertAlmostEqual(result[1][2], 2.994 + 4 * 0.998)
+        self.assertAlmostEqual(result[2][2], 2.994 + 4 * 2 * 0.998)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_branches(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        branches = [{'amount': 0}, {'amount': 1}, {'amount': 2}]
+        result = self.run_branches(branches, use_fork=False)
+        self.assert_branch_results(result)
+        if hasattr(os, 'fork'):
+            self.assertEqual(
+                self.run_branches(branches, use_fork=True, processes=2),
+                result)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_branches__sync(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        with patch('btrccts.run.main_loop_sync',
+                   wraps=main_loop_sync) as loop:
+            result = self.run_branches([{'amount': 0}, {'amount': 1}],
+                                       use_fork=False,
+                                       AlgorithmClass=SyncBranchAlgo)
+        self.assertAlmostEqual(result[1][2], 2.994 + 4 * 0.998)
+        # The prefix and the 2 branches
+        self.assertEqual(loop.call_count, 3)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_branches__sleep(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        start = time.perf_counter()
+        result = self.run_branches([{'amount': 0}, {'amount': 1}],
+                                   use_fork=False,
+                                   AlgorithmClass=SleepingBranchAlgo)
+        # The sleeps use the simulated time
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual([r[:2] for r in result],
+                         [(7, pd_ts('2019-10-01 10:16'))] * 2)
+        self.assertAlmostEqual(result[1][2], 2.994 + 4 * 0.998)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_branches__branch_fails(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        branches = [{'amount': 0}, {'amount': 1, 'fail': True}]
+        use_forks = [False]
+        if hasattr(os, 'fork'):
+            use_forks.append(True)
+        for use_fork in use_forks:
+            with self.assertRaises(ValueError) as e:
+                self.run_branches(branches, use_fork=use_fork)
+            self.assertEqual(str(e.exception), 'branch failed')
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_branches__prefix_stopped(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        with self.assertRaises(ValueError) as e:
+            self.run_branches([{'amount': 0}],
+                              args={'amount': 0, 'stop': True})
+        self.assertEqual(str(e.exception),
+                         'Algorithm stopped before the branch date')
+
+    def test__execute_branches__volume_share(self):
+        with self.assertRaises(ValueError) as e:
+            execute_branches(
+                exchange_names=['kraken'], symbols=['BTC/USD'],
+                AlgorithmClass=BranchAlgo, args={}, branches=[],
+                collect=collect, start_balances={'kraken': {'USD': 100}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_branch_date=pd_ts('2019-10-01 10:12'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, volume_share=0)
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: volume share needs to be '
+                         'between 0 and 1')
+
+    def test__execute_branches__branch_date(self):
+        for date in ['2019-10-01 10:09', '2019-10-01 10:17']:
+            with self.assertRaises(ValueError) as e:
+                execute_branches(
+                    exchange_names=[], symbols=[], AlgorithmClass=BranchAlgo,
+                    args={}, branches=[], collect=collect, start_balances={},
+                    pd_start_date=pd_ts('2019-10-01 10:10'),
+                    pd_branch_date=pd_ts(date),
+                    pd_end_date=pd_ts('2019-10-01 10:16'),
+                    pd_interval=pandas.Timedelta(minutes=1))
+            self.assertEqual(
+                str(e.exception),
+                'Branch date needs to be between start and end date')
@@ -0,0 +1,294 @@
+import ccxt
+import os
+import pandas
+import pickle
+import tempfile
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.checkpoint import Checkpointer, load_checkpoint, \
+    restore_algorithm_state, restore_context
+from btrccts.context import BacktestContext
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.run import execute_algorithm
+from btrccts.timeframe import Timeframe
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, fetch_markets_return, pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class CheckpointAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.args = args
+        self.iterations = 0
+        self.kraken = context.create_exchange('kraken')
+        self.init_date = context.date()
+        self.init_balance = self.kraken.fetch_balance()
+        self.balance = None
+        self.closed_orders = None
+        self.open_orders = None
+
+    def __getstate__(self):
+        return {'iterations': self.iterations}
+
+    def next_iteration(self):
+        self.iterations += 1
+        if self.iterations == 1:
+            self.kraken.create_order(type='market', side='buy',
+                                     symbol='BTC/USD', amount=2)
+            self.kraken.create_order(type='limit', side='sell',
+                                     symbol='BTC/USD', amount=1, price=7.5)
+        if self.iterations == 3:
+            self.kraken.create_order(type='limit', side='buy',
+                                     symbol='BTC/USD', amount=1, price=2.5)
+        if self.iterations == 4 and self.args.get('crash'):
+            raise KeyboardInterrupt()
+
+    def exit(self, reason):
+        self.balance = self.kraken.fetch_balance()
+        self.closed_orders = self.kraken.fetch_closed_orders()
+        self.open_orders = self.kraken.fetch_open_orders()
+
+
+class StatelessAlgo(AlgorithmBase):
+
+    def __init__(self):
+        self.value = 1
+
+
+class SetStateAlgo(AlgorithmBase):
+
+    def __init__(self):
+        self.value = 1
+
+    def __setstate__(self, state):
+        self.value = state['value'] * 2
+
+
+def create_context(timeframe):
+    ohlcv = pandas.DataFrame(
+        index=pandas.date_range(start='2019-10-01 10:10', periods=4,
+                                freq='1min', tz='UTC'),
+        data={'open': [2, 3, 4, 5], 'high': [3, 4, 5, 6],
+              'low': [1, 2, 3, 4], 'close': [3, 4, 5, 6],
+              'volume': [1, 2, 3, 4]})
+    backend = ExchangeBackend(timeframe=timeframe,
+                              balances={'USD': 100},
+                              ohlcvs={'BTC/USD': ohlcv})
+    return BacktestContext(timeframe=timeframe,
+                           exchange_backends={'kraken': backend})
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'checkpoint')
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:13'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        self.context = create_context(self.timeframe)
+        self.backend = self.context._exchange_backends['kraken']
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_market_order(self):
+        self.backend.create_order(market=BTC_USD_MARKET, type='market',
+                                  side='buy', amount=1, price=None)
+
+    def read_records(self):
+        records = []
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    return records
+
+    def test__write__incremental(self):
+        checkpointer = Checkpointer(path=self.path, context=self.context,
+                                    algorithm=StatelessAlgo(), every=2)
+        self.create_market_order()
+        checkpointer.iteration_finished()
+        self.assertFalse(os.path.exists(self.path))
+        checkpointer.iteration_finished()
+        self.timeframe.add_timedelta()
+        self.create_market_order()
+        checkpointer.iteration_finished()
+        checkpointer.iteration_finished()
+        checkpointer.close()
+        records = self.read_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual([[o[0] for o in r['closed_orders']['kraken']]
+                          for r in records], [['1'], ['2']])
+        self.assertEqual([r['algorithm'] for r in records], [None, None])
+        self.assertEqual(
+            [r['context']['timeframe']['current_date'] for r in records],
+            [pd_ts('2019-10-01 10:10'), pd_ts('2019-10-01 10:11')])
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(
+            list(checkpoint['context']['exchange_backends']['kraken']
+                 ['closed_orders'].keys()), ['1', '2'])
+
+    def test__write__replaces_existing_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'old')
+        checkpointer = Checkpointer(path=self.path, context=self.context,
+                                    algorithm=StatelessAlgo(), every=1)
+        checkpointer.iteration_finished()
+        checkpointer.close()
+        self.assertEqual(len(self.read_records()), 1)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test__every__not_positive(self):
+        with self.assertRaises(ValueError) as e:
+            Checkpointer(path=self.path, context=self.context,
+                         algorithm=StatelessAlgo(), every=0)
+        self.assertEqual(str(e.exception),
+                         'Checkpoint: every needs to be positive')
+
+    def test__load_checkpoint__incomplete_record(self):
+        checkpointer = Checkpointer(path=self.path, context=self.context,
+                                    algorithm=StatelessAlgo(), every=1)
+        checkpointer.iteration_finished()
+        self.timeframe.add_timedelta()
+        checkpointer.iteration_finished()
+        checkpointer.close()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 10)
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(checkpoint['context']['timeframe']['current_date'],
+                         pd_ts('2019-10-01 10:10'))
+
+    def test__load_checkpoint__empty(self):
+        open(self.path, 'wb').close()
+        with self.assertRaises(ValueError) as e:
+            load_checkpoint(self.path)
+        self.assertEqual(str(e.exception),
+                         'Checkpoint file contains no checkpoint')
+
+    def test__load_checkpoint__version(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump({'version': 0}, f)
+        with self.assertRaises(ValueError) as e:
+            load_checkpoint(self.path)
+        self.assertEqual(str(e.exception),
+                         'Checkpoint version is not supported')
+
+    def test__restore_context(self):
+        self.create_market_order()
+        checkpointer = Checkpointer(path=self.path, context=self.context,
+                                    algorithm=StatelessAlgo(), every=1)
+        self.timeframe.add_timedelta()
+        checkpointer.iteration_finished()
+        checkpointer.close()
+        timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                              pd_end_date=pd_ts('2019-10-01 10:12'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        context = create_context(timeframe)
+        restore_context(context=context, timeframe=timeframe,
+                        checkpoint=load_checkpoint(self.path))
+        self.assertEqual(timeframe.date(), pd_ts('2019-10-01 10:11'))
+        self.assertEqual(timeframe.end_date(), pd_ts('2019-10-01 10:12'))
+        backend = context._exchange_backends['kraken']
+        self.assertEqual(backend.fetch_balance(),
+                         self.backend.fetch_balance())
+        self.assertEqual(backend.fetch_closed_orders(),
+                         self.backend.fetch_closed_orders())
+
+    def test__restore_context__timeframe_does_not_match(self):
+        checkpointer = Checkpointer(path=self.path, context=self.context,
+                                    algorithm=StatelessAlgo(), every=1)
+        checkpointer.iteration_finished()
+        checkpointer.close()
+        for start, interval in [('2019-10-01 10:11', 1),
+                                ('2019-10-01 10:10', 2)]:
+            timeframe = Timeframe(pd_start_date=pd_ts(start),
+                                  pd_end_date=pd_ts('2019-10-01 10:13'),
+                                  pd_interval=pandas.Timedelta(
+                                      minutes=interval))
+            with self.assertRaises(ValueError) as e:
+                restore_context(context=create_context(timeframe),
+                                timeframe=timeframe,
+                                checkpoint=load_checkpoint(self.path))
+            self.assertEqual(str(e.exception),
+                             'Checkpoint does not match the timeframe')
+
+    def test__restore_algorithm_state(self):
+        algorithm = StatelessAlgo()
+        restore_algorithm_state(algorithm, None)
+        self.assertEqual(algorithm.value, 1)
+        restore_algorithm_state(algorithm, {'value': 3})
+        self.assertEqual(algorithm.value, 3)
+        algorithm = SetStateAlgo()
+        restore_algorithm_state(algorithm, {'value': 3})
+        self.assertEqual(algorithm.value, 6)
+
+
+class ExecuteAlgorithmCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'checkpoint')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_algo(self, args, **kwargs):
+        with self.assertLogs('btrccts'):
+            return execute_algorithm(
+                exchange_names=['kraken'], symbols=['BTC/USD'], live=False,
+                auth_aliases={}, AlgorithmClass=CheckpointAlgo, args=args,
+                start_balances={'kraken': {'USD': 100}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, **kwargs)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_algorithm__resume(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        expected = self.run_algo({})
+        crashed = self.run_algo({'crash': True}, checkpoint_file=self.path,
+                                checkpoint_every=1)
+        self.assertEqual(crashed.iterations, 4)
+        self.assertNotEqual(crashed.balance, expected.balance)
+        result = self.run_algo({}, checkpoint_file=self.path,
+                               checkpoint_every=1, resume=True)
+        self.assertEqual(result.iterations, 7)
+        # The context is restored, before the algorithm is created
+        self.assertEqual(result.init_date, pd_ts('2019-10-01 10:13'))
+        self.assertEqual(result.init_balance['BTC']['total'], 1.996)
+        self.assertEqual(result.balance, expected.balance)
+        self.assertEqual(result.closed_orders, expected.closed_orders)
+        self.assertEqual(result.open_orders, expected.open_orders)
+        self.assertEqual(len(result.closed_orders), 2)
+        self.assertEqual(len(result.open_orders), 1)
+
+    def test__execute_algorithm__resume_without_file(self):
+        with self.assertRaises(ValueError) as e:
+            execute_algorithm(
+                exchange_names=[], symbols=[], live=False, auth_aliases={},
+                AlgorithmClass=CheckpointAlgo, args={}, start_balances={},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, resume=True)
+        self.assertEqual(str(e.exception), 'Resume needs a checkpoint file')
+
+    def test__execute_algorithm__live(self):
+        with self.assertRaises(ValueError) as e:
+            execute_algorithm(
+                exchange_names=[], symbols=[], live=True, auth_aliases={},
+                AlgorithmClass=CheckpointAlgo, args={}, start_balances=None,
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, checkpoint_file=self.path)
+        self.assertEqual(str(e.exception),
+                         'Checkpoints cannot be used in live mode')
@@ -1,14 +1,18 @@
 import ccxt
+import ccxt.async_support
+import gc
 import unittest
 import pandas
-from unittest.mock import patch, call
+import weakref
+from unittest.mock import MagicMock, call, patch
 from btrccts.timeframe import Timeframe
 from btrccts.context import BacktestContext, ContextState, LiveContext, \
-    StopException
+    MarketCache, StopException
 from btrccts.exchange import BacktestExchangeBase
 from btrccts.async_exchange import AsyncBacktestExchangeBase
 from btrccts.exchange_backend import ExchangeBackend
-from tests.common import pd_ts, async_test
+from tests.common import BTC_USD_MARKET, ETH_BTC_MARKET, pd_ts, \
+    async_test, fetch_markets_return
 
 
 class BacktestContextTest(unittest.TestCase):
@@ -91,6 +95,98 @@ class BacktestContextTest(unittest.TestCase):
                          (AsyncBacktestExchangeBase,
                           ccxt.async_support.bitfinex))
 
+    def test__create_exchange__class_cached(self):
+        backtest = BacktestContext(timeframe=None)
+        other = BacktestContext(timeframe=None)
+        exchange = backtest.create_exchange('kraken')
+        self.assertIs(backtest.create_exchange('kraken').__class__,
+                      exchange.__class__)
+        self.assertIs(other.create_exchange('kraken').__class__,
+                      exchange.__class__)
+        async_exchange = other.create_exchange('kraken', async_ccxt=True)
+        self.assertEqual(async_exchange.__class__.__bases__,
+                         (AsyncBacktestExchangeBase,
+                          ccxt.async_support.kraken))
+        self.assertIsNot(backtest.create_exchange('binance').__class__,
+                         exchange.__class__)
+
+    def test__create_exchange__profiler_class_cached(self):
+        profiler = MagicMock()
+        backtest = BacktestContext(timeframe=None, profiler=profiler)
+        backtest.create_exchange('kraken')
+        backtest.create_exchange('kraken')
+        profiler.instrument_exchange_class.assert_called_once()
+        backtest.create_exchange('kraken', async_ccxt=True)
+        self.assertEqual(profiler.instrument_exchange_class.call_count, 2)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    def test__create_exchange__market_cache(self, fetch_markets):
+        fetch_markets.side_effect = fetch_markets_return([BTC_USD_MARKET,
+                                                          ETH_BTC_MARKET])
+        market_cache = MarketCache()
+        backtest = BacktestContext(timeframe=None, market_cache=market_cache)
+        other = BacktestContext(timeframe=None, market_cache=market_cache)
+        first = backtest.create_exchange('kraken')
+        first.has['fetchCurrencies'] = False
+        # Markets are not loaded yet, nothing to share
+        second = other.create_exchange('kraken')
+        self.assertIsNone(second.markets)
+        second.has['fetchCurrencies'] = False
+        second.load_markets()
+        fetch_markets.assert_called_once_with({})
+        third = backtest.create_exchange('kraken')
+        self.assertIs(third.markets, second.markets)
+        self.assertIs(third.markets_by_id, second.markets_by_id)
+        self.assertIs(third.currencies, second.currencies)
+        self.assertEqual(third.symbols, ['BTC/USD', 'ETH/BTC'])
+        self.assertIs(third.load_markets(), second.markets)
+        self.assertIs(third.market('ETH/BTC'), second.markets['ETH/BTC'])
+        fetch_markets.assert_called_once_with({})
+        # Other exchanges do not get the markets
+        self.assertIsNone(backtest.create_exchange('binance').markets)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    def test__create_exchange__market_cache__unused(self, fetch_markets):
+        fetch_markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        market_cache = MarketCache()
+        backtest = BacktestContext(timeframe=None, market_cache=market_cache)
+        # Exchanges, which never load the markets, are not kept alive
+        refs = [weakref.ref(backtest.create_exchange('kraken'))
+                for _ in range(3)]
+        gc.collect()
+        self.assertEqual([ref() for ref in refs], [None] * 3)
+        first = backtest.create_exchange('kraken')
+        second = backtest.create_exchange('kraken')
+        second.has['fetchCurrencies'] = False
+        second.load_markets()
+        self.assertIs(backtest.create_exchange('kraken').markets,
+                      second.markets)
+        self.assertIsNone(first.markets)
+        self.assertEqual(market_cache._sources, {})
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    def test__create_exchange__market_cache__config(self, fetch_markets):
+        fetch_markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        market_cache = MarketCache()
+        backtest = BacktestContext(timeframe=None, market_cache=market_cache)
+        spot = backtest.create_exchange('kraken', {'apiKey': 'a'})
+        spot.has['fetchCurrencies'] = False
+        spot.load_markets()
+        # Credentials do not change the markets
+        same = backtest.create_exchange('kraken', {'apiKey': 'b'})
+        self.assertIs(same.markets, spot.markets)
+        # Other options can load other markets
+        config = {'options': {'defaultType': 'future'}}
+        future = backtest.create_exchange('kraken', config)
+        self.assertIsNone(future.markets)
+        future.has['fetchCurrencies'] = False
+        future.load_markets()
+        self.assertEqual(fetch_markets.call_count, 2)
+        self.assertIsNot(future.markets, spot.markets)
+        other = backtest.create_exchange(
+            'kraken', {'options': {'defaultType': 'future'}})
+        self.assertIs(other.markets, future.markets)
+
     def test__date(self):
         t = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
                       pd_end_date=pd_ts('2017-01-01 1:35'),
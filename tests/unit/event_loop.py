@@ -0,0 +1,193 @@
+import asyncio
+import ccxt.async_support
+import os
+import pandas
+import socket
+import threading
+import time
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.event_loop import BacktestEventLoop, run_backtest_loop
+from btrccts.run import execute_algorithm
+from btrccts.timeframe import Timeframe
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, async_fetch_markets_return, \
+    async_return, pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+def timestamp(date):
+    return pd_ts(date).value / 10**9
+
+
+class SleepAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.kraken = context.create_exchange('kraken', async_ccxt=True)
+        self.times = []
+        self.orders = []
+
+    async def next_iteration(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.sleep(30)
+        orders = await asyncio.gather(*[
+            self.kraken.create_order(type='market', side='buy',
+                                     symbol='BTC/USD', amount=amount)
+            for amount in [1, 2, 3]])
+        self.orders.append([order['id'] for order in orders])
+        self.times.append((self.context.date(), loop.time() - start))
+
+    async def exit(self, reason):
+        await self.kraken.close()
+
+
+class BacktestEventLoopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:20'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+
+    def test__sleep(self):
+        result = []
+
+        async def sleeper(seconds):
+            await asyncio.sleep(seconds)
+            result.append((seconds, asyncio.get_running_loop().time()))
+
+        async def func():
+            await asyncio.gather(sleeper(3600), sleeper(60), sleeper(600))
+
+        start = time.monotonic()
+        run_backtest_loop(func(), timeframe=self.timeframe)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(result, [
+            (60, timestamp('2019-10-01 10:11')),
+            (600, timestamp('2019-10-01 10:20')),
+            (3600, timestamp('2019-10-01 11:10'))])
+
+    def test__wait_for__timeout(self):
+        async def func():
+            loop = asyncio.get_running_loop()
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(loop.create_future(), timeout=100)
+            return loop.time()
+
+        self.assertEqual(run_backtest_loop(func(), timeframe=self.timeframe),
+                         timestamp('2019-10-01 10:11:40'))
+
+    def test__time__follows_timeframe(self):
+        loop = BacktestEventLoop(timeframe=self.timeframe)
+        try:
+            self.assertEqual(loop.time(), timestamp('2019-10-01 10:10'))
+            self.timeframe.add_timedelta()
+            self.assertEqual(loop.time(), timestamp('2019-10-01 10:11'))
+            loop.advance_time(90)
+            self.assertEqual(loop.time(), timestamp('2019-10-01 10:12:30'))
+            # The clock does not go backwards
+            self.timeframe.add_timedelta()
+            self.assertEqual(loop.time(), timestamp('2019-10-01 10:12:30'))
+            self.timeframe.add_timedelta()
+            self.assertEqual(loop.time(), timestamp('2019-10-01 10:13'))
+        finally:
+            loop.close()
+
+    def test__run_in_executor(self):
+        async def func():
+            loop = asyncio.get_running_loop()
+            await asyncio.sleep(10)
+            return await loop.run_in_executor(None, time.sleep, 0.01)
+
+        self.assertIsNone(run_backtest_loop(func(), timeframe=self.timeframe))
+
+    def test__run_in_executor__with_timer(self):
+        async def func():
+            loop = asyncio.get_running_loop()
+            # The timer is not due, while the job is running
+            await asyncio.wait_for(
+                loop.run_in_executor(None, time.sleep, 0.3), timeout=10)
+            return loop.time()
+
+        result = run_backtest_loop(func(), timeframe=self.timeframe)
+        self.assertGreaterEqual(result, timestamp('2019-10-01 10:10:00.3'))
+        self.assertLess(result, timestamp('2019-10-01 10:10:10'))
+
+    def test__socket__with_timer(self):
+        sock, other = socket.socketpair()
+
+        def send():
+            time.sleep(0.3)
+            other.sendall(b'data')
+
+        async def func():
+            reader, writer = await asyncio.open_connection(sock=sock)
+            try:
+                return await asyncio.wait_for(reader.read(4), timeout=10)
+            finally:
+                writer.close()
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        try:
+            self.assertEqual(
+                run_backtest_loop(func(), timeframe=self.timeframe), b'data')
+        finally:
+            thread.join()
+            other.close()
+
+    def test__sleep__after_io(self):
+        async def func():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, time.sleep, 0.01)
+            # No io in flight anymore: the clock jumps again
+            await asyncio.sleep(3600)
+            return loop.time()
+
+        start = time.monotonic()
+        result = run_backtest_loop(func(), timeframe=self.timeframe)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertGreaterEqual(result, timestamp('2019-10-01 11:10'))
+
+    def test__cancel_remaining_tasks(self):
+        cancelled = []
+
+        async def background():
+            try:
+                await asyncio.sleep(10**6)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def func():
+            asyncio.ensure_future(background())
+            await asyncio.sleep(0)
+
+        run_backtest_loop(func(), timeframe=self.timeframe)
+        self.assertEqual(cancelled, [True])
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    def test__execute_algorithm(self, currencies, markets):
+        markets.side_effect = async_fetch_markets_return([BTC_USD_MARKET])
+        currencies.side_effect = async_return({})
+        start = time.monotonic()
+        with self.assertLogs('btrccts'):
+            result = execute_algorithm(
+                exchange_names=['kraken'], symbols=['BTC/USD'], live=False,
+                auth_aliases={}, AlgorithmClass=SleepAlgo, args={},
+                start_balances={'kraken': {'USD': 1000}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:12'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(result.times, [(pd_ts('2019-10-01 10:10'), 30),
+                                        (pd_ts('2019-10-01 10:11'), 30),
+                                        (pd_ts('2019-10-01 10:12'), 30)])
+        # gather is deterministic
+        self.assertEqual(result.orders, [['1', '2', '3'], ['4', '5', '6'],
+                                         ['7', '8', '9']])
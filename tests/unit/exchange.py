@@ -11,8 +11,8 @@ from tests.common import BTC_USD_MARKET
 
 ccxt_has = [
     'cancelAllOrders', 'cancelOrder', 'cancelOrders', 'createDepositAddress',
-    'createLimitOrder', 'createMarketOrder',
-    'createOrder', 'deposit', 'editOrder', 'fetchBalance', 'fetchClosedOrders',
+    'createLimitOrder', 'createMarketOrder', 'createOrder', 'createOrders',
+    'deposit', 'editOrder', 'fetchBalance', 'fetchClosedOrders',
     'fetchCurrencies', 'fetchDepositAddress', 'fetchDeposits',
     'fetchL2OrderBook', 'fetchLedger', 'fetchMarkets', 'fetchMyTrades',
     'fetchOpenOrders', 'fetchOrders', 'fetchOrderBook', 'fetchOrder',
@@ -22,9 +22,10 @@ ccxt_has = [
     'fetchTradingLimits', 'fetchTransactions', 'fetchWithdrawals', 'withdraw']
 ccxt_has_other = ['CORS', ]
 ccxt_has_implemented = ['cancelOrder', 'createLimitOrder', 'createMarketOrder',
-                        'createOrder', 'fetchCurrencies', 'fetchMarkets',
-                        'fetchOrder', 'fetchOHLCV', 'fetchBalance',
-                        'fetchClosedOrders', 'fetchOpenOrders', 'fetchTicker']
+                        'createOrder', 'createOrders', 'fetchCurrencies',
+                        'fetchMarkets', 'fetchOrder', 'fetchOHLCV',
+                        'fetchBalance', 'fetchClosedOrders', 'fetchOpenOrders',
+                        'fetchTicker', 'fetchTickers']
 
 first_cap_re = re.compile('(.)([A-Z][a-z]+)')
 all_cap_re = re.compile('([a-z0-9])([A-Z])')
@@ -53,6 +54,7 @@ class BacktestExchangeBaseTest(unittest.TestCase):
             'cancelOrder': ['id'],
             'fetchOrder': ['id'],
             'fetchTicker': ['BTC/USD'],
+            'createOrders': [[]],
         }
         exchange = self.backtest.create_exchange('binance')
         for i in ccxt_has:
@@ -88,6 +90,10 @@ class BacktestExchangeBaseTest(unittest.TestCase):
         self.template__propagate_method_call(
             'fetch_order', {'id': 'some_id', 'symbol': 'BTC/USD'})
 
+    def test__fetch_tickers(self):
+        self.template__propagate_method_call(
+            'fetch_tickers', {'symbols': ['BTC/USD', 'ETH/BTC']})
+
     def test__fetch_closed_orders(self):
         self.template__propagate_method_call(
             'fetch_closed_orders',
@@ -137,7 +143,7 @@ class BacktestExchangeBaseTest(unittest.TestCase):
         fetch_markets_mock.assert_called_once_with({})
         self.binance_backend_mock.create_order.assert_called_once_with(
             amount=5, price=None, side='sell', type='market',
-            market=exchange.markets['BTC/USD'])
+            market=exchange.markets['BTC/USD'], stop_price=None)
         self.assertEqual(result, self.binance_backend_mock.create_order())
 
     @patch.object(ccxt.binance, 'fetch_markets')
@@ -149,9 +155,54 @@ class BacktestExchangeBaseTest(unittest.TestCase):
         fetch_markets_mock.assert_called_once_with({})
         self.binance_backend_mock.create_order.assert_called_once_with(
             amount=2, price=17, side='buy', type='limit',
-            market=exchange.markets['BTC/USD'])
+            market=exchange.markets['BTC/USD'], stop_price=None)
         self.assertEqual(result, self.binance_backend_mock.create_order())
 
+    @patch.object(ccxt.binance, 'fetch_markets')
+    def test__create_order__stop_market(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance')
+        fetch_markets_mock.return_value = [BTC_USD_MARKET]
+        result = exchange.create_order(symbol='BTC/USD', type='market',
+                                       side='sell', amount=2,
+                                       params={'triggerPrice': 15})
+        fetch_markets_mock.assert_called_once_with({})
+        self.binance_backend_mock.create_order.assert_called_once_with(
+            amount=2, price=None, side='sell', type='market',
+            market=exchange.markets['BTC/USD'], stop_price=15)
+        self.assertEqual(result, self.binance_backend_mock.create_order())
+
+    @patch.object(ccxt.binance, 'fetch_markets')
+    def test__create_orders(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance')
+        fetch_markets_mock.return_value = [BTC_USD_MARKET]
+        result = exchange.create_orders([
+            {'symbol': 'BTC/USD', 'type': 'limit', 'side': 'buy',
+             'amount': 2, 'price': 17, 'params': {'stopPrice': 16}},
+            {'symbol': 'BTC/USD', 'type': 'market', 'side': 'sell',
+             'amount': 5}])
+        fetch_markets_mock.assert_called_once_with({})
+        market = exchange.markets['BTC/USD']
+        self.binance_backend_mock.create_orders.assert_called_once_with(
+            orders=[{'market': market, 'type': 'limit', 'side': 'buy',
+                     'amount': 2, 'price': 17, 'stop_price': 16},
+                    {'market': market, 'type': 'market', 'side': 'sell',
+                     'amount': 5, 'price': None, 'stop_price': None}])
+        self.assertEqual(result, self.binance_backend_mock.create_orders())
+
+    @patch.object(ccxt.binance, 'fetch_markets')
+    def test__create_orders__no_market(self, fetch_markets_mock):
+        exchange = self.backtest.create_exchange('binance')
+        fetch_markets_mock.return_value = [BTC_USD_MARKET]
+        with self.assertRaises(InvalidOrder) as e:
+            exchange.create_orders([
+                {'symbol': 'BTC/USD', 'type': 'market', 'side': 'sell',
+                 'amount': 5},
+                {'symbol': 'ETH/USD', 'type': 'market', 'side': 'sell',
+                 'amount': 5}])
+        self.assertEqual(str(e.exception),
+                         'Exchange: market does not exist: ETH/USD')
+        self.binance_backend_mock.create_orders.assert_not_called()
+
     @patch.object(ccxt.binance, 'fetch_markets')
     def test__create_order__no_market(self, fetch_markets_mock):
         exchange = self.backtest.create_exchange('binance')
@@ -8,6 +8,10 @@ from btrccts.timeframe import Timeframe
 from tests.common import BTC_USD_MARKET, ETH_BTC_MARKET
 
 
+class Reader:
+    pass
+
+
 def copy_and_update(m, u):
     res = m.copy()
     res.update(u)
@@ -550,6 +554,308 @@ class ExchangeAccountTest(unittest.TestCase):
              'ETH': {'free': 105.97, 'total': 105.97, 'used': 0.0},
              'USD': {'free': 12.987, 'total': 12.987, 'used': 0.0}})
 
+    def test__create_order__stop_market(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        id = account.create_order(market=ETH_BTC_MARKET, side='sell',
+                                  type='market', amount=2, price=None,
+                                  stop_price=7.5)['id']
+        self.assertEqual(account.fetch_balance()['ETH'],
+                         {'free': 98.0, 'used': 2.0, 'total': 100.0})
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['status'], 'open')
+        self.assertEqual(order['stopPrice'], 7.5)
+        self.assertEqual(order['triggerPrice'], 7.5)
+        # The low reaches the stop price at 1:02
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['lastTradeTimestamp'],
+                         timeframe.date().value / 1e6)
+        self.assertEqual(order['price'], 7.48875)
+        self.assertEqual(order['fee'], {'currency': 'BTC', 'rate': 0.01,
+                                        'cost': 0.1497750})
+        self.assertEqual(account.fetch_balance(),
+                         {'BTC': {'free': 64.827725, 'used': 0.0,
+                                  'total': 64.827725},
+                          'ETH': {'free': 98.0, 'used': 0.0, 'total': 98.0}})
+
+    def test__create_order__stop_market__price_jumps(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        # The high of 1:01 is below the stop price
+        sell_id = account.create_order(market=ETH_BTC_MARKET, side='sell',
+                                       type='market', amount=1, price=None,
+                                       stop_price=9.5)['id']
+        # The low of 1:01 is above the stop price
+        buy_id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                      type='market', amount=1, price=None,
+                                      stop_price=7.5)['id']
+        timeframe.add_timedelta()
+        self.assertEqual(account.fetch_order(sell_id)['price'], 8.9865)
+        self.assertEqual(account.fetch_order(buy_id)['price'], 8.012)
+
+    def test__create_order__stop_market__insufficient_funds(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        # Reserved for the stop price, but filled at the low of 1:01
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='market', amount=6.6, price=None,
+                                  stop_price=7.5)['id']
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 49.57425)
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['status'], 'canceled')
+        self.assertEqual(order['filled'], 0)
+        self.assertEqual(account.fetch_balance()['BTC'],
+                         {'free': 50.0, 'used': 0.0, 'total': 50.0})
+
+    def test__create_order__stop_limit(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        # Triggered at 1:01, the low reaches the limit price at 1:03
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=2, price=6.5,
+                                  stop_price=8.5)['id']
+        # Triggered and filled at 1:02
+        same_candle_id = account.create_order(
+            market=ETH_BTC_MARKET, side='sell', type='limit', amount=1,
+            price=9.5, stop_price=7.5)['id']
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 13)
+        timeframe.add_timedelta()
+        self.assertEqual(account.fetch_order(id)['status'], 'open')
+        self.assertEqual(account.fetch_order(same_candle_id)['status'],
+                         'open')
+        timeframe.add_timedelta()
+        self.assertEqual(account.fetch_order(id)['status'], 'open')
+        order = account.fetch_order(same_candle_id)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['price'], 9.5)
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['price'], 6.5)
+        self.assertEqual(order['fee']['rate'], 0.005)
+
+    def test__create_order__stop__not_triggered(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='market', amount=2, price=None,
+                                  stop_price=12)['id']
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 24.036)
+        while not timeframe.finished():
+            timeframe.add_timedelta()
+        timeframe.set_end_date(timeframe.date() - pandas.Timedelta(minutes=1))
+        self.assertEqual(account.fetch_order(id)['status'], 'open')
+        account.cancel_order(id)
+        self.assertEqual(account.fetch_balance()['BTC'],
+                         {'free': 50.0, 'used': 0.0, 'total': 50.0})
+
+    def test__create_order__stop_price_is_zero(self):
+        account, _ = self.setup_alternative_eth_btc_usd()
+        with self.assertRaises(BadRequest) as e:
+            account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                 type='market', amount=2, price=None,
+                                 stop_price=0)
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: stop price needs to be positive')
+        self.assertEqual(account.fetch_open_orders(), [])
+
+    def setup_volume_share(self, volume_share=0.5,
+                           volume=[100, 10, 20, 30]):
+        dates = pandas.to_datetime(['2017-06-01 1:00', '2017-06-01 1:01',
+                                    '2017-06-01 1:02', '2017-06-01 1:03'],
+                                   utc=True)
+        timeframe = Timeframe(pd_start_date=dates[0],
+                              pd_end_date=dates[-1],
+                              pd_interval=pandas.Timedelta(minutes=1))
+        data = {'high': [10, 9, 11, 9],
+                'low': [9, 8, 7, 6],
+                'volume': volume}
+        account = ExchangeAccount(
+            timeframe=timeframe,
+            ohlcvs={'ETH/BTC': pandas.DataFrame(data=data, index=dates)},
+            balances={'BTC': 500, 'ETH': 100},
+            volume_share=volume_share)
+        return account, timeframe
+
+    def test__create_order__volume_share__limit_buy(self):
+        account, timeframe = self.setup_volume_share()
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=20, price=8)['id']
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 160)
+        expected = [
+            # filled, remaining, status, BTC used, BTC total
+            (5, 15, 'open', 120, 460),
+            (15, 5, 'open', 40, 380),
+            (20, 0, 'closed', 0, 340),
+        ]
+        for filled, remaining, status, used, total in expected:
+            timeframe.add_timedelta()
+            order = account.fetch_order(id)
+            self.assertEqual(order['filled'], filled)
+            self.assertEqual(order['remaining'], remaining)
+            self.assertEqual(order['status'], status)
+            self.assertEqual(order['cost'], filled * 8)
+            self.assertEqual(order['lastTradeTimestamp'],
+                             timeframe.date().value / 1e6)
+            balance = account.fetch_balance()
+            self.assertEqual(balance['BTC']['used'], used)
+            self.assertEqual(balance['BTC']['total'], total)
+        self.assertEqual(order['fee'], {'currency': 'ETH', 'rate': 0.005,
+                                        'cost': 0.1})
+        self.assertEqual(account.fetch_balance()['ETH']['total'], 119.9)
+
+    def test__create_order__volume_share__limit_sell(self):
+        account, timeframe = self.setup_volume_share(volume_share=0.2)
+        id = account.create_order(market=ETH_BTC_MARKET, side='sell',
+                                  type='limit', amount=5, price=9)['id']
+        timeframe.add_timedelta()
+        self.assertEqual(account.fetch_order(id)['filled'], 2)
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['filled'], 5)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(account.fetch_balance()['ETH'],
+                         {'free': 95.0, 'used': 0.0, 'total': 95.0})
+
+    def test__create_order__volume_share__not_enough_volume(self):
+        account, timeframe = self.setup_volume_share()
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=50, price=7)['id']
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['filled'], 25)
+        self.assertEqual(order['status'], 'open')
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 175)
+
+    def test__create_order__volume_share__zero_volume(self):
+        # The price is reached from 1:01, but the first fill is at 1:03
+        account, timeframe = self.setup_volume_share(volume=[100, 0, 0, 100])
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=20, price=8)['id']
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['filled'], 0)
+        self.assertIsNone(order['lastTradeTimestamp'])
+        timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['filled'], 20)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['lastTradeTimestamp'],
+                         timeframe.date().value / 1e6)
+
+    def test__create_order__volume_share__only_zero_volume(self):
+        account, timeframe = self.setup_volume_share(volume=[100, 0, 0, 0])
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=20, price=8)['id']
+        while not timeframe.finished():
+            timeframe.add_timedelta()
+        order = account.fetch_order(id)
+        self.assertEqual(order['filled'], 0)
+        self.assertEqual(order['status'], 'open')
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 160)
+
+    def test__create_order__volume_share__cancel(self):
+        account, timeframe = self.setup_volume_share()
+        id = account.create_order(market=ETH_BTC_MARKET, side='buy',
+                                  type='limit', amount=20, price=8)['id']
+        timeframe.add_timedelta()
+        account.cancel_order(id)
+        order = account.fetch_order(id)
+        self.assertEqual(order['status'], 'canceled')
+        self.assertEqual(order['filled'], 5)
+        self.assertEqual(account.fetch_balance()['BTC'],
+                         {'free': 460.0, 'used': 0.0, 'total': 460.0})
+        self.assertEqual([o['id'] for o in account.fetch_closed_orders()],
+                         [id])
+
+    def test__create_order__volume_share__market(self):
+        # Market orders are filled at once
+        account, _ = self.setup_volume_share()
+        id = account.create_order(market=ETH_BTC_MARKET, side='sell',
+                                  type='market', amount=90, price=None)['id']
+        self.assertEqual(account.fetch_order(id)['filled'], 90)
+
+    def test__init__volume_share(self):
+        with self.assertRaises(ValueError) as e:
+            self.setup_volume_share(volume_share=1.5)
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: volume share needs to be between '
+                         '0 and 1')
+        with self.assertRaises(ValueError) as e:
+            ExchangeAccount(timeframe=self.timeframe,
+                            ohlcvs={'ETH/BTC': self.eth_btc_ohlcvs},
+                            volume_share=0.1)
+        self.assertEqual(str(e.exception),
+                         'ohlcv volume needs to be provided')
+
+    def test__create_orders(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        single, single_timeframe = self.setup_alternative_eth_btc_usd()
+        orders = [
+            {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+             'amount': 1, 'price': 7.5},
+            {'market': BTC_USD_MARKET, 'side': 'sell', 'type': 'limit',
+             'amount': 2, 'price': 6.5},
+            {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+             'amount': 3, 'price': 8.5},
+            {'market': ETH_BTC_MARKET, 'side': 'sell', 'type': 'market',
+             'amount': 1, 'price': None},
+            {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+             'amount': 2, 'price': 1},
+            {'market': ETH_BTC_MARKET, 'side': 'sell', 'type': 'market',
+             'amount': 1, 'price': None, 'stop_price': 7.5},
+        ]
+        result = account.create_orders(orders)
+        self.assertEqual(result, [{'id': str(i), 'info': {}}
+                                  for i in range(1, 7)])
+        for order in orders:
+            single.create_order(**order)
+        # Same orders, balances and fill dates as single orders
+        while not timeframe.finished():
+            self.assertEqual(account.fetch_balance(), single.fetch_balance())
+            self.assertEqual(account.fetch_open_orders(),
+                             single.fetch_open_orders())
+            self.assertEqual(account.fetch_closed_orders(),
+                             single.fetch_closed_orders())
+            timeframe.add_timedelta()
+            single_timeframe.add_timedelta()
+        self.assertEqual(
+            [order['id'] for order in account.fetch_open_orders()], ['5'])
+
+    def test__create_orders__insufficient_funds(self):
+        account, _ = self.setup_alternative_eth_btc_usd()
+        balance = account.fetch_balance()
+        with self.assertRaises(InsufficientFunds):
+            account.create_orders([
+                {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+                 'amount': 5, 'price': 8},
+                {'market': ETH_BTC_MARKET, 'side': 'sell', 'type': 'market',
+                 'amount': 1},
+                {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+                 'amount': 5, 'price': 8}])
+        # No order is created, the balances are unchanged
+        self.assertEqual(account.fetch_balance(), balance)
+        self.assertEqual(account.fetch_open_orders(), [])
+        self.assertEqual(account.fetch_closed_orders(), [])
+        self.assertEqual(account.create_order(
+            market=ETH_BTC_MARKET, side='buy', type='limit', amount=5,
+            price=8)['id'], '1')
+
+    def test__create_orders__invalid_order(self):
+        account, _ = self.setup_alternative_eth_btc_usd()
+        with self.assertRaises(BadRequest) as e:
+            account.create_orders([
+                {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+                 'amount': 1, 'price': 8},
+                {'market': ETH_BTC_MARKET, 'side': 'buy', 'type': 'limit',
+                 'amount': 1, 'price': 0}])
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: price needs to be positive')
+        self.assertEqual(account.fetch_balance()['BTC']['used'], 0)
+        self.assertEqual(account.fetch_open_orders(), [])
+
     def test__fetch_balance(self):
         account = ExchangeAccount(timeframe=self.timeframe,
                                   balances={'BTC': 15.3,
@@ -1247,3 +1553,113 @@ class ExchangeAccountTest(unittest.TestCase):
         self.assertEqual(account.fetch_balance(),
                          {'BTC': {'free': 1.0, 'total': 1.0, 'used': 0.0},
                           'ETH': {'free': 2.0, 'total': 2.0, 'used': 0.0}})
+
+    def test__get_state__set_state(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        account.create_order(market=ETH_BTC_MARKET, side='sell', type='limit',
+                             amount=10, price=11)
+        state = account.get_state()
+        open_orders = account.fetch_open_orders()
+        balance = account.fetch_balance()
+        timeframe_state = timeframe.get_state()
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        account.create_order(market=ETH_BTC_MARKET, side='sell',
+                             type='market', amount=1, price=None)
+        self.assertEqual(len(account.fetch_closed_orders()), 2)
+        self.assertEqual(account.fetch_open_orders(), [])
+        # go back in time and fill again
+        timeframe.set_state(timeframe_state)
+        account.set_state(state)
+        self.assertEqual(account.fetch_closed_orders(), [])
+        self.assertEqual(account.fetch_open_orders(), open_orders)
+        self.assertEqual(account.fetch_balance(), balance)
+        account.create_order(market=ETH_BTC_MARKET, side='buy',
+                             type='market', amount=1, price=None)
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        self.assertEqual(len(account.fetch_closed_orders()), 2)
+        # the state can be used multiple times
+        timeframe.set_state(timeframe_state)
+        account.set_state(state)
+        self.assertEqual(account.fetch_open_orders(), open_orders)
+
+    def test__closed_orders_since(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        account.create_order(market=ETH_BTC_MARKET, side='sell', type='limit',
+                             amount=10, price=11)
+        account.create_order(market=ETH_BTC_MARKET, side='sell',
+                             type='market', amount=1, price=None)
+        self.assertNotIn('closed_orders',
+                         account.get_state(closed_orders=False))
+        state = account.get_state()
+        self.assertEqual([id for id, _ in account.closed_orders_since(0)],
+                         ['2'])
+        timeframe_state = timeframe.get_state()
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        account.create_order(market=ETH_BTC_MARKET, side='buy',
+                             type='market', amount=1, price=None)
+        # The limit order is filled after the first market order
+        self.assertEqual([id for id, _ in account.closed_orders_since(0)],
+                         ['2', '1', '3'])
+        self.assertEqual([id for id, _ in account.closed_orders_since(2)],
+                         ['3'])
+        self.assertEqual(account.closed_orders_since(3), [])
+        timeframe.set_state(timeframe_state)
+        account.set_state(state)
+        self.assertEqual([id for id, _ in account.closed_orders_since(0)],
+                         ['2'])
+
+    def test__fetch_order_events(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        reader = Reader()
+        account.set_order_event_reader(reader, 0)
+        self.assertEqual(account.fetch_order_events(start=0), ([], 0))
+        account.create_order(market=ETH_BTC_MARKET, side='sell',
+                             type='limit', amount=1, price=11)
+        account.create_order(market=ETH_BTC_MARKET, side='buy',
+                             type='limit', amount=1, price=1)
+        self.assertEqual(account.order_event_count(), 2)
+        account.cancel_order('2')
+        orders, start = account.fetch_order_events(start=0)
+        self.assertEqual([(o['id'], o['status']) for o in orders],
+                         [('1', 'open'), ('2', 'canceled')])
+        self.assertEqual(start, 3)
+        timeframe.add_timedelta()
+        self.assertEqual(account.fetch_order_events(start=start), ([], 3))
+        timeframe.add_timedelta()
+        orders, start = account.fetch_order_events(start=start)
+        self.assertEqual([(o['id'], o['status']) for o in orders],
+                         [('1', 'closed')])
+        self.assertEqual(start, 4)
+        self.assertEqual(
+            account.fetch_order_events(start=0, symbol='BTC/USD'), ([], 4))
+
+    def test__fetch_order_events__trim(self):
+        account, timeframe = self.setup_alternative_eth_btc_usd()
+        # Without reader the events are not stored, but counted
+        account.create_order(market=ETH_BTC_MARKET, side='buy',
+                             type='limit', amount=1, price=1)
+        self.assertEqual(account.order_event_count(), 1)
+        self.assertEqual(account._order_events, [])
+        first = Reader()
+        second = Reader()
+        account.set_order_event_reader(first, 1)
+        account.set_order_event_reader(second, 1)
+        account.cancel_order('1')
+        account.create_order(market=ETH_BTC_MARKET, side='buy',
+                             type='limit', amount=1, price=1)
+        account.set_order_event_reader(first, 3)
+        self.assertEqual(account._order_events, ['1', '2'])
+        # The events before the position of all readers are removed
+        account.set_order_event_reader(second, 2)
+        self.assertEqual(account._order_events, ['2'])
+        orders, start = account.fetch_order_events(start=2)
+        self.assertEqual([o['id'] for o in orders], ['2'])
+        self.assertEqual(start, 3)
+        # Readers, which do not exist anymore, do not need events
+        del second
+        account.set_order_event_reader(first, 3)
+        self.assertEqual(account._order_events, [])
+        self.assertEqual(account.order_event_count(), 3)
@@ -111,10 +111,12 @@ class ExchangeBackendTest(unittest.TestCase):
         balances_mock = MagicMock()
         ExchangeBackend(ohlcvs=ohlcvs_mock,
                         timeframe=timeframe_mock,
-                        balances=balances_mock)
+                        balances=balances_mock,
+                        volume_share=0.1)
         mock.assert_called_once_with(ohlcvs=ohlcvs_mock,
                                      timeframe=timeframe_mock,
-                                     balances=balances_mock)
+                                     balances=balances_mock,
+                                     volume_share=0.1)
 
     @patch("btrccts.exchange_backend.ExchangeAccount")
     def template_exchange_account_method_propagated(
@@ -128,14 +130,15 @@ class ExchangeBackendTest(unittest.TestCase):
         result = getattr(backend, methodname)(**kwargs)
         mock.assert_called_once_with(ohlcvs=ohlcvs,
                                      timeframe=timeframe_mock,
-                                     balances=balances)
+                                     balances=balances,
+                                     volume_share=None)
         getattr(mock(), methodname).assert_called_once_with(**kwargs)
         self.assertEqual(result, getattr(mock(), methodname)())
 
     def test__create_order(self):
         self.template_exchange_account_method_propagated(
             kwargs={'market': {}, 'side': 'sell', 'price': 5,
-                    'amount': 10, 'type': 'limit'},
+                    'amount': 10, 'type': 'limit', 'stop_price': 6},
             methodname='create_order')
 
     def test__cancel_order(self):
@@ -358,6 +361,18 @@ class ExchangeBackendTest(unittest.TestCase):
         self.assertEqual(str(e.exception), 'ExchangeBackend: fetch_ohlcv: no '
                                            'date available at since')
 
+    def test__ohlcv_dataframe(self):
+        backend = ExchangeBackend(ohlcvs={'BTC/USD': self.fetch_ohlcv_ohlcvs},
+                                  timeframe=self.fetch_ohlcv_timeframe,
+                                  balances={})
+        result = backend.ohlcv_dataframe('BTC/USD')
+        self.assertEqual(len(result.index), 20)
+        self.assertEqual(result['close'].iloc[-1], 84)
+        with self.assertRaises(BadSymbol) as e:
+            backend.ohlcv_dataframe('ETH/BTC')
+        self.assertEqual(str(e.exception),
+                         'ExchangeBackend: no prices for ETH/BTC')
+
     def test__fetch_ticker(self):
         timeframe = Timeframe(pd_start_date=self.fetch_ohlcv_ohlcvs.index[0],
                               pd_end_date=self.fetch_ohlcv_ohlcvs.index[-1],
@@ -398,3 +413,32 @@ class ExchangeBackendTest(unittest.TestCase):
             backend.fetch_ticker('BTC/USD')
         self.assertEqual(str(e.exception),
                          'ExchangeBackend: no prices for BTC/USD')
+
+    def test__fetch_tickers(self):
+        timeframe = Timeframe(pd_start_date=self.fetch_ohlcv_ohlcvs.index[0],
+                              pd_end_date=self.fetch_ohlcv_ohlcvs.index[-1],
+                              pd_interval=pandas.Timedelta(minutes=0.5))
+        backend = ExchangeBackend(
+            ohlcvs={'BTC/USD': self.fetch_ohlcv_ohlcvs,
+                    'ETH/BTC': self.fetch_ohlcv_ohlcvs * 2},
+            timeframe=timeframe, balances={})
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        timeframe.add_timedelta()
+        tickers = backend.fetch_tickers()
+        self.assertEqual(list(tickers), ['BTC/USD', 'ETH/BTC'])
+        self.assertEqual(tickers['BTC/USD'], backend.fetch_ticker('BTC/USD'))
+        self.assertEqual(tickers['ETH/BTC'], backend.fetch_ticker('ETH/BTC'))
+        self.assertEqual(tickers['ETH/BTC']['close'], 24.0)
+        self.assertEqual(backend.fetch_tickers(['ETH/BTC']),
+                         {'ETH/BTC': tickers['ETH/BTC']})
+        self.assertEqual(backend.fetch_tickers([]), {})
+
+    def test__fetch_tickers__exception(self):
+        backend = ExchangeBackend(ohlcvs={'BTC/USD': self.fetch_ohlcv_ohlcvs},
+                                  timeframe=self.fetch_ohlcv_timeframe,
+                                  balances={})
+        with self.assertRaises(BadSymbol) as e:
+            backend.fetch_tickers(['BTC/USD', 'ETH/BTC'])
+        self.assertEqual(str(e.exception),
+                         'ExchangeBackend: no prices for ETH/BTC')
@@ -0,0 +1,265 @@
+import numpy
+import os
+import pandas
+import tempfile
+import unittest
+from btrccts.context import BacktestContext
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.features import FeatureStore, data_feature_store, \
+    function_hash
+from btrccts.indicators import sma
+from btrccts.run import load_ohlcvs
+from btrccts.timeframe import Timeframe
+from pandas.testing import assert_frame_equal, assert_series_equal
+from unittest.mock import MagicMock, patch
+from tests.common import pd_ts
+
+calls = []
+FACTOR = 2
+
+
+def double_close(ohlcv, factor=2):
+    calls.append(factor)
+    return ohlcv['close'] * factor
+
+
+def bands(ohlcv):
+    calls.append('bands')
+    return pandas.DataFrame({'upper': ohlcv['high'] + 1,
+                             'lower': ohlcv['low'] - 1})
+
+
+def next_close(ohlcv):
+    return ohlcv['close'].shift(-1)
+
+
+def scale(values):
+    return values * FACTOR
+
+
+def scaled_close(ohlcv):
+    return scale(ohlcv['close'])
+
+
+def with_values(values):
+    def func(ohlcv):
+        return ohlcv['close'] * values[:len(ohlcv.index)]
+    return func
+
+
+class FeatureStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        self.write_data(close=[1, 2, 3, 4])
+        self.store = data_feature_store(self.data_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_data(self, close, symbol='BTC/USD'):
+        path = os.path.join(self.data_dir, 'ohlcv', 'kraken',
+                            '{}.csv'.format(symbol))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ohlcv = pandas.DataFrame(
+            data={'open': close, 'high': close, 'low': close,
+                  'close': close, 'volume': close},
+            index=pandas.date_range('2019-10-01 10:10', periods=len(close),
+                                    freq='1min', tz='UTC'), dtype=float)
+        self.ohlcv.to_csv(path)
+        self.ohlcv = load_ohlcvs(
+            ohlcv_dir=os.path.join(self.data_dir, 'ohlcv'),
+            exchange_names=['kraken'], symbols=[symbol])['kraken'][symbol]
+
+    def get(self, func=double_close, params={}, store=None, **kwargs):
+        return (store or self.store).get('kraken', 'BTC/USD', func,
+                                         ohlcv=self.ohlcv, params=params,
+                                         **kwargs)
+
+    def stored_keys(self):
+        return sorted(name[:-4] for name in os.listdir(
+            os.path.join(self.data_dir, 'features')) if name.endswith('.npy'))
+
+    def test__function_hash(self):
+        self.assertEqual(function_hash(double_close),
+                         function_hash(double_close))
+        self.assertNotEqual(function_hash(double_close),
+                            function_hash(bands))
+        # Values of closures are part of the hash
+        self.assertEqual(function_hash(sma(3)), function_hash(sma(3)))
+        self.assertNotEqual(function_hash(sma(3)), function_hash(sma(4)))
+        with self.assertRaises(ValueError) as e:
+            function_hash(len)
+        self.assertEqual(str(e.exception),
+                         'Feature store: source of len is not available')
+
+    def test__function_hash__globals(self):
+        expected = function_hash(scaled_close)
+        # Constants of referenced functions
+        with patch('tests.unit.features.FACTOR', 3):
+            self.assertNotEqual(function_hash(scaled_close), expected)
+        # Referenced functions
+        with patch('tests.unit.features.scale', next_close):
+            self.assertNotEqual(function_hash(scaled_close), expected)
+        self.assertEqual(function_hash(scaled_close), expected)
+
+    def test__function_hash__arrays(self):
+        # The repr of large arrays is shortened
+        values = numpy.arange(2000.0)
+        changed = values.copy()
+        changed[1000] = 0.5
+        self.assertEqual(function_hash(with_values(values)),
+                         function_hash(with_values(values.copy())))
+        self.assertNotEqual(function_hash(with_values(values)),
+                            function_hash(with_values(changed)))
+        self.assertNotEqual(function_hash(with_values(pandas.Series(values))),
+                            function_hash(with_values(pandas.Series(changed))))
+        self.assertNotEqual(
+            function_hash(with_values(pandas.Series(values))),
+            function_hash(with_values(pandas.Series(values, name='other'))))
+
+    def test__function_hash__version(self):
+        func = with_values(1)
+        expected = function_hash(func)
+        func.version = 2
+        self.assertNotEqual(function_hash(func), expected)
+
+    def test__get(self):
+        expected = pandas.Series([2, 4, 6, 8], index=self.ohlcv.index,
+                                 name='close', dtype=float)
+        with patch('btrccts.features.numpy.load',
+                   wraps=numpy.load) as load:
+            assert_series_equal(self.get(), expected)
+            self.assertEqual(calls, [2])
+            key = self.store.key('kraken', 'BTC/USD', double_close)
+            load.assert_called_once_with(
+                os.path.join(self.data_dir, 'features', key + '.npy'),
+                mmap_mode='r')
+        # Other processes load the stored values
+        store = data_feature_store(self.data_dir)
+        assert_series_equal(self.get(store=store), expected)
+        self.assertEqual(calls, [2])
+        self.assertEqual(self.stored_keys(), [key])
+
+    def test__get__params(self):
+        assert_series_equal(self.get(params={'factor': 3}),
+                            self.ohlcv['close'] * 3)
+        self.get(params={'factor': 3})
+        self.get()
+        self.assertEqual(calls, [3, 2])
+        self.assertEqual(len(self.stored_keys()), 2)
+
+    def test__get__dataframe(self):
+        result = self.get(bands)
+        self.get(bands)
+        self.assertEqual(calls, ['bands'])
+        assert_frame_equal(result, pandas.DataFrame(
+            {'upper': [2, 3, 4, 5], 'lower': [0, 1, 2, 3]},
+            index=self.ohlcv.index, dtype=float))
+
+    def test__get__data_changed(self):
+        self.get()
+        self.write_data(close=[1, 2, 3, 5])
+        assert_series_equal(self.get(), self.ohlcv['close'] * 2)
+        self.assertEqual(calls, [2, 2])
+
+    def test__get__check(self):
+        check = MagicMock(side_effect=ValueError('wrong'))
+        with self.assertRaises(ValueError) as e:
+            self.get(check=check)
+        self.assertEqual(str(e.exception), 'wrong')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.data_dir, 'features')))
+        check = MagicMock()
+        self.get(check=check)
+        self.get(check=check)
+        check.assert_called_once()
+
+    def test__get__wrong_length(self):
+        self.get()
+        self.ohlcv = self.ohlcv.iloc[:2]
+        with self.assertRaises(ValueError) as e:
+            self.get()
+        self.assertEqual(str(e.exception),
+                         'Feature store: double_close needs to return one '
+                         'value per candle')
+
+    def test__evict(self):
+        self.get(params={'factor': 1})
+        size = self.store.size()
+        store = FeatureStore(
+            features_dir=os.path.join(self.data_dir, 'features'),
+            ohlcv_dir=os.path.join(self.data_dir, 'ohlcv'),
+            max_bytes=size * 3)
+        self.get(store=store, params={'factor': 2})
+        self.get(store=store, params={'factor': 3})
+        keys = {factor: store.key('kraken', 'BTC/USD', double_close,
+                                  {'factor': factor})
+                for factor in [1, 2, 3]}
+        # factor 2 is the least recently used
+        for factor, mtime in [(1, 3), (2, 1), (3, 2)]:
+            path = os.path.join(self.data_dir, 'features',
+                                keys[factor] + '.npy')
+            os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+        self.get(store=store, params={'factor': 4})
+        self.assertEqual(calls, [1, 2, 3, 4])
+        self.assertEqual(self.stored_keys(), sorted([
+            keys[1], keys[3], store.key('kraken', 'BTC/USD', double_close,
+                                        {'factor': 4})]))
+        self.assertLessEqual(store.size(), size * 3)
+        # A hit updates the modification time
+        self.get(store=store, params={'factor': 1})
+        self.assertEqual(calls, [1, 2, 3, 4])
+        self.assertGreater(os.stat(os.path.join(
+            self.data_dir, 'features', keys[1] + '.npy')).st_mtime_ns,
+            3 * 10**9)
+
+    def create_context(self):
+        timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                              pd_end_date=pd_ts('2019-10-01 10:13'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        backend = ExchangeBackend(timeframe=timeframe,
+                                  ohlcvs={'BTC/USD': self.ohlcv,
+                                          'ETH/BTC': self.ohlcv})
+        return timeframe, BacktestContext(
+            timeframe=timeframe, exchange_backends={'kraken': backend},
+            feature_store=self.store)
+
+    def test__indicator(self):
+        timeframe, context = self.create_context()
+        context.register_indicator('kraken', 'BTC/USD', 'double',
+                                   double_close)
+        timeframe.add_timedelta()
+        assert_series_equal(context.indicator('kraken', 'BTC/USD', 'double'),
+                            self.ohlcv['close'][:2] * 2)
+        # Computed for the values and for the look ahead check
+        self.assertEqual(calls, [2, 2])
+        _, context = self.create_context()
+        context.register_indicator('kraken', 'BTC/USD', 'double',
+                                   double_close)
+        self.assertEqual(calls, [2, 2])
+        with self.assertRaises(ValueError) as e:
+            context.register_indicator('kraken', 'BTC/USD', 'next',
+                                       next_close)
+        self.assertEqual(str(e.exception), 'Indicator: next uses future data')
+        self.assertEqual(len(self.stored_keys()), 1)
+        # Without data file the values are not stored
+        context.register_indicator('kraken', 'ETH/BTC', 'double',
+                                   double_close)
+        self.assertEqual(calls, [2, 2, 2, 2])
+        self.assertEqual(len(self.stored_keys()), 1)
+
+    def test__indicator__without_source(self):
+        namespace = {}
+        exec('def triple(ohlcv):\n    return ohlcv["close"] * 3', namespace)
+        timeframe, context = self.create_context()
+        # Computed without the store
+        context.register_indicator('kraken', 'BTC/USD', 'triple',
+                                   namespace['triple'])
+        timeframe.add_timedelta()
+        assert_series_equal(context.indicator('kraken', 'BTC/USD', 'triple'),
+                            self.ohlcv['close'][:2] * 3)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.data_dir, 'features')))
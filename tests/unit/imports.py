@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import unittest
+import btrccts
+import btrccts.algorithm
+import btrccts.cli
+import btrccts.run
+
+HELP = """
+import io
+import sys
+from contextlib import redirect_stdout
+from btrccts import AlgorithmBase, parse_params_and_execute_algorithm
+sys.argv = ['algo.py', '--help']
+try:
+    with redirect_stdout(io.StringIO()):
+        parse_params_and_execute_algorithm(AlgorithmBase)
+except SystemExit:
+    pass
+"""
+
+
+def imported_modules(statement, modules):
+    code = '{}\nimport sys\nprint(",".join(m for m in {!r} ' \
+        'if m in sys.modules))'.format(statement, modules)
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+    return [m for m in result.stdout.strip().split(',') if m != '']
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test__import_btrccts(self):
+        self.assertEqual(
+            imported_modules('import btrccts\nbtrccts.AlgorithmBase',
+                             ['ccxt', 'pandas', 'btrccts.run']), [])
+
+    def test__import_run(self):
+        self.assertEqual(
+            imported_modules('import btrccts.run',
+                             ['ccxt', 'ccxt.async_support', 'aiohttp',
+                              'btrccts.metrics']),
+            ['ccxt'])
+
+    def test__parse_params__help(self):
+        # The arguments are parsed before ccxt and pandas are imported
+        self.assertEqual(
+            imported_modules(HELP, ['ccxt', 'pandas', 'btrccts.run']), [])
+
+    def test__create_exchange(self):
+        create = 'from btrccts.context import BacktestContext\n' \
+            'BacktestContext(timeframe=None).create_exchange("kraken"{})'
+        self.assertEqual(
+            imported_modules(create.format(''), ['ccxt.async_support']),
+            [])
+        self.assertEqual(
+            imported_modules(create.format(', async_ccxt=True'),
+                             ['ccxt.async_support']),
+            ['ccxt.async_support'])
+
+    def test__exports(self):
+        self.assertIs(btrccts.AlgorithmBase,
+                      btrccts.algorithm.AlgorithmBase)
+        self.assertIs(btrccts.parse_params_and_execute_algorithm,
+                      btrccts.cli.parse_params_and_execute_algorithm)
+        self.assertIs(btrccts.run.parse_params_and_execute_algorithm,
+                      btrccts.cli.parse_params_and_execute_algorithm)
+        self.assertIn('AlgorithmBase', dir(btrccts))
+        with self.assertRaises(AttributeError) as e:
+            btrccts.not_an_attribute
+        self.assertEqual(
+            str(e.exception),
+            "module 'btrccts' has no attribute 'not_an_attribute'")
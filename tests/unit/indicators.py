@@ -0,0 +1,295 @@
+import numpy
+import pandas
+import threading
+import unittest
+from btrccts.context import BacktestContext, LiveContext
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.indicators import BacktestIndicators, LiveIndicators, atr, \
+    ema, sma
+from btrccts.timeframe import Timeframe
+from pandas.testing import assert_series_equal
+from unittest.mock import MagicMock, patch
+from tests.common import async_test, pd_ts
+
+
+def create_ohlcv(start, count):
+    index = pandas.date_range(start, periods=count, freq='1min', tz='UTC')
+    close = numpy.array([10 + (i % 7) - (i % 3) for i in range(count)],
+                        dtype=float)
+    return pandas.DataFrame(
+        data={'open': close - 1, 'high': close + 2, 'low': close - 3,
+              'close': close, 'volume': numpy.arange(count, dtype=float)},
+        index=index)
+
+
+class FakeExchange:
+
+    def __init__(self, ohlcv):
+        self.ohlcv = ohlcv
+        self.calls = []
+
+    def fetch_ohlcv(self, exchange_id, symbol, since, limit):
+        self.calls.append((exchange_id, symbol, since, limit))
+        data = self.ohlcv[pandas.Timestamp(since, unit='ms', tz='UTC'):]
+        # The exchange also returns the candle, which is not complete
+        return [[int(date.value / 10**6)] + list(row)
+                for date, row in zip(data.index[:limit],
+                                     data.values[:limit].tolist())]
+
+
+class IndicatorFunctionsTest(unittest.TestCase):
+
+    def test__sma(self):
+        ohlcv = create_ohlcv('2019-10-01 10:10', 5)
+        func = sma(3)
+        self.assertEqual(func.warmup, 3)
+        assert_series_equal(func(ohlcv),
+                            ohlcv['close'].rolling(3).mean())
+        assert_series_equal(sma(2, column='volume')(ohlcv),
+                            pandas.Series([numpy.nan, 0.5, 1.5, 2.5, 3.5],
+                                          index=ohlcv.index, name='volume'))
+
+    def test__ema(self):
+        ohlcv = create_ohlcv('2019-10-01 10:10', 5)
+        self.assertEqual(ema(3).warmup, 30)
+        self.assertEqual(ema(3, warmup=5).warmup, 5)
+        assert_series_equal(ema(3)(ohlcv),
+                            ohlcv['close'].ewm(span=3, adjust=False).mean())
+
+    def test__atr(self):
+        ohlcv = create_ohlcv('2019-10-01 10:10', 4)
+        # close: 10, 10, 10, 13
+        ohlcv.loc[ohlcv.index[2], 'high'] = 20
+        func = atr(2)
+        self.assertEqual(func.warmup, 3)
+        # true range: 5, 5, 13 (high - low), 5 (high - previous close)
+        assert_series_equal(func(ohlcv),
+                            pandas.Series([numpy.nan, 5, 9, 9],
+                                          index=ohlcv.index))
+
+
+class BacktestIndicatorsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ohlcv = create_ohlcv('2019-10-01 10:10', 20)
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:29'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        backend = ExchangeBackend(timeframe=self.timeframe,
+                                  ohlcvs={'BTC/USD': self.ohlcv})
+        self.context = BacktestContext(timeframe=self.timeframe,
+                                       exchange_backends={'kraken': backend})
+
+    def test__indicator(self):
+        func = MagicMock(side_effect=sma(3), warmup=3)
+        self.context.register_indicator('kraken', 'BTC/USD', 'sma', func)
+        full = self.ohlcv['close'].rolling(3).mean()
+        assert_series_equal(
+            self.context.indicator('kraken', 'BTC/USD', 'sma'), full[:1])
+        for _ in range(5):
+            self.timeframe.add_timedelta()
+        assert_series_equal(
+            self.context.indicator('kraken', 'BTC/USD', 'sma'), full[:6])
+        # Computed once for the data and once for the look ahead check
+        self.assertEqual(func.call_count, 2)
+
+    def test__indicator__dataframe(self):
+        def bands(ohlcv):
+            mean = ohlcv['close'].rolling(4).mean()
+            std = ohlcv['close'].rolling(4).std()
+            return pandas.DataFrame({'upper': mean + 2 * std,
+                                     'lower': mean - 2 * std})
+        self.context.register_indicator('kraken', 'BTC/USD', 'bands', bands,
+                                        warmup=4)
+        self.timeframe.add_timedelta()
+        self.timeframe.add_timedelta()
+        self.timeframe.add_timedelta()
+        self.timeframe.add_timedelta()
+        result = self.context.indicator('kraken', 'BTC/USD', 'bands')
+        self.assertEqual(len(result.index), 5)
+        self.assertEqual(list(result.columns), ['upper', 'lower'])
+
+    def test__register__future_data(self):
+        with self.assertRaises(ValueError) as e:
+            self.context.register_indicator(
+                'kraken', 'BTC/USD', 'next_close',
+                lambda ohlcv: ohlcv['close'].shift(-1), warmup=1)
+        self.assertEqual(str(e.exception),
+                         'Indicator: next_close uses future data')
+        with self.assertRaises(ValueError) as e:
+            self.context.register_indicator(
+                'kraken', 'BTC/USD', 'centered',
+                lambda ohlcv: ohlcv['close'].rolling(3, center=True).mean(),
+                warmup=3)
+        self.assertEqual(str(e.exception),
+                         'Indicator: centered uses future data')
+
+    def test__register__errors(self):
+        with self.assertRaises(ValueError) as e:
+            self.context.register_indicator(
+                'kraken', 'BTC/USD', 'last',
+                lambda ohlcv: ohlcv['close'].iloc[-1:], warmup=1)
+        self.assertEqual(str(e.exception),
+                         'Indicator: last needs to return one value per '
+                         'candle')
+        with self.assertRaises(ValueError) as e:
+            self.context.register_indicator('kraken', 'BTC/USD', 'sma',
+                                            sma(3), warmup=0)
+        self.assertEqual(str(e.exception),
+                         'Indicator: warmup needs to be positive')
+        with self.assertRaises(ValueError) as e:
+            self.context.indicator('kraken', 'BTC/USD', 'sma')
+        self.assertEqual(str(e.exception),
+                         'Indicator: sma is not registered for kraken '
+                         'BTC/USD')
+
+    def test__get_ohlcv(self):
+        get_ohlcv = MagicMock(return_value=self.ohlcv)
+        indicators = BacktestIndicators(timeframe=self.timeframe,
+                                        get_ohlcv=get_ohlcv)
+        indicators.register('okx', 'ETH/BTC', 'sma', sma(2))
+        get_ohlcv.assert_called_once_with('okx', 'ETH/BTC')
+        self.assertEqual(len(indicators.get('okx', 'ETH/BTC', 'sma')), 1)
+
+
+class LiveIndicatorsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ohlcv = create_ohlcv('2019-10-01 10:00', 60)
+        self.exchange = FakeExchange(self.ohlcv)
+        self.now = pd_ts('2019-10-01 10:20:30')
+        self.indicators = LiveIndicators(
+            fetch_ohlcv=self.exchange.fetch_ohlcv, now=lambda: self.now)
+
+    def expected(self, func, until):
+        return func(self.ohlcv)[:pd_ts('2019-10-01 {}'.format(until))]
+
+    @patch('btrccts.indicators.LIVE_FETCH_LIMIT', 4)
+    def test__incremental(self):
+        sma_func = MagicMock(side_effect=sma(3), warmup=3)
+        atr_func = atr(2)
+        self.indicators.register('kraken', 'BTC/USD', 'sma', sma_func)
+        # The warmup candles until the last complete candle (10:19)
+        self.assertEqual(self.exchange.calls,
+                         [('kraken', 'BTC/USD',
+                           pd_ts('2019-10-01 10:17').value / 10**6, 4)])
+        # Only values with complete warmup
+        values = self.indicators.get('kraken', 'BTC/USD', 'sma')
+        assert_series_equal(values, self.expected(sma(3), '10:19')[-1:],
+                            check_freq=False)
+        self.indicators.register('kraken', 'BTC/USD', 'atr', atr_func)
+        self.assertEqual(len(self.exchange.calls), 1)
+        self.now = pd_ts('2019-10-01 10:30')
+        values = self.indicators.get('kraken', 'BTC/USD', 'sma')
+        assert_series_equal(values, self.expected(sma(3), '10:29')[-11:],
+                            check_freq=False)
+        # 10 new candles in pages of 4
+        self.assertEqual(len(self.exchange.calls), 4)
+        # The function gets the warmup and the new candles
+        self.assertEqual(len(sma_func.call_args[0][0].index), 13)
+        values = self.indicators.get('kraken', 'BTC/USD', 'atr')
+        self.assertEqual(len(self.exchange.calls), 4)
+        assert_series_equal(values, self.expected(atr(2), '10:29')[-11:],
+                            check_freq=False)
+        # No new candle, no fetch
+        self.now = pd_ts('2019-10-01 10:30:59')
+        self.indicators.get('kraken', 'BTC/USD', 'sma')
+        self.assertEqual(len(self.exchange.calls), 4)
+
+    @patch('btrccts.indicators.LIVE_MAX_VALUES', 5)
+    def test__max_values(self):
+        self.indicators.register('kraken', 'BTC/USD', 'sma', sma(3))
+        self.now = pd_ts('2019-10-01 10:30')
+        # Only the values of the last candles are kept
+        assert_series_equal(
+            self.indicators.get('kraken', 'BTC/USD', 'sma'),
+            self.expected(sma(3), '10:29')[-5:], check_freq=False)
+
+    def test__register__more_warmup(self):
+        self.indicators.register('kraken', 'BTC/USD', 'sma', sma(2))
+        self.now = pd_ts('2019-10-01 10:21')
+        self.indicators.register('kraken', 'BTC/USD', 'sma5', sma(5))
+        assert_series_equal(
+            self.indicators.get('kraken', 'BTC/USD', 'sma5'),
+            self.expected(sma(5), '10:20')[-1:], check_freq=False)
+        assert_series_equal(
+            self.indicators.get('kraken', 'BTC/USD', 'sma'),
+            self.expected(sma(2), '10:20')[-2:], check_freq=False)
+
+    def test__not_registered(self):
+        with self.assertRaises(ValueError) as e:
+            self.indicators.get('kraken', 'BTC/USD', 'sma')
+        self.assertEqual(str(e.exception),
+                         'Indicator: sma is not registered for kraken '
+                         'BTC/USD')
+
+    @patch('btrccts.context.pandas.Timestamp.now')
+    def test__live_context(self, now):
+        now.return_value = pd_ts('2019-10-01 10:20:30')
+        context = LiveContext(timeframe=None, conf_dir='')
+        fake = FakeExchange(self.ohlcv)
+        exchange = MagicMock()
+        exchange.fetch_ohlcv.side_effect = \
+            lambda symbol, timeframe, since, limit: fake.fetch_ohlcv(
+                None, symbol, since, limit)
+        with patch.object(context, 'create_exchange',
+                          return_value=exchange) as create_exchange:
+            context.register_indicator('kraken', 'BTC/USD', 'sma', sma(3))
+            now.return_value = pd_ts('2019-10-01 10:22:30')
+            values = context.indicator('kraken', 'BTC/USD', 'sma')
+        create_exchange.assert_called_once_with('kraken')
+        self.assertEqual(exchange.fetch_ohlcv.call_count, 2)
+        self.assertEqual(exchange.fetch_ohlcv.call_args[0][:2],
+                         ('BTC/USD', '1m'))
+        assert_series_equal(values, self.expected(sma(3), '10:21')[-3:],
+                            check_freq=False)
+
+    def create_live_context(self):
+        context = LiveContext(timeframe=None, conf_dir='')
+        fake = FakeExchange(self.ohlcv)
+        threads = []
+
+        def fetch_ohlcv(symbol, timeframe, since, limit):
+            threads.append(threading.current_thread())
+            return fake.fetch_ohlcv(None, symbol, since, limit)
+
+        exchange = MagicMock()
+        exchange.fetch_ohlcv.side_effect = fetch_ohlcv
+        context._ohlcv_exchanges['kraken'] = exchange
+        return context, threads
+
+    @patch('btrccts.context.pandas.Timestamp.now')
+    @async_test
+    async def test__live_context__async(self, now):
+        now.return_value = pd_ts('2019-10-01 10:20:30')
+        context, threads = self.create_live_context()
+        await context.register_indicator_async('kraken', 'BTC/USD', 'sma',
+                                               sma(3))
+        now.return_value = pd_ts('2019-10-01 10:22:30')
+        values = await context.indicator_async('kraken', 'BTC/USD', 'sma')
+        assert_series_equal(values, self.expected(sma(3), '10:21')[-3:],
+                            check_freq=False)
+        window = await context.window_async('kraken', 'BTC/USD', 2, 'close')
+        numpy.testing.assert_array_equal(
+            window, self.ohlcv['close'].values[20:22])
+        # The loop is not blocked by the fetches
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    @async_test
+    async def test__backtest_context__async(self):
+        timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                              pd_end_date=pd_ts('2019-10-01 10:20'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        backend = ExchangeBackend(timeframe=timeframe,
+                                  ohlcvs={'BTC/USD': self.ohlcv})
+        context = BacktestContext(timeframe=timeframe,
+                                  exchange_backends={'kraken': backend})
+        await context.register_indicator_async('kraken', 'BTC/USD', 'sma',
+                                               sma(3))
+        assert_series_equal(
+            await context.indicator_async('kraken', 'BTC/USD', 'sma'),
+            self.expected(sma(3), '10:10'))
+        numpy.testing.assert_array_equal(
+            await context.window_async('kraken', 'BTC/USD', 2, 'close'),
+            self.ohlcv['close'].values[9:11])
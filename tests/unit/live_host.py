@@ -0,0 +1,199 @@
+import asyncio
+import ccxt.async_support
+import os
+import pandas
+import tempfile
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.live_host import Scheduler, SharedExchange, SharedExchanges, \
+    execute_live_algorithms, host_algorithms
+from btrccts.metrics import RunMetrics
+from btrccts.profiling import Profiler
+from btrccts.run import ExitReason
+from unittest.mock import patch
+from tests.common import async_test
+
+conf_dir = 'tests/unit/context/config'
+
+
+def now():
+    return pandas.Timestamp.now(tz='UTC')
+
+
+class HostedAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.args = args
+        self.dates = []
+        self.exit_reason = None
+        self.exchange = context.create_exchange('bitfinex', async_ccxt=True)
+
+    async def next_iteration(self):
+        self.dates.append(self.context.date())
+        if self.args.get('fail'):
+            raise ValueError('failed')
+
+    def handle_exception(self, e):
+        raise e
+
+    async def exit(self, reason):
+        self.exit_reason = reason
+        await self.exchange.close()
+
+
+class SchedulerTest(unittest.TestCase):
+
+    @async_test
+    async def test__sleep_until(self):
+        scheduler = Scheduler()
+        start = now()
+        woken = []
+
+        async def sleeper(milliseconds):
+            date = start + pandas.Timedelta(milliseconds=milliseconds)
+            await scheduler.sleep_until(date)
+            self.assertGreaterEqual(now(), date)
+            woken.append(milliseconds)
+
+        tasks = [asyncio.ensure_future(sleeper(ms)) for ms in [60, 20, 40]]
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.waiting(), 3)
+        await asyncio.gather(*tasks)
+        self.assertEqual(woken, [20, 40, 60])
+        self.assertEqual(scheduler.waiting(), 0)
+
+    @async_test
+    async def test__sleep_until__past_and_cancelled(self):
+        scheduler = Scheduler()
+        await scheduler.sleep_until(now() - pandas.Timedelta(seconds=1))
+        task = asyncio.ensure_future(scheduler.sleep_until(
+            now() + pandas.Timedelta(milliseconds=10)))
+        later = asyncio.ensure_future(scheduler.sleep_until(
+            now() + pandas.Timedelta(milliseconds=30)))
+        await asyncio.sleep(0)
+        task.cancel()
+        await later
+        self.assertEqual(scheduler.waiting(), 0)
+
+
+class SharedExchangesTest(unittest.TestCase):
+
+    @async_test
+    async def test__get(self):
+        shared = SharedExchanges(conf_dir=conf_dir)
+        exchange = shared.get('bitfinex', auth_aliases={}, config={},
+                              async_ccxt=True)
+        self.assertIs(shared.get('bitfinex', auth_aliases={}, config={},
+                                 async_ccxt=True), exchange)
+        self.assertEqual(exchange.apiKey, '555')
+        with self.assertLogs('btrccts'):
+            other = shared.get('bitfinex', auth_aliases={'bitfinex': 'b2'},
+                               config={}, async_ccxt=True)
+        self.assertIsNot(other, exchange)
+        self.assertIsNot(shared.get('bitfinex', auth_aliases={},
+                                    config={'timeout': 5}, async_ccxt=True),
+                         exchange)
+        self.assertIsNot(shared.get('bitfinex', auth_aliases={}, config={},
+                                    async_ccxt=False), exchange)
+        self.assertEqual(shared.count(), 4)
+        self.assertIsInstance(exchange, SharedExchange)
+        self.assertNotIsInstance(shared.get('bitfinex', auth_aliases={},
+                                            config={}, async_ccxt=False),
+                                 SharedExchange)
+        # Algorithms cannot close the shared exchange
+        with patch.object(ccxt.async_support.bitfinex, 'close') as close:
+            await exchange.close()
+            close.assert_not_called()
+            await shared.close()
+        self.assertEqual(close.call_count, 3)
+        self.assertEqual(shared.count(), 0)
+
+
+class HostAlgorithmsTest(unittest.TestCase):
+
+    @async_test
+    async def test__host_algorithms(self):
+        pd_end_date = now() + pandas.Timedelta(milliseconds=250)
+        metrics = RunMetrics(labelnames=['algorithm'])
+        profiler = Profiler()
+        with self.assertLogs('btrccts') as cm:
+            fast, slow, failing = await host_algorithms(
+                algorithms=[
+                    (HostedAlgo, {}, pandas.Timedelta(milliseconds=50),
+                     pd_end_date),
+                    (HostedAlgo, {}, pandas.Timedelta(milliseconds=100),
+                     pd_end_date),
+                    (HostedAlgo, {'fail': True},
+                     pandas.Timedelta(milliseconds=100), pd_end_date),
+                ],
+                conf_dir=conf_dir, profiler=profiler, metrics=metrics)
+        self.assertEqual(fast.exit_reason, ExitReason.FINISHED)
+        self.assertEqual(slow.exit_reason, ExitReason.FINISHED)
+        self.assertIsInstance(failing, ValueError)
+        self.assertIn('ERROR:btrccts:Algorithm stopped with exception',
+                      '\n'.join(cm.output))
+        self.assertGreater(len(fast.dates), len(slow.dates))
+        self.assertGreaterEqual(len(slow.dates), 2)
+        for algorithm, interval in [(fast, 50), (slow, 100)]:
+            for date in algorithm.dates:
+                self.assertEqual(
+                    date, date.floor(pandas.Timedelta(milliseconds=interval)))
+        # One exchange instance for all algorithms
+        self.assertIs(fast.exchange, slow.exchange)
+        # The iterations are counted per algorithm
+        iterations = metrics.registry.counter('btrccts_iterations_total', '',
+                                              ['algorithm'])
+        self.assertEqual(iterations.value(algorithm='HostedAlgo-0'),
+                         len(fast.dates))
+        self.assertEqual(iterations.value(algorithm='HostedAlgo-1'),
+                         len(slow.dates))
+        self.assertEqual(iterations.value(algorithm='HostedAlgo-2'), 0)
+        errors = metrics.registry.counter('btrccts_iteration_errors_total',
+                                          '', ['algorithm'])
+        self.assertEqual(errors.value(algorithm='HostedAlgo-2'), 1)
+        summary = profiler.summary()
+        self.assertIn('HostedAlgo-0.next_iteration', summary)
+        self.assertIn('HostedAlgo-1.next_iteration', summary)
+
+    @async_test
+    async def test__host_algorithms__metrics_labels(self):
+        with self.assertRaises(ValueError) as e:
+            await host_algorithms(algorithms=[(HostedAlgo, {}, None, None)],
+                                  metrics=RunMetrics())
+        self.assertEqual(str(e.exception),
+                         'RunMetrics: labels need to be []')
+
+    def test__execute_live_algorithms__metrics(self):
+        pd_end_date = now() + pandas.Timedelta(milliseconds=100)
+        interval = pandas.Timedelta(milliseconds=50)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'metrics.prom')
+            with self.assertLogs('btrccts') as cm:
+                algorithm, = execute_live_algorithms(
+                    algorithms=[(HostedAlgo, {}, interval, pd_end_date)],
+                    conf_dir=conf_dir, profile=True, metrics_file=path)
+            with open(path) as f:
+                text = f.read()
+        self.assertIn('btrccts_iterations_total{{algorithm="HostedAlgo-0"}} '
+                      '{}'.format(float(len(algorithm.dates))), text)
+        self.assertIn('HostedAlgo-0.next_iteration', '\n'.join(cm.output))
+
+    @async_test
+    async def test__host_algorithms__auth_aliases(self):
+        pd_end_date = now() + pandas.Timedelta(milliseconds=50)
+        interval = pandas.Timedelta(milliseconds=50)
+        with self.assertLogs('btrccts') as cm:
+            default, other, same = await host_algorithms(
+                algorithms=[
+                    (HostedAlgo, {}, interval, pd_end_date),
+                    (HostedAlgo, {}, interval, pd_end_date,
+                     {'bitfinex': 'b2'}),
+                    (HostedAlgo, {}, interval, pd_end_date,
+                     {'kraken': 'k2'}),
+                ],
+                conf_dir=conf_dir)
+        self.assertIn('b2.json', '\n'.join(cm.output))
+        self.assertEqual(default.exchange.apiKey, '555')
+        self.assertIsNot(other.exchange, default.exchange)
+        self.assertIs(same.exchange, default.exchange)
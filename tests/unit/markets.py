@@ -0,0 +1,180 @@
+import ccxt
+import ccxt.async_support
+import json
+import os
+import tempfile
+import unittest
+from btrccts.context import BacktestContext
+from btrccts.markets import load_market_snapshot, main, \
+    refresh_market_snapshots, save_market_snapshot
+from unittest.mock import MagicMock, patch
+from tests.common import BTC_USD_MARKET, ETH_BTC_MARKET, async_test, \
+    fetch_markets_return
+
+CURRENCIES = {'BTC': {'id': 'BTC', 'code': 'BTC', 'precision': 0.0001}}
+
+
+class MarketSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.markets_dir = os.path.join(self.tmp_dir.name, 'markets')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test__load_market_snapshot__missing(self):
+        self.assertIsNone(load_market_snapshot(self.markets_dir, 'kraken'))
+
+    def test__save_and_load(self):
+        saved = save_market_snapshot(self.markets_dir, 'kraken',
+                                     markets=[BTC_USD_MARKET],
+                                     currencies=CURRENCIES)
+        self.assertEqual(os.listdir(self.markets_dir), ['kraken.json'])
+        loaded = load_market_snapshot(self.markets_dir, 'kraken')
+        self.assertEqual(loaded, saved)
+        self.assertEqual(loaded['version'], 1)
+        self.assertEqual(loaded['exchange'], 'kraken')
+        self.assertEqual(loaded['ccxt_version'], ccxt.__version__)
+        self.assertEqual(loaded['markets'], [BTC_USD_MARKET])
+        self.assertEqual(loaded['currencies'], CURRENCIES)
+
+    def test__load_market_snapshot__errors(self):
+        os.makedirs(self.markets_dir)
+        path = os.path.join(self.markets_dir, 'kraken.json')
+        with open(path, 'w') as f:
+            json.dump({'version': 0}, f)
+        with self.assertRaises(ValueError) as e:
+            load_market_snapshot(self.markets_dir, 'kraken')
+        self.assertEqual(str(e.exception),
+                         'Market snapshot: version 0 of {} is not supported'
+                         .format(path))
+        with open(path, 'w') as f:
+            f.write('{')
+        with self.assertRaises(ValueError) as e:
+            load_market_snapshot(self.markets_dir, 'kraken')
+        self.assertEqual(str(e.exception),
+                         'Market snapshot: cannot parse {}'.format(path))
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__refresh_market_snapshots(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET,
+                                                    ETH_BTC_MARKET])
+        currencies.return_value = CURRENCIES
+        with self.assertLogs('btrccts') as cm:
+            refresh_market_snapshots(self.markets_dir, ['kraken'])
+        self.assertEqual(cm.output,
+                         ['INFO:btrccts:Saved 2 markets of kraken'])
+        snapshot = load_market_snapshot(self.markets_dir, 'kraken')
+        self.assertEqual(snapshot['markets'],
+                         [BTC_USD_MARKET, ETH_BTC_MARKET])
+        self.assertEqual(snapshot['currencies'], CURRENCIES)
+        with self.assertRaises(ValueError) as e:
+            refresh_market_snapshots(self.markets_dir, ['not_an_exchange'])
+        self.assertEqual(str(e.exception),
+                         'Unknown exchange: not_an_exchange')
+
+    @patch.object(ccxt.kraken, 'fetch_markets', autospec=True)
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__refresh_market_snapshots__config(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([ETH_BTC_MARKET])
+        currencies.return_value = CURRENCIES
+        config = {'options': {'defaultType': 'future'}}
+        with self.assertLogs('btrccts'):
+            refresh_market_snapshots(self.markets_dir, ['kraken'],
+                                     configs={'kraken': config})
+        # The exchange is created with the config
+        self.assertEqual(markets.call_args[0][0].options['defaultType'],
+                         'future')
+        # Only the snapshot of the market config is written
+        self.assertIsNone(load_market_snapshot(self.markets_dir, 'kraken'))
+        self.assertIsNone(load_market_snapshot(
+            self.markets_dir, 'kraken',
+            {'options': {'defaultType': 'spot'}}))
+        snapshot = load_market_snapshot(self.markets_dir, 'kraken', config)
+        self.assertEqual(snapshot['markets'], [ETH_BTC_MARKET])
+        self.assertEqual(snapshot['config'], config)
+        # Credentials do not change the snapshot
+        self.assertEqual(load_market_snapshot(
+            self.markets_dir, 'kraken', dict(config, apiKey='key')),
+            snapshot)
+
+    @patch('btrccts.markets.refresh_market_snapshots')
+    def test__main(self, refresh):
+        main(['kraken', 'binance', '--data-directory', self.tmp_dir.name])
+        refresh.assert_called_once_with(markets_dir=self.markets_dir,
+                                        exchange_names=['kraken', 'binance'],
+                                        configs={})
+        main(['binance', '--data-directory', self.tmp_dir.name,
+              '--configs', '{"binance": {"options": {"defaultType": "x"}}}'])
+        refresh.assert_called_with(
+            markets_dir=self.markets_dir, exchange_names=['binance'],
+            configs={'binance': {'options': {'defaultType': 'x'}}})
+
+    def create_context(self):
+        save_market_snapshot(self.markets_dir, 'kraken',
+                             markets=[BTC_USD_MARKET], currencies=CURRENCIES)
+        self.backend = MagicMock()
+        return BacktestContext(timeframe=None,
+                               exchange_backends={'kraken': self.backend},
+                               markets_dir=self.markets_dir)
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__backtest_context__no_network(self, currencies, markets):
+        context = self.create_context()
+        exchange = context.create_exchange('kraken')
+        exchange.create_order(symbol='BTC/USD', type='market', side='buy',
+                              amount=1)
+        markets.assert_not_called()
+        currencies.assert_not_called()
+        self.assertEqual(self.backend.create_order.call_args[1]['market'],
+                         exchange.markets['BTC/USD'])
+        self.assertEqual(exchange.markets['BTC/USD']['taker'], 0.002)
+        self.assertEqual(exchange.currencies['BTC']['precision'], 0.0001)
+        # Exchanges without snapshot load the markets from the exchange
+        with patch.object(ccxt.binance, 'fetch_markets') as binance_markets:
+            binance_markets.side_effect = fetch_markets_return(
+                [ETH_BTC_MARKET])
+            binance = context.create_exchange('binance')
+            binance.options['fetchMarkets'] = {}
+            binance.has['fetchCurrencies'] = False
+            binance.load_markets()
+            binance_markets.assert_called_once_with({})
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__backtest_context__market_config(self, currencies, markets):
+        context = self.create_context()
+        config = {'options': {'defaultType': 'future'}}
+        save_market_snapshot(self.markets_dir, 'kraken',
+                             markets=[ETH_BTC_MARKET], currencies=CURRENCIES,
+                             config=config)
+        exchange = context.create_exchange('kraken', config)
+        self.assertEqual(list(exchange.markets), ['ETH/BTC'])
+        # Without a snapshot of the market config, the markets are loaded
+        # from the exchange instead of using the default snapshot
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET,
+                                                    ETH_BTC_MARKET])
+        currencies.return_value = {}
+        other = context.create_exchange(
+            'kraken', {'options': {'defaultType': 'spot'}})
+        self.assertIsNone(other.markets)
+        other.load_markets()
+        markets.assert_called_once()
+        self.assertEqual(list(context.create_exchange('kraken').markets),
+                         ['BTC/USD'])
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    @async_test
+    async def test__backtest_context__no_network__async(self, currencies,
+                                                        markets):
+        context = self.create_context()
+        exchange = context.create_exchange('kraken', async_ccxt=True)
+        await exchange.create_order(symbol='BTC/USD', type='market',
+                                    side='buy', amount=1)
+        markets.assert_not_called()
+        currencies.assert_not_called()
+        self.backend.create_order.assert_called_once()
@@ -0,0 +1,227 @@
+import ccxt
+import os
+import pandas
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from btrccts.algorithm import AlgorithmBaseSync
+from btrccts.context import LiveContext
+from btrccts.metrics import HttpExporter, MetricsRegistry, RunMetrics, \
+    TextFileExporter
+from btrccts.run import main_loop
+from btrccts.timeframe import Timeframe
+from unittest.mock import Mock, patch
+from tests.common import async_noop, async_test, pd_ts
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test__render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', 'Calls', ['method'])
+        gauge = registry.gauge('lag_seconds', 'Lag "now"')
+        histogram = registry.histogram('duration_seconds', 'Duration',
+                                       buckets=[0.5, 0.1])
+        counter.inc(method='fetch')
+        counter.inc(2, method='fetch')
+        counter.inc(method='a\\"b')
+        gauge.set(1.5)
+        histogram.observe(0.0625)
+        histogram.observe(0.25)
+        histogram.observe(2)
+        self.assertEqual(counter.value(method='fetch'), 3)
+        self.assertEqual(gauge.value(), 1.5)
+        self.assertEqual(histogram.value(),
+                         {'buckets': [1, 2, 3], 'sum': 2.3125, 'count': 3})
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP calls_total Calls',
+            '# TYPE calls_total counter',
+            'calls_total{method="a\\\\\\"b"} 1.0',
+            'calls_total{method="fetch"} 3.0',
+            '# HELP duration_seconds Duration',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{le="0.1"} 1.0',
+            'duration_seconds_bucket{le="0.5"} 2.0',
+            'duration_seconds_bucket{le="+Inf"} 3.0',
+            'duration_seconds_sum 2.3125',
+            'duration_seconds_count 3.0',
+            '# HELP lag_seconds Lag \\"now\\"',
+            '# TYPE lag_seconds gauge',
+            'lag_seconds 1.5',
+            '']))
+
+    def test__labels(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', 'Calls', ['method'])
+        for labels in [{}, {'other': 1}, {'method': 1, 'other': 1}]:
+            with self.assertRaises(ValueError) as e:
+                counter.inc(**labels)
+            self.assertEqual(str(e.exception),
+                             "Metric calls_total: labels need to be "
+                             "['method']")
+
+    def test__counter__negative(self):
+        counter = MetricsRegistry().counter('calls_total', 'Calls')
+        with self.assertRaises(ValueError) as e:
+            counter.inc(-1)
+        self.assertEqual(str(e.exception),
+                         'Counter calls_total: amount needs to be positive')
+
+    def test__register__twice(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', 'Calls')
+        self.assertIs(registry.counter('calls_total', 'Calls'), counter)
+        with self.assertRaises(ValueError) as e:
+            registry.gauge('calls_total', 'Calls')
+        self.assertEqual(str(e.exception),
+                         'Metric calls_total is already registered')
+        with self.assertRaises(ValueError):
+            registry.counter('calls_total', 'Calls', ['method'])
+
+
+class ExporterTest(unittest.TestCase):
+
+    def test__text_file_exporter(self):
+        registry = MetricsRegistry()
+        registry.counter('calls_total', 'Calls').inc()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'metrics.prom')
+            exporter = TextFileExporter(registry=registry, path=path)
+            exporter.start()
+            exporter.export()
+            exporter.close()
+            with open(path) as f:
+                self.assertEqual(f.read(), registry.render())
+            self.assertEqual(os.listdir(tmp_dir), ['metrics.prom'])
+
+    def test__http_exporter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', 'Calls')
+        exporter = HttpExporter(registry=registry, port=0)
+        # Closing an exporter, which was not started
+        exporter.close()
+        exporter.start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(exporter.port())
+            counter.inc()
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(response.read().decode(), registry.render())
+            with self.assertRaises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(url + '/other')
+            e.exception.close()
+            self.assertEqual(e.exception.code, 404)
+        finally:
+            exporter.close()
+
+
+class RunMetricsTest(unittest.TestCase):
+
+    @patch('btrccts.run.sleep_until')
+    @patch('btrccts.run.pandas.Timestamp.now')
+    @async_test
+    async def test__main_loop__live(self, now_mock, sleep_until):
+        sleep_until.side_effect = async_noop
+        now_mock.side_effect = [pd_ts(d) for d in [
+            '2217-01-01 1:00:02', '2217-01-01 1:00:30',
+            '2217-01-01 1:01:00.5',
+            '2217-01-01 1:01:01', '2217-01-01 1:03:30',
+            '2217-01-01 1:03:00.25',
+            '2217-01-01 1:03:00.25', '2217-01-01 1:04:10',
+            '2217-01-01 1:04:20']]
+        algorithm = Mock(spec=AlgorithmBaseSync)
+        algorithm.next_iteration.side_effect = [None, ValueError('a'), None]
+        exporter = Mock()
+        metrics = RunMetrics(exporters=[exporter])
+        timeframe = Timeframe(pd_start_date=pd_ts('2217-01-01 1:00'),
+                              pd_end_date=pd_ts('2217-01-01 1:03'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        with self.assertLogs('btrccts'):
+            await main_loop(timeframe=timeframe, algorithm=algorithm,
+                            live=True, metrics=metrics)
+        registry = metrics.registry
+        self.assertEqual(
+            registry.counter('btrccts_iterations_total', '').value(), 3)
+        self.assertEqual(
+            registry.counter('btrccts_iteration_errors_total', '').value(), 1)
+        self.assertEqual(
+            registry.counter('btrccts_skipped_iterations_total', '').value(),
+            1)
+        self.assertEqual(
+            registry.gauge('btrccts_iteration_lag_seconds', '').value(), 0.25)
+        self.assertEqual(
+            registry.gauge('btrccts_interval_seconds', '').value(), 60)
+        overshoot = registry.histogram('btrccts_sleep_overshoot_seconds',
+                                       '').value()
+        self.assertEqual(overshoot['count'], 3)
+        self.assertEqual(overshoot['sum'], 80.75)
+        self.assertEqual(exporter.export.call_count, 3)
+
+    @patch('btrccts.metrics.pandas.Timestamp.now')
+    def test__slept(self, now_mock):
+        now_mock.side_effect = [pd_ts('2217-01-01 1:00:00.0005'),
+                                pd_ts('2217-01-01 1:00:59.75')]
+        metrics = RunMetrics()
+        metrics.slept(pd_ts('2217-01-01 1:00'), clock_jump=0)
+        registry = metrics.registry
+        miss = registry.gauge('btrccts_sleep_miss_seconds', '')
+        jumps = registry.counter('btrccts_clock_jumps_total', '')
+        self.assertEqual(miss.value(), 0.0005)
+        self.assertEqual(jumps.value(), 0)
+        metrics.slept(pd_ts('2217-01-01 1:01'), clock_jump=-3.5)
+        self.assertEqual(miss.value(), -0.25)
+        self.assertEqual(jumps.value(), 1)
+        overshoot = registry.histogram('btrccts_sleep_overshoot_seconds',
+                                       '').value()
+        self.assertEqual(overshoot['sum'], 0.0005)
+
+    @patch('btrccts.metrics.pandas.Timestamp.now')
+    def test__labeled(self, now_mock):
+        now_mock.return_value = pd_ts('2217-01-01 1:00:00.5')
+        exporter = Mock()
+        metrics = RunMetrics(exporters=[exporter], labelnames=['algorithm'])
+        first = metrics.labeled(algorithm='a')
+        second = metrics.labeled(algorithm='b')
+        timeframe = Timeframe(pd_start_date=pd_ts('2217-01-01 1:00'),
+                              pd_end_date=pd_ts('2217-01-01 1:03'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        for labeled in [first, second, first]:
+            labeled.iteration_started(timeframe, live=False)
+            labeled.iteration_finished()
+        first.slept(pd_ts('2217-01-01 1:00'))
+        iterations = metrics.registry.counter('btrccts_iterations_total', '',
+                                              ['algorithm'])
+        self.assertEqual(iterations.value(algorithm='a'), 2)
+        self.assertEqual(iterations.value(algorithm='b'), 1)
+        self.assertEqual(exporter.export.call_count, 3)
+        self.assertIn('btrccts_sleep_miss_seconds{algorithm="a"} 0.5',
+                      metrics.registry.render())
+        with self.assertRaises(ValueError) as e:
+            metrics.labeled(name='a')
+        self.assertEqual(str(e.exception),
+                         "RunMetrics: labels need to be ['algorithm']")
+
+    def test__live_context__exchange_calls(self):
+        metrics = RunMetrics()
+        with tempfile.TemporaryDirectory() as conf_dir:
+            context = LiveContext(timeframe=None, conf_dir=conf_dir,
+                                  metrics=metrics)
+            with patch.object(ccxt.kraken, 'fetch_ticker') as fetch_ticker:
+                fetch_ticker.side_effect = [
+                    'ticker', ccxt.NetworkError('down')]
+                with self.assertLogs('btrccts'):
+                    exchange = context.create_exchange('kraken')
+                self.assertEqual(exchange.fetch_ticker('BTC/USD'), 'ticker')
+                with self.assertRaises(ccxt.NetworkError):
+                    exchange.fetch_ticker('BTC/USD')
+        registry = metrics.registry
+        duration = registry.histogram(
+            'btrccts_exchange_call_duration_seconds', '',
+            ['exchange', 'method'])
+        self.assertEqual(
+            duration.value(exchange='kraken', method='fetch_ticker')['count'],
+            2)
+        errors = registry.counter('btrccts_exchange_call_errors_total', '',
+                                  ['exchange', 'method', 'error'])
+        self.assertEqual(errors.value(exchange='kraken', method='fetch_ticker',
+                                      error='NetworkError'), 1)
@@ -0,0 +1,144 @@
+import asyncio
+import ccxt
+import numpy
+import os
+import pandas
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.portfolio import execute_algorithms, main_loop_many
+from btrccts.run import ExitReason
+from btrccts.timeframe import Timeframe
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, fetch_markets_return, pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class PortfolioAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.args = args
+        self.dates = []
+        self.exit_reason = None
+        self.kraken = context.create_exchange('kraken')
+
+    def next_iteration(self):
+        self.dates.append(self.context.date())
+        self.kraken.create_order(type='market', side='buy',
+                                 symbol='BTC/USD', amount=self.args['amount'])
+        if len(self.dates) == self.args.get('stop_after'):
+            self.context.stop('stop')
+
+    def exit(self, reason):
+        self.exit_reason = reason
+        self.balance = self.kraken.fetch_balance()
+
+
+class RecordAlgo:
+
+    def __init__(self, name, calls, fail=False):
+        self.name = name
+        self.calls = calls
+        self.fail = fail
+        self.exit_reason = None
+
+    async def next_iteration(self):
+        self.calls.append(self.name)
+        if self.fail:
+            raise ValueError('failed')
+
+    def handle_exception(self, e):
+        raise e
+
+    async def exit(self, reason):
+        self.exit_reason = reason
+
+
+class PortfolioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:12'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_algorithms(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        with self.assertLogs('btrccts'):
+            first, second = execute_algorithms(
+                exchange_names=['kraken'], symbols=['BTC/USD'],
+                algorithms=[
+                    (PortfolioAlgo, {'amount': 1}, {'kraken': {'USD': 100}}),
+                    (PortfolioAlgo, {'amount': 2, 'stop_after': 2},
+                     {'kraken': {'USD': 50}}),
+                ],
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:12'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir)
+        self.assertEqual(first.dates, [pd_ts('2019-10-01 10:10'),
+                                       pd_ts('2019-10-01 10:11'),
+                                       pd_ts('2019-10-01 10:12')])
+        self.assertEqual(second.dates, [pd_ts('2019-10-01 10:10'),
+                                        pd_ts('2019-10-01 10:11')])
+        self.assertEqual(first.exit_reason, ExitReason.FINISHED)
+        self.assertEqual(second.exit_reason, ExitReason.STOPPED)
+        self.assertAlmostEqual(first.balance['BTC']['total'], 3 * 0.998)
+        self.assertAlmostEqual(second.balance['BTC']['total'], 4 * 0.998)
+        self.assertAlmostEqual(first.balance['USD']['total'],
+                               100 - (3 + 4 + 5) * 1.0015)
+        self.assertAlmostEqual(second.balance['USD']['total'],
+                               50 - (3 + 4) * 2 * 1.0015)
+        # The accounts share the ohlcv data
+        first_ohlcv = first.kraken._exchange_backend._ohlcvs['BTC/USD']
+        second_ohlcv = second.kraken._exchange_backend._ohlcvs['BTC/USD']
+        self.assertTrue(numpy.shares_memory(first_ohlcv.values,
+                                            second_ohlcv.values))
+        self.assertTrue(numpy.shares_memory(
+            first.context.window('kraken', 'BTC/USD', 2),
+            second.context.window('kraken', 'BTC/USD', 2)))
+        self.assertTrue(numpy.shares_memory(
+            first.context.panel('kraken'), second.context.panel('kraken')))
+
+    def test__execute_algorithms__volume_share(self):
+        with self.assertRaises(ValueError) as e:
+            execute_algorithms(
+                exchange_names=['kraken'], symbols=['BTC/USD'],
+                algorithms=[(PortfolioAlgo, {'amount': 1},
+                             {'kraken': {'USD': 100}})],
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:12'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, volume_share=1.5)
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: volume share needs to be '
+                         'between 0 and 1')
+
+    def test__main_loop_many__order(self):
+        calls = []
+        algorithms = [RecordAlgo('a', calls), RecordAlgo('b', calls)]
+        with self.assertLogs('btrccts'):
+            result = asyncio.run(main_loop_many(timeframe=self.timeframe,
+                                                algorithms=algorithms))
+        self.assertEqual(result, algorithms)
+        self.assertEqual(calls, ['a', 'b', 'a', 'b', 'a', 'b'])
+        self.assertEqual([a.exit_reason for a in algorithms],
+                         [ExitReason.FINISHED, ExitReason.FINISHED])
+
+    def test__main_loop_many__exception(self):
+        calls = []
+        algorithms = [RecordAlgo('a', calls), RecordAlgo('b', calls, True),
+                      RecordAlgo('c', calls)]
+        with self.assertLogs('btrccts'):
+            with self.assertRaises(ValueError) as e:
+                asyncio.run(main_loop_many(timeframe=self.timeframe,
+                                           algorithms=algorithms))
+        self.assertEqual(str(e.exception), 'failed')
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertEqual([a.exit_reason for a in algorithms],
+                         [ExitReason.STOPPED, ExitReason.EXCEPTION,
+                          ExitReason.STOPPED])
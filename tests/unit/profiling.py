@@ -0,0 +1,230 @@
+import asyncio
+import ccxt
+import contextvars
+import os
+import pandas
+import tempfile
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.context import BacktestContext, LiveContext
+from btrccts.profiling import Profiler, instrument_exchange_class
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.run import execute_algorithm
+from btrccts.timeframe import Timeframe
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, async_test, fetch_markets_return, \
+    pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class ProfileAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.kraken = context.create_exchange('kraken')
+
+    def next_iteration(self):
+        self.kraken.create_order(type='market', side='buy',
+                                 symbol='BTC/USD', amount=1)
+
+
+class FakeExchange:
+
+    id = 'fake'
+
+    def fetch_balance(self):
+        return self.fetch_ticker()
+
+    def fetch_ticker(self):
+        return 'ticker'
+
+    async def create_order(self):
+        return 'order'
+
+    def not_instrumented(self):
+        pass
+
+
+class ProfilerTest(unittest.TestCase):
+
+    @patch('btrccts.profiling.time.perf_counter')
+    def test__summary(self, perf_counter):
+        perf_counter.side_effect = [0, 1, 1.25, 1.5, 1.5, 1.625, 3, 4, 4.5,
+                                    10]
+        profiler = Profiler(slowest_calls=1)
+        profiler.iteration_started()
+        profiler.call_started()
+        profiler.call_finished('kraken', 'create_order', 0.25)
+        profiler.call_started()
+        profiler.call_finished('kraken', 'fetch_ticker', 0.125)
+        profiler.iteration_finished()
+        profiler.iteration_started()
+        profiler.iteration_finished()
+        lines = profiler.summary().split('\n')
+        self.assertEqual(
+            lines[0], 'Profile: 2 iterations in 10.000s (0.2 iterations/s)')
+        self.assertEqual(
+            lines[1], 'Algorithm time: 2.125s (21.2%), exchange time: 0.375s '
+            '(3.8%), other: 7.500s (75.0%)')
+        self.assertEqual([line.split()[:3] for line in lines[3:6]],
+                         [['next_iteration', '2', '2.500'],
+                          ['kraken.create_order', '1', '0.250'],
+                          ['kraken.fetch_ticker', '1', '0.125']])
+        self.assertEqual(lines[6:], ['Slowest calls:',
+                                     '     250.000 ms kraken.create_order '
+                                     '(iteration 1)'])
+
+    @async_test
+    async def test__instrument_exchange_class(self):
+        profiler = Profiler()
+        with patch('btrccts.profiling.EXCHANGE_METHODS',
+                   ['create_order', 'fetch_balance', 'fetch_ticker',
+                    'missing']):
+            cls = instrument_exchange_class(FakeExchange, profiler)
+        self.assertEqual(cls.__bases__, (FakeExchange, ))
+        self.assertEqual(cls.__name__, 'FakeExchange')
+        self.assertFalse(hasattr(cls, 'missing'))
+        exchange = cls()
+        self.assertEqual(exchange.fetch_balance(), 'ticker')
+        self.assertEqual(await exchange.create_order(), 'order')
+        exchange.not_instrumented()
+        self.assertEqual(
+            {key: timing.count for key, timing in profiler._calls.items()},
+            {'fake.fetch_balance': 1, 'fake.fetch_ticker': 1,
+             'fake.create_order': 1})
+        self.assertEqual(profiler._call_depth.get(), 0)
+        # Calls outside of iterations are no exchange time
+        self.assertEqual(profiler._exchange_time, 0)
+        profiler.iteration_started()
+        exchange.fetch_balance()
+        await exchange.create_order()
+        profiler.iteration_finished()
+        # The nested fetch_ticker is not counted twice
+        self.assertLessEqual(
+            profiler._exchange_time,
+            profiler._calls['fake.fetch_balance'].total +
+            profiler._calls['fake.create_order'].total)
+        self.assertGreater(profiler._exchange_time, 0)
+
+    @patch('btrccts.profiling.time.perf_counter')
+    def test__overlapping_calls(self, perf_counter):
+        perf_counter.side_effect = [0, 1, 2, 3, 5, 6, 8, 9, 10]
+        profiler = Profiler()
+        # Every context is a task
+        background, first, second = [contextvars.copy_context()
+                                     for _ in range(3)]
+        # Started before the iteration, active until 2
+        background.run(profiler.call_started)
+        profiler.iteration_started()
+        background.run(profiler.call_finished, 'kraken', 'fetch_ticker', 5)
+        # Overlapping calls from 3 to 5
+        first.run(profiler.call_started)
+        second.run(profiler.call_started)
+        first.run(profiler.call_finished, 'kraken', 'fetch_ticker', 1)
+        second.run(profiler.call_finished, 'kraken', 'fetch_ticker', 2)
+        # Active from 6 until after the end of the iteration at 8
+        profiler.call_started()
+        profiler.iteration_finished()
+        profiler.call_finished('kraken', 'fetch_ticker', 5)
+        profiler.iteration_started()
+        profiler.iteration_finished()
+        self.assertEqual(profiler._iteration.total, 8)
+        self.assertEqual(profiler._exchange_time, 5)
+        self.assertEqual(profiler._calls['kraken.fetch_ticker'].count, 4)
+
+    @async_test
+    async def test__gathered_calls(self):
+        profiler = Profiler()
+
+        class SleepExchange(FakeExchange):
+            async def create_order(self):
+                await asyncio.sleep(0.05)
+
+        with patch('btrccts.profiling.EXCHANGE_METHODS', ['create_order']):
+            exchange = instrument_exchange_class(SleepExchange, profiler)()
+        profiler.iteration_started()
+        await asyncio.gather(*[exchange.create_order() for _ in range(3)])
+        profiler.iteration_finished()
+        self.assertEqual(profiler._active_calls, 0)
+        self.assertLessEqual(profiler._exchange_time,
+                             profiler._iteration.total)
+        self.assertGreater(profiler._exchange_time, 0.04)
+
+    def test__instrument_exchange_class__exception(self):
+        profiler = Profiler()
+
+        class FailExchange(FakeExchange):
+            def fetch_ticker(self):
+                raise ValueError('fail')
+
+        with patch('btrccts.profiling.EXCHANGE_METHODS', ['fetch_ticker']):
+            cls = instrument_exchange_class(FailExchange, profiler)
+        with self.assertRaises(ValueError):
+            cls().fetch_ticker()
+        self.assertEqual(profiler._calls['fake.fetch_ticker'].count, 1)
+        self.assertEqual(profiler._call_depth.get(), 0)
+
+
+class ProfilerContextTest(unittest.TestCase):
+
+    @patch.object(ccxt.kraken, 'fetch_markets')
+    @patch.object(ccxt.kraken, 'fetch_currencies')
+    def test__execute_algorithm__profile(self, currencies, markets):
+        markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
+        currencies.return_value = {}
+        with self.assertLogs('btrccts') as cm:
+            execute_algorithm(
+                exchange_names=['kraken'], symbols=['BTC/USD'], live=False,
+                auth_aliases={}, AlgorithmClass=ProfileAlgo, args={},
+                start_balances={'kraken': {'USD': 100}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:12'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir, profile=True)
+        summary = cm.output[-1].split('\n')
+        self.assertEqual(summary[0].split()[:3],
+                         ['INFO:btrccts:Profile:', '3', 'iterations'])
+        self.assertEqual([line.split()[:2] for line in summary[3:5]],
+                         [['next_iteration', '3'],
+                          ['kraken.create_order', '3']])
+
+    def test__backtest_context__without_profiler(self):
+        context = BacktestContext(timeframe=None)
+        exchange = context.create_exchange('kraken')
+        self.assertEqual(exchange.__class__.__name__, 'BacktestExchange')
+        self.assertNotIn('create_order', vars(exchange.__class__))
+
+    @async_test
+    async def test__backtest_context__watch_ohlcv(self):
+        timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                              pd_end_date=pd_ts('2019-10-01 10:16'),
+                              pd_interval=pandas.Timedelta(minutes=1))
+        ohlcv = pandas.read_csv(
+            os.path.join(data_dir, 'ohlcv', 'kraken', 'BTC', 'USD.csv'),
+            index_col=0, parse_dates=True)
+        backend = ExchangeBackend(timeframe=timeframe, balances={},
+                                  ohlcvs={'BTC/USD': ohlcv})
+        profiler = Profiler()
+        context = BacktestContext(timeframe=timeframe,
+                                  exchange_backends={'kraken': backend},
+                                  profiler=profiler)
+        exchange = context.create_exchange('kraken', async_ccxt=True)
+        await exchange.watch_ohlcv('BTC/USD', '1m')
+        await exchange.watch_ohlcv('BTC/USD', '1m')
+        self.assertEqual(profiler._calls['kraken.watch_ohlcv'].count, 2)
+        self.assertIn('kraken.watch_ohlcv', profiler.summary())
+
+    @patch('btrccts.context.ccxt.kraken.fetch_ticker')
+    def test__live_context(self, fetch_ticker):
+        fetch_ticker.return_value = 'ticker'
+        profiler = Profiler()
+        with tempfile.TemporaryDirectory() as conf_dir:
+            context = LiveContext(timeframe=None, conf_dir=conf_dir,
+                                  profiler=profiler)
+            with self.assertLogs('btrccts'):
+                exchange = context.create_exchange('kraken')
+        self.assertEqual(exchange.__class__.__bases__, (ccxt.kraken, ))
+        self.assertEqual(exchange.fetch_ticker('BTC/USD'), 'ticker')
+        fetch_ticker.assert_called_once_with(exchange, 'BTC/USD')
+        self.assertEqual(profiler._calls['kraken.fetch_ticker'].count, 1)
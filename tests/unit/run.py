@@ -8,12 +8,12 @@ import unittest
 from btrccts.algorithm import AlgorithmBase, AlgorithmBaseSync
 from btrccts.run import load_ohlcvs, main_loop, ExitReason, \
     execute_algorithm, parse_params_and_execute_algorithm, sleep_until, \
-    StopException
+    StopException, main_loop_sync, _is_sync_algorithm
 from btrccts.timeframe import Timeframe
 from unittest.mock import Mock, call, patch
 from tests.common_algos import TestAlgo, assert_test_algo_result, AsyncTestAlgo
 from tests.common import fetch_markets_return, BTC_USD_MARKET, \
-    ETH_BTC_MARKET, pd_ts, async_test, async_noop, \
+    ETH_BTC_MARKET, pd_ts, async_test, \
     async_fetch_markets_return, async_return
 
 here = os.path.dirname(__file__)
@@ -129,6 +129,9 @@ class MainLoopTests(unittest.TestCase):
     def algo(self, algorithm):
         return algorithm
 
+    async def main_loop(self, **kwargs):
+        return await main_loop(**kwargs)
+
     def setUp(self):
         self.timeframe = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
                                    pd_end_date=pd_ts('2017-01-01 1:03'),
@@ -141,8 +144,8 @@ class MainLoopTests(unittest.TestCase):
         algorithm.next_iteration.side_effect = [0, 0, error, 0]
         use_algorithm = self.algo(algorithm)
         with self.assertLogs('btrccts') as cm:
-            result = await main_loop(timeframe=self.timeframe,
-                                     algorithm=use_algorithm)
+            result = await self.main_loop(timeframe=self.timeframe,
+                                          algorithm=use_algorithm)
         self.assertEqual(result, use_algorithm)
         self.assertEqual(algorithm.mock_calls,
                          [call.next_iteration(),
@@ -169,7 +172,7 @@ class MainLoopTests(unittest.TestCase):
         use_algorithm = self.algo(algorithm)
         with self.assertLogs('btrccts') as cm:
             with self.assertRaises(AttributeError) as e:
-                await main_loop(
+                await self.main_loop(
                     timeframe=self.timeframe, algorithm=use_algorithm)
         self.assertEqual(str(e.exception), 'side')
         self.assertEqual(algorithm.mock_calls,
@@ -189,6 +192,29 @@ class MainLoopTests(unittest.TestCase):
         self.assertTrue(cm.output[4].startswith(
             'ERROR:btrccts:side\nTraceback (most recent call last):\n  File'))
 
+    @async_test
+    async def test__main_loop__no_finish(self):
+        algorithm = Mock(spec=AlgorithmBaseSync)
+        use_algorithm = self.algo(algorithm)
+        with self.assertLogs('btrccts') as cm:
+            result = await self.main_loop(timeframe=self.timeframe,
+                                          algorithm=use_algorithm,
+                                          finish=False)
+        self.assertEqual(result, use_algorithm)
+        self.assertEqual(algorithm.mock_calls, [call.next_iteration()] * 4)
+        self.assertEqual(cm.output, ['INFO:btrccts:Starting main_loop',
+                                     'INFO:btrccts:Paused main_loop'])
+        # Continue with an extended timeframe
+        self.timeframe.set_end_date(pd_ts('2017-01-01 1:04'))
+        with self.assertLogs('btrccts') as cm:
+            await self.main_loop(timeframe=self.timeframe,
+                                 algorithm=use_algorithm)
+        self.assertEqual(algorithm.mock_calls,
+                         [call.next_iteration()] * 5 +
+                         [call.exit(reason=ExitReason.FINISHED)])
+        self.assertEqual(cm.output, ['INFO:btrccts:Starting main_loop',
+                                     'INFO:btrccts:Finished main_loop'])
+
     @async_test
     async def template__main_loop__exit_exception(self, exception_class,
                                                   log_str):
@@ -196,8 +222,8 @@ class MainLoopTests(unittest.TestCase):
         algorithm.next_iteration.side_effect = [0, exception_class('aa'), 0, 0]
         use_algorithm = self.algo(algorithm)
         with self.assertLogs('btrccts') as cm:
-            result = await main_loop(timeframe=self.timeframe,
-                                     algorithm=use_algorithm)
+            result = await self.main_loop(timeframe=self.timeframe,
+                                          algorithm=use_algorithm)
         self.assertEqual(algorithm.mock_calls,
                          [call.next_iteration(),
                           call.next_iteration(),
@@ -283,6 +309,31 @@ class AsyncMainLoopTests(MainLoopTests):
         return AsyncAlgo(algorithm)
 
 
+class SyncMainLoopTests(MainLoopTests):
+
+    async def main_loop(self, **kwargs):
+        return main_loop_sync(**kwargs)
+
+    def test__main_loop_sync__async_algorithm(self):
+        with self.assertRaises(ValueError) as e:
+            main_loop_sync(timeframe=self.timeframe,
+                           algorithm=AsyncAlgo(Mock()))
+        self.assertEqual(str(e.exception),
+                         'main_loop_sync: algorithm needs to be synchronous')
+
+    def test__is_sync_algorithm(self):
+        self.assertTrue(_is_sync_algorithm(AlgorithmBaseSync))
+        self.assertTrue(_is_sync_algorithm(Mock(spec=AlgorithmBaseSync)))
+        self.assertFalse(_is_sync_algorithm(AlgorithmBase))
+        self.assertFalse(_is_sync_algorithm(AsyncAlgo(Mock())))
+
+        class MixedAlgo(AlgorithmBaseSync):
+            async def exit(self, reason):
+                pass
+
+        self.assertFalse(_is_sync_algorithm(MixedAlgo))
+
+
 class ExecuteAlgorithmTests(unittest.TestCase):
 
     def run_test(self, Algo):
@@ -309,7 +360,10 @@ class ExecuteAlgorithmTests(unittest.TestCase):
         okx_markets.side_effect = fetch_markets_return([ETH_BTC_MARKET])
         kraken_markets.side_effect = fetch_markets_return([BTC_USD_MARKET])
         kraken_currencies.return_value = {}
-        result = self.run_test(TestAlgo)
+        with patch('btrccts.run._run_async') as run_async:
+            result = self.run_test(TestAlgo)
+        # Sync algorithms run without event loop
+        run_async.assert_not_called()
         self.assertEqual(result.args, self)
         assert_test_algo_result(self, result, live=False)
 
@@ -413,6 +467,13 @@ class ParseParamsAndExecuteAlgorithmTests(unittest.TestCase):
             'live': False,
             'auth_aliases': {},
             'symbols': ['BTC/USD'],
+            'checkpoint_file': None,
+            'checkpoint_every': 1000,
+            'resume': False,
+            'profile': False,
+            'metrics_file': None,
+            'metrics_port': None,
+            'volume_share': None,
         }
         params.update(check_params)
         execute_algorithm.assert_called_once_with(**params)
@@ -476,6 +537,32 @@ class ParseParamsAndExecuteAlgorithmTests(unittest.TestCase):
             argv_params={'--symbols': 'BTC/USD,ETH/BTC,XRP/ETH'},
             check_params={'symbols': ['BTC/USD', 'ETH/BTC', 'XRP/ETH']})
 
+    def test__parse_params_and_execute_algorithm__checkpoint(self):
+        self.template__parse_params_and_execute_algorithm__check_call(
+            argv_params={'--checkpoint-file': '/tmp/checkpoint',
+                         '--checkpoint-every': '20',
+                         '--resume': True},
+            check_params={'checkpoint_file': '/tmp/checkpoint',
+                          'checkpoint_every': 20,
+                          'resume': True})
+
+    def test__parse_params_and_execute_algorithm__profile(self):
+        self.template__parse_params_and_execute_algorithm__check_call(
+            argv_params={'--profile': True},
+            check_params={'profile': True})
+
+    def test__parse_params_and_execute_algorithm__metrics(self):
+        self.template__parse_params_and_execute_algorithm__check_call(
+            argv_params={'--metrics-file': '/tmp/metrics.prom',
+                         '--metrics-port': '9100'},
+            check_params={'metrics_file': '/tmp/metrics.prom',
+                          'metrics_port': 9100})
+
+    def test__parse_params_and_execute_algorithm__volume_share(self):
+        self.template__parse_params_and_execute_algorithm__check_call(
+            argv_params={'--volume-share': '0.1'},
+            check_params={'volume_share': 0.1})
+
     # Live mode tests
     def test__parse_params_and_execute_algorithm__live_start_date(self):
         now_floor = pandas.Timestamp.now(tz='UTC').floor('1min')
@@ -514,61 +601,98 @@ class ParseParamsAndExecuteAlgorithmTests(unittest.TestCase):
             exception_test='Start balance cannot be set in live mode')
 
 
+class FakeClock:
+
+    # Wall clock and monotonic clock. Sleeping advances both, jumps only
+    # change the wall clock. Yielding to the event loop takes 0.5ms.
+
+    def __init__(self, wall, jumps=[]):
+        self.monotonic_time = 1000.0
+        self.offset = pd_ts(wall).value / 10**9 - self.monotonic_time
+        self.jumps = list(jumps)
+        self.sleeps = []
+
+    def time(self):
+        return self.monotonic_time + self.offset
+
+    def monotonic(self):
+        return self.monotonic_time
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.monotonic_time += seconds if seconds > 0 else 0.0005
+        if len(self.jumps) > 0:
+            self.offset += self.jumps.pop(0)
+
+
 class SleepUntilTests(unittest.TestCase):
 
+    def sleep_until(self, clock, date):
+        with patch('btrccts.run.time') as time_mock, \
+                patch('btrccts.run.asyncio.sleep') as sleep_mock:
+            time_mock.time.side_effect = clock.time
+            time_mock.monotonic.side_effect = clock.monotonic
+            sleep_mock.side_effect = clock.sleep
+            return asyncio.run(sleep_until(pd_ts(date)))
+
     @async_test
     @patch('btrccts.run.asyncio.sleep')
     async def test__sleep_until__none(self, sleep_mock):
-        with self.assertRaises(TypeError):
+        with self.assertRaises(AttributeError):
             await sleep_until(None)
         sleep_mock.assert_not_called()
 
-    @patch('btrccts.run.pandas.Timestamp.now')
-    @patch('btrccts.run.asyncio.sleep')
-    @async_test
-    async def test__sleep_until__one_longer_sleep(self, sleep_mock, now_mock):
-        dates = pandas.to_datetime(
-            ['2017-08-18 00:00:00', '2017-08-18 00:01:00'], utc=True)
-        now_mock.side_effect = dates
-        sleep_mock.side_effect = async_noop
-        await sleep_until(dates[1])
-        sleep_mock.assert_called_once_with(1)
-        self.assertEqual(now_mock.mock_calls, [call(tz='UTC')] * 2)
-
-    @patch('btrccts.run.pandas.Timestamp.now')
-    @patch('btrccts.run.asyncio.sleep')
-    @async_test
-    async def test__sleep_until__one_partial_sleep(self, sleep_mock, now_mock):
-        dates = pandas.to_datetime(
-            ['2017-08-18 00:00:00.2', '2017-08-18 00:00:01.0'], utc=True)
-        now_mock.side_effect = dates
-        sleep_mock.side_effect = async_noop
-        await sleep_until(dates[1])
-        sleep_mock.assert_called_once_with(0.8)
-        self.assertEqual(now_mock.mock_calls, [call(tz='UTC')] * 2)
-
-    @patch('btrccts.run.pandas.Timestamp.now')
-    @patch('btrccts.run.asyncio.sleep')
-    @async_test
-    async def test__sleep_until__multiple_sleeps(self, sleep_mock, now_mock):
-        dates = pandas.to_datetime(
-            ['2017-08-18 00:00:00.0', '2017-08-18 00:00:01.123',
-             '2017-08-18 00:00:02.24', '2017-08-18 00:00:03.1'], utc=True)
-        now_mock.side_effect = dates
-        sleep_mock.side_effect = async_noop
-        await sleep_until(pandas.Timestamp('2017-08-18 00:00:03', tz='UTC'))
-        self.assertEqual(sleep_mock.mock_calls, [call(1), call(1), call(0.76)])
-        self.assertEqual(now_mock.mock_calls, [call(tz='UTC')] * 4)
-
-    @patch('btrccts.run.pandas.Timestamp.now')
-    @patch('btrccts.run.asyncio.sleep')
-    @async_test
-    async def test__sleep_until__clock_changed(self, sleep_mock, now_mock):
-        dates = pandas.to_datetime(
-            ['2017-08-18 00:01:00', '2017-08-18 00:00:59',
-             '2017-08-18 00:01:00', '2017-08-18 00:01:01'], utc=True)
-        now_mock.side_effect = dates
-        sleep_mock.side_effect = async_noop
-        await sleep_until(pandas.Timestamp('2017-08-18 00:01:01', tz='UTC'))
-        self.assertEqual(sleep_mock.mock_calls, [call(1)] * 3)
-        self.assertEqual(now_mock.mock_calls, [call(tz='UTC')] * 4)
+    def test__sleep_until__past(self):
+        clock = FakeClock('2017-08-18 00:01:00')
+        self.assertEqual(self.sleep_until(clock, '2017-08-18 00:00:59'), 0)
+        self.assertEqual(clock.sleeps, [])
+
+    def assert_woke_up(self, clock, date):
+        woke_up = clock.time() - pd_ts(date).value / 10**9
+        self.assertGreaterEqual(woke_up, 0)
+        self.assertLess(woke_up, 0.001)
+
+    def test__sleep_until__one_timer(self):
+        # No polling: one timer until shortly before the date,
+        # the rest is waited by yielding to the event loop
+        clock = FakeClock('2017-08-18 00:00:00.2')
+        self.assertEqual(self.sleep_until(clock, '2017-08-18 00:00:30'), 0)
+        self.assertAlmostEqual(clock.sleeps[0], 29.798)
+        self.assertEqual(clock.sleeps[1:], [0] * (len(clock.sleeps) - 1))
+        self.assert_woke_up(clock, '2017-08-18 00:00:30')
+
+    def test__sleep_until__spin(self):
+        clock = FakeClock('2017-08-18 00:00:59.9992')
+        self.sleep_until(clock, '2017-08-18 00:01:00')
+        self.assertEqual(clock.sleeps, [0, 0])
+        self.assert_woke_up(clock, '2017-08-18 00:01:00')
+
+    def test__sleep_until__long_sleep_checks_clock(self):
+        clock = FakeClock('2017-08-18 00:00:00')
+        self.assertEqual(self.sleep_until(clock, '2017-08-18 00:02:30'), 0)
+        self.assertEqual(clock.sleeps[:2], [60, 60])
+        self.assertAlmostEqual(clock.sleeps[2], 29.998)
+
+    def test__sleep_until__clock_jumped_back(self):
+        clock = FakeClock('2017-08-18 00:01:00', jumps=[-20])
+        with self.assertLogs('btrccts') as cm:
+            self.assertEqual(
+                self.sleep_until(clock, '2017-08-18 00:01:30'), -20)
+        self.assertEqual(cm.output, ['WARNING:btrccts:System clock jumped '
+                                     'by -20.000 seconds'])
+        self.assertAlmostEqual(clock.sleeps[0], 29.998)
+        self.assertAlmostEqual(clock.sleeps[1], 20)
+        self.assert_woke_up(clock, '2017-08-18 00:01:30')
+
+    def test__sleep_until__clock_jumped_forward(self):
+        clock = FakeClock('2017-08-18 00:00:00', jumps=[100])
+        with self.assertLogs('btrccts'):
+            self.assertEqual(
+                self.sleep_until(clock, '2017-08-18 00:01:30'), 100)
+        self.assertEqual(clock.sleeps, [60])
+
+    def test__sleep_until__slow_correction(self):
+        # Small corrections are followed without a warning
+        clock = FakeClock('2017-08-18 00:00:00', jumps=[0.05])
+        self.assertEqual(self.sleep_until(clock, '2017-08-18 00:01:30'), 0)
+        self.assert_woke_up(clock, '2017-08-18 00:01:30')
@@ -0,0 +1,190 @@
+import asyncio
+import numpy
+import os
+import pandas
+import time
+import unittest
+from btrccts.algorithm import AlgorithmBase, AlgorithmBaseSync
+from btrccts.run import ExitReason, main_loop_sync
+from btrccts.search import successive_halving
+from unittest.mock import patch
+from tests.common import pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class SearchAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.args = args
+        self.dates = []
+        self.exit_reasons = []
+
+    def next_iteration(self):
+        self.dates.append(self.context.date())
+        if self.args.get('stop_at') == len(self.dates):
+            self.context.stop('stop')
+
+    def exit(self, reason):
+        self.exit_reasons.append(reason)
+
+
+class SyncSearchAlgo(SearchAlgo):
+
+    handle_exception = AlgorithmBaseSync.handle_exception
+
+
+class SleepingSearchAlgo(SearchAlgo):
+
+    async def next_iteration(self):
+        await asyncio.sleep(0.2)
+        super().next_iteration()
+
+
+def score_args(algorithm, balances):
+    return algorithm.args['score']
+
+
+class SuccessiveHalvingTest(unittest.TestCase):
+
+    def run_search(self, candidates, score=score_args, **kwargs):
+        params = {
+            'exchange_names': ['kraken'],
+            'symbols': ['BTC/USD'],
+            'AlgorithmClass': SearchAlgo,
+            'candidates': candidates,
+            'score': score,
+            'start_balances': {'kraken': {'USD': 100}},
+            'pd_start_date': pd_ts('2019-10-01 10:10'),
+            'pd_end_date': pd_ts('2019-10-01 10:16'),
+            'pd_interval': pandas.Timedelta(minutes=1),
+            'pd_first_duration': pandas.Timedelta(minutes=2),
+            'data_dir': data_dir,
+        }
+        params.update(kwargs)
+        with self.assertLogs('btrccts'):
+            return successive_halving(**params)
+
+    def assert_dates(self, algorithm, end):
+        dates = pandas.date_range(start='2019-10-01 10:10', end=end,
+                                  freq='1min', tz='UTC')
+        self.assertEqual(algorithm.dates, list(dates))
+
+    def test__successive_halving(self):
+        candidates = [{'score': 1}, {'score': 4}, {'score': 2}, {'score': 3}]
+        result = self.run_search(candidates)
+        self.assertEqual([r['args'] for r in result],
+                         [{'score': 4}, {'score': 3},
+                          {'score': 2}, {'score': 1}])
+        self.assertEqual([r['score'] for r in result], [4, 3, 2, 1])
+        self.assertEqual([r['round'] for r in result], [2, 1, 0, 0])
+        self.assertEqual([r['end_date'] for r in result],
+                         [pd_ts('2019-10-01 10:16'),
+                          pd_ts('2019-10-01 10:14'),
+                          pd_ts('2019-10-01 10:12'),
+                          pd_ts('2019-10-01 10:12')])
+        # The runs are continued, not restarted
+        self.assert_dates(result[0]['algorithm'], '2019-10-01 10:16')
+        self.assert_dates(result[1]['algorithm'], '2019-10-01 10:14')
+        self.assert_dates(result[2]['algorithm'], '2019-10-01 10:12')
+        # The candidates share the arrays of the ohlcv data
+        first, second = [r['algorithm'].context for r in result[:2]]
+        self.assertTrue(numpy.shares_memory(
+            first.window('kraken', 'BTC/USD', 1000),
+            second.window('kraken', 'BTC/USD', 1000)))
+        self.assert_dates(result[3]['algorithm'], '2019-10-01 10:12')
+        self.assertEqual(result[0]['algorithm'].exit_reasons,
+                         [ExitReason.FINISHED])
+        for r in result[1:]:
+            self.assertEqual(r['algorithm'].exit_reasons,
+                             [ExitReason.STOPPED])
+
+    def test__successive_halving__sync(self):
+        with patch('btrccts.run.main_loop_sync',
+                   wraps=main_loop_sync) as loop:
+            self.run_search([{'score': 1}, {'score': 2}],
+                            AlgorithmClass=SyncSearchAlgo)
+        # 2 candidates in the first round, 1 in the last round
+        self.assertEqual(loop.call_count, 3)
+
+    def test__successive_halving__sleep(self):
+        start = time.perf_counter()
+        result = self.run_search([{'score': 1}, {'score': 2}],
+                                 AlgorithmClass=SleepingSearchAlgo)
+        # The sleeps use the simulated time
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual([r['score'] for r in result], [2, 1])
+        self.assert_dates(result[0]['algorithm'], '2019-10-01 10:16')
+
+    def test__successive_halving__stopped_candidate(self):
+        candidates = [{'score': 5, 'stop_at': 2}, {'score': 1},
+                      {'score': 2}]
+        result = self.run_search(candidates, keep_fraction=0.7)
+        # The score of the stopped candidate covers a shorter period, it is
+        # ranked after the candidate of the last round
+        self.assertEqual([r['score'] for r in result], [2, 5, 1])
+        self.assertEqual([r['round'] for r in result], [1, 0, 0])
+        stopped = result[1]['algorithm']
+        self.assertEqual(stopped.exit_reasons, [ExitReason.STOPPED])
+        self.assert_dates(stopped, '2019-10-01 10:11')
+        self.assertEqual(result[1]['end_date'], pd_ts('2019-10-01 10:11'))
+        self.assert_dates(result[0]['algorithm'], '2019-10-01 10:16')
+        self.assertEqual(result[0]['algorithm'].exit_reasons,
+                         [ExitReason.FINISHED])
+
+    def test__successive_halving__score_balances(self):
+        score_calls = []
+
+        def score(algorithm, balances):
+            score_calls.append(balances)
+            return algorithm.args['score']
+
+        result = self.run_search([{'score': 1}], score=score)
+        self.assertEqual(len(result), 1)
+        self.assert_dates(result[0]['algorithm'], '2019-10-01 10:16')
+        self.assertEqual(score_calls, [
+            {'kraken': {'USD': {'free': 100.0, 'total': 100.0,
+                                'used': 0.0}}}])
+
+    def test__successive_halving__volume_share(self):
+        with self.assertRaises(ValueError) as e:
+            successive_halving(
+                exchange_names=['kraken'], symbols=['BTC/USD'],
+                AlgorithmClass=SearchAlgo, candidates=[{'score': 1}],
+                score=score_args, start_balances={'kraken': {'USD': 100}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                pd_first_duration=pandas.Timedelta(minutes=2),
+                data_dir=data_dir, volume_share=2)
+        self.assertEqual(str(e.exception),
+                         'ExchangeAccount: volume share needs to be '
+                         'between 0 and 1')
+
+    def test__successive_halving__keep_fraction(self):
+        for keep_fraction in [0, 1, 1.5]:
+            with self.assertRaises(ValueError) as e:
+                successive_halving(
+                    exchange_names=[], symbols=[], AlgorithmClass=SearchAlgo,
+                    candidates=[], score=score_args, start_balances={},
+                    pd_start_date=pd_ts('2019-10-01 10:10'),
+                    pd_end_date=pd_ts('2019-10-01 10:16'),
+                    pd_interval=pandas.Timedelta(minutes=1),
+                    pd_first_duration=pandas.Timedelta(minutes=2),
+                    keep_fraction=keep_fraction)
+            self.assertEqual(str(e.exception),
+                             'keep_fraction needs to be between 0 and 1')
+
+    def test__successive_halving__first_duration(self):
+        with self.assertRaises(ValueError) as e:
+            successive_halving(
+                exchange_names=[], symbols=[], AlgorithmClass=SearchAlgo,
+                candidates=[], score=score_args, start_balances={},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                pd_first_duration=pandas.Timedelta(minutes=0))
+        self.assertEqual(str(e.exception),
+                         'first duration needs to be positive')
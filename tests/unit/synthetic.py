@@ -0,0 +1,123 @@
+import os
+import pandas
+import tempfile
+import unittest
+from btrccts.run import load_ohlcvs
+from btrccts.synthetic import generate_data_directory, generate_ohlcv, \
+    main, write_ohlcv_csv
+from pandas.testing import assert_frame_equal
+from tests.common import pd_ts
+
+
+def generate(**kwargs):
+    return pandas.concat(generate_ohlcv(
+        pd_start_date=pd_ts('2019-10-01 10:10'),
+        pd_end_date=pd_ts('2019-10-03 10:10'), **kwargs))
+
+
+class SyntheticTest(unittest.TestCase):
+
+    def test__generate_ohlcv(self):
+        ohlcv = generate(seed=3, start_price=50)
+        self.assertEqual(list(ohlcv.columns),
+                         ['open', 'high', 'low', 'close', 'volume'])
+        self.assertEqual(len(ohlcv.index), 2 * 24 * 60 + 1)
+        self.assertEqual(ohlcv.index[0], pd_ts('2019-10-01 10:10'))
+        self.assertEqual(ohlcv.index[-1], pd_ts('2019-10-03 10:10'))
+        self.assertTrue((ohlcv.index.to_series().diff()[1:] ==
+                         pandas.Timedelta('1min')).all())
+        self.assertEqual(ohlcv['open'].iloc[0], 50)
+        self.assertTrue((ohlcv['open'].values[1:] ==
+                         ohlcv['close'].values[:-1]).all())
+        self.assertTrue((ohlcv['high'] >= ohlcv['open']).all())
+        self.assertTrue((ohlcv['high'] >= ohlcv['close']).all())
+        self.assertTrue((ohlcv['low'] <= ohlcv['open']).all())
+        self.assertTrue((ohlcv['low'] <= ohlcv['close']).all())
+        self.assertTrue((ohlcv['low'] > 0).all())
+        self.assertTrue((ohlcv['volume'] > 0).all())
+
+    def test__generate_ohlcv__seed(self):
+        assert_frame_equal(generate(seed=1), generate(seed=1))
+        self.assertFalse(generate(seed=1).equals(generate(seed=2)))
+        # The chunk size does not change the data
+        assert_frame_equal(generate(seed=1),
+                           generate(seed=1, chunk_minutes=100))
+
+    def test__generate_ohlcv__chunks(self):
+        chunks = list(generate_ohlcv(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                     pd_end_date=pd_ts('2019-10-01 10:59'),
+                                     chunk_minutes=20))
+        self.assertEqual([len(chunk.index) for chunk in chunks],
+                         [20, 20, 10])
+        self.assertEqual(chunks[1].index[0], pd_ts('2019-10-01 10:30'))
+
+    def test__generate_ohlcv__drift(self):
+        up = generate(seed=1, drift=1000)
+        down = generate(seed=1, drift=-1000)
+        self.assertGreater(up['close'].iloc[-1], 100)
+        self.assertLess(down['close'].iloc[-1], 100)
+
+    def test__generate_ohlcv__errors(self):
+        with self.assertRaises(ValueError) as e:
+            list(generate_ohlcv(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                pd_end_date=pd_ts('2019-10-01 10:09')))
+        self.assertEqual(str(e.exception),
+                         'Synthetic: end date needs to be after start date')
+        with self.assertRaises(ValueError) as e:
+            generate(start_price=0)
+        self.assertEqual(str(e.exception),
+                         'Synthetic: start price needs to be positive')
+        with self.assertRaises(ValueError) as e:
+            generate(chunk_minutes=0)
+        self.assertEqual(str(e.exception),
+                         'Synthetic: chunk minutes needs to be positive')
+
+    def test__write_ohlcv_csv(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = os.path.join(data_dir, 'ohlcv', 'kraken', 'BTC', 'USD.csv')
+            rows = write_ohlcv_csv(path, generate_ohlcv(
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 12:10'), chunk_minutes=50))
+            self.assertEqual(rows, 121)
+            ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                                 exchange_names=['kraken'],
+                                 symbols=['BTC/USD'])
+        expected = pandas.concat(generate_ohlcv(
+            pd_start_date=pd_ts('2019-10-01 10:10'),
+            pd_end_date=pd_ts('2019-10-01 12:10')))
+        assert_frame_equal(ohlcvs['kraken']['BTC/USD'], expected,
+                           check_freq=False, check_names=False, rtol=1e-9)
+
+    def test__generate_data_directory(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with self.assertLogs('btrccts') as cm:
+                generate_data_directory(
+                    data_dir=data_dir, exchange_names=['kraken', 'okx'],
+                    symbols=['BTC/USD', 'ETH/BTC'],
+                    pd_start_date=pd_ts('2019-10-01 10:10'),
+                    pd_end_date=pd_ts('2019-10-01 10:19'), seed=5)
+            self.assertEqual(len(cm.output), 4)
+            self.assertEqual(
+                cm.output[0], 'INFO:btrccts:Wrote 10 candles to {}'.format(
+                    os.path.join(data_dir, 'ohlcv', 'kraken', 'BTC/USD.csv')))
+            ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                                 exchange_names=['kraken', 'okx'], symbols=[])
+        self.assertEqual(sorted(ohlcvs['okx']), ['BTC/USD', 'ETH/BTC'])
+        closes = [ohlcvs[exchange][symbol]['close'].iloc[-1]
+                  for exchange in ['kraken', 'okx']
+                  for symbol in ['BTC/USD', 'ETH/BTC']]
+        self.assertEqual(len(set(closes)), 4)
+
+    def test__main(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with self.assertLogs('btrccts'):
+                main(['--exchanges', 'kraken', '--symbols', 'BTC/USD',
+                      '--start-date', '2019-10-01 10:10',
+                      '--end-date', '2019-10-01 10:19', '--seed', '2',
+                      '--start-price', '200', '--data-directory', data_dir])
+            ohlcvs = load_ohlcvs(ohlcv_dir=os.path.join(data_dir, 'ohlcv'),
+                                 exchange_names=['kraken'],
+                                 symbols=['BTC/USD'])
+        ohlcv = ohlcvs['kraken']['BTC/USD']
+        self.assertEqual(len(ohlcv.index), 10)
+        self.assertEqual(ohlcv['open'].iloc[0], 200)
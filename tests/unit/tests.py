@@ -1,15 +1,36 @@
 import unittest
+from tests.unit.branch import ExecuteBranchesTest
+from tests.unit.checkpoint import CheckpointTest, \
+    ExecuteAlgorithmCheckpointTest
 from tests.unit.context import BacktestContextTest, LiveContextTest
 from tests.unit.balance import BalanceTest
+from tests.unit.event_loop import BacktestEventLoopTest
 from tests.unit.exchange import BacktestExchangeBaseTest
 from tests.unit.async_exchange import AsyncBacktestExchangeBaseTest
 from tests.unit.exchange_account import ExchangeAccountTest
 from tests.unit.exchange_backend import ExchangeBackendTest
+from tests.unit.imports import LazyImportTest
+from tests.unit.features import FeatureStoreTest
+from tests.unit.indicators import BacktestIndicatorsTest, \
+    IndicatorFunctionsTest, LiveIndicatorsTest
+from tests.unit.live_host import HostAlgorithmsTest, SchedulerTest, \
+    SharedExchangesTest
+from tests.unit.markets import MarketSnapshotTest
+from tests.unit.metrics import ExporterTest, MetricsRegistryTest, \
+    RunMetricsTest
 from tests.unit.pep_checker import Pep8Test
+from tests.unit.portfolio import PortfolioTest
+from tests.unit.profiling import ProfilerTest, ProfilerContextTest
 from tests.unit.run import LoadCSVTests, MainLoopTests, \
     ExecuteAlgorithmTests, ParseParamsAndExecuteAlgorithmTests, \
-    SleepUntilTests, AsyncMainLoopTests
+    SleepUntilTests, AsyncMainLoopTests, SyncMainLoopTests
+from tests.unit.search import SuccessiveHalvingTest
+from tests.unit.synthetic import SyntheticTest
 from tests.unit.timeframe import TimeframeTest
+from tests.unit.vectorized import VectorizedTest
+from tests.unit.watch import WatchTest
+from tests.unit.window import BacktestWindowTest, LiveWindowTest, \
+    PanelTest, RingBufferTest
 
 
 def test_suite():
@@ -19,15 +40,43 @@ def test_suite():
         unittest.makeSuite(BacktestExchangeBaseTest),
         unittest.makeSuite(AsyncBacktestExchangeBaseTest),
         unittest.makeSuite(BalanceTest),
+        unittest.makeSuite(BacktestEventLoopTest),
+        unittest.makeSuite(ExecuteBranchesTest),
+        unittest.makeSuite(CheckpointTest),
+        unittest.makeSuite(ExecuteAlgorithmCheckpointTest),
         unittest.makeSuite(ExchangeAccountTest),
         unittest.makeSuite(ExchangeBackendTest),
         unittest.makeSuite(ExecuteAlgorithmTests),
         unittest.makeSuite(LoadCSVTests),
         unittest.makeSuite(MainLoopTests),
+        unittest.makeSuite(FeatureStoreTest),
+        unittest.makeSuite(IndicatorFunctionsTest),
+        unittest.makeSuite(BacktestIndicatorsTest),
+        unittest.makeSuite(LiveIndicatorsTest),
+        unittest.makeSuite(LazyImportTest),
+        unittest.makeSuite(HostAlgorithmsTest),
+        unittest.makeSuite(SchedulerTest),
+        unittest.makeSuite(SharedExchangesTest),
+        unittest.makeSuite(MarketSnapshotTest),
+        unittest.makeSuite(MetricsRegistryTest),
+        unittest.makeSuite(ExporterTest),
+        unittest.makeSuite(RunMetricsTest),
         unittest.makeSuite(AsyncMainLoopTests),
+        unittest.makeSuite(SyncMainLoopTests),
         unittest.makeSuite(ParseParamsAndExecuteAlgorithmTests),
         unittest.makeSuite(Pep8Test),
+        unittest.makeSuite(PortfolioTest),
+        unittest.makeSuite(ProfilerTest),
+        unittest.makeSuite(ProfilerContextTest),
+        unittest.makeSuite(SyntheticTest),
         unittest.makeSuite(TimeframeTest),
+        unittest.makeSuite(VectorizedTest),
+        unittest.makeSuite(WatchTest),
+        unittest.makeSuite(BacktestWindowTest),
+        unittest.makeSuite(RingBufferTest),
+        unittest.makeSuite(LiveWindowTest),
+        unittest.makeSuite(PanelTest),
         unittest.makeSuite(SleepUntilTests),
+        unittest.makeSuite(SuccessiveHalvingTest),
     ])
     return suite
@@ -84,3 +84,42 @@ class TimeframeTest(unittest.TestCase):
                       pd_interval=pandas.Timedelta(minutes=15))
         t.add_timedelta_until(pd_ts('2017-01-01 2:31'))
         self.assertEqual(t.date(), pd_ts('2017-01-01 2:30'))
+
+    def test__set_end_date(self):
+        t = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
+                      pd_end_date=pd_ts('2017-01-01 1:01'),
+                      pd_interval=pandas.Timedelta(minutes=1))
+        t.add_timedelta()
+        t.add_timedelta()
+        self.assertEqual(t.finished(), True)
+        t.set_end_date(pd_ts('2017-01-01 1:03'))
+        self.assertEqual(t.end_date(), pd_ts('2017-01-01 1:03'))
+        self.assertEqual(t.finished(), False)
+        self.assertEqual(t.date(), pd_ts('2017-01-01 1:02'))
+
+    def test__set_end_date__smaller_than_start_date(self):
+        t = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
+                      pd_end_date=pd_ts('2017-01-01 1:01'),
+                      pd_interval=pandas.Timedelta(minutes=1))
+        with self.assertRaises(ValueError) as e:
+            t.set_end_date(pd_ts('2017-01-01 0:59'))
+        self.assertEqual(str(e.exception),
+                         'Timeframe: end date is smaller then start date')
+
+    def test__get_state__set_state(self):
+        t = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
+                      pd_end_date=pd_ts('2017-01-01 1:35'),
+                      pd_interval=pandas.Timedelta(minutes=15))
+        t.add_timedelta()
+        state = t.get_state()
+        self.assertEqual(state, {
+            'start_date': pd_ts('2017-01-01 1:00'),
+            'current_date': pd_ts('2017-01-01 1:15'),
+            'end_date': pd_ts('2017-01-01 1:35'),
+            'interval': pandas.Timedelta(minutes=15)})
+        t.add_timedelta()
+        t.set_end_date(pd_ts('2017-01-01 1:40'))
+        t.set_state(state)
+        self.assertEqual(t.date(), pd_ts('2017-01-01 1:15'))
+        self.assertEqual(t.end_date(), pd_ts('2017-01-01 1:35'))
+        self.assertEqual(t.interval(), pandas.Timedelta(minutes=15))
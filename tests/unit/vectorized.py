@@ -0,0 +1,160 @@
+import numpy
+import pandas
+import unittest
+from ccxt.base.errors import InsufficientFunds
+from btrccts.exchange_account import ExchangeAccount
+from btrccts.timeframe import Timeframe
+from btrccts.vectorized import positions_to_amounts, simulate_orders, \
+    simulate_positions, timeframe_dates
+from tests.common import BTC_USD_MARKET, ETH_BTC_MARKET, pd_ts
+
+nan = numpy.nan
+
+
+class VectorizedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
+                                   pd_end_date=pd_ts('2017-01-01 1:06'),
+                                   pd_interval=pandas.Timedelta(minutes=2))
+        dates = pandas.date_range(pd_ts('2017-01-01 0:59'),
+                                  pd_ts('2017-01-01 1:08'), freq='1min')
+        self.ohlcvs = {
+            'BTC/USD': pandas.DataFrame(
+                data={'high': [2, 3, 4, 5, 6, 7, 8, 9, 10, 11],
+                      'low': [1, 2, 3, 2, 1, 6, 7, 8, 9, 10]},
+                index=dates),
+            'ETH/BTC': pandas.DataFrame(
+                data={'high': [0.4] * 10,
+                      'low': [0.3, 0.3, 0.3, 0.3, 0.2, 0.3, 0.3, 0.3, 0.3,
+                              0.3]},
+                index=dates),
+        }
+        self.markets = {'BTC/USD': BTC_USD_MARKET, 'ETH/BTC': ETH_BTC_MARKET}
+
+    def simulate_with_account(self, amounts, prices, balances):
+        timeframe = Timeframe(pd_start_date=self.timeframe.start_date(),
+                              pd_end_date=self.timeframe.end_date(),
+                              pd_interval=self.timeframe.interval())
+        account = ExchangeAccount(timeframe=timeframe, ohlcvs=self.ohlcvs,
+                                  balances=balances)
+        result = []
+        for i, _ in enumerate(timeframe_dates(timeframe)):
+            for symbol in amounts:
+                amount = amounts[symbol][i]
+                if amount == 0:
+                    continue
+                price = prices.get(symbol, [nan] * (i + 1))[i]
+                limit = not numpy.isnan(price)
+                account.create_order(
+                    market=self.markets[symbol],
+                    type='limit' if limit else 'market',
+                    side='buy' if amount > 0 else 'sell',
+                    amount=abs(amount),
+                    price=price if limit else None)
+            balance = account.fetch_balance()
+            result.append({key: value['total']
+                           for key, value in balance.items()})
+            timeframe.add_timedelta()
+        return result
+
+    def test__timeframe_dates(self):
+        self.assertEqual(list(timeframe_dates(self.timeframe)),
+                         [pd_ts('2017-01-01 1:00'), pd_ts('2017-01-01 1:02'),
+                          pd_ts('2017-01-01 1:04'), pd_ts('2017-01-01 1:06')])
+
+    def test__simulate_orders__same_as_exchange_account(self):
+        amounts = {'BTC/USD': [2, -1, 0, -0.5],
+                   'ETH/BTC': [3, 0, -2, 1]}
+        prices = {'BTC/USD': [nan, 5, nan, nan],
+                  'ETH/BTC': [0.25, nan, nan, 0.35]}
+        balances = {'USD': 100, 'BTC': 1}
+        result = simulate_orders(timeframe=self.timeframe,
+                                 ohlcvs=self.ohlcvs, markets=self.markets,
+                                 amounts=amounts, prices=prices,
+                                 balances=balances)
+        expected = self.simulate_with_account(amounts, prices, balances)
+        self.assertEqual(list(result['balances'].columns),
+                         ['BTC', 'USD', 'ETH'])
+        for row, expected_row in zip(result['balances'].to_dict('records'),
+                                     expected):
+            for key in row:
+                self.assertAlmostEqual(row[key], expected_row.get(key, 0))
+        orders = result['orders']
+        self.assertEqual(list(orders['symbol']),
+                         ['BTC/USD', 'ETH/BTC', 'BTC/USD', 'ETH/BTC',
+                          'BTC/USD', 'ETH/BTC'])
+        self.assertEqual(list(orders['status']),
+                         ['closed', 'closed', 'closed', 'closed', 'closed',
+                          'open'])
+        self.assertEqual(list(orders['fill_date'][:4]),
+                         [pd_ts('2017-01-01 1:00'), pd_ts('2017-01-01 1:03'),
+                          pd_ts('2017-01-01 1:03'), pd_ts('2017-01-01 1:04')])
+        self.assertTrue(pandas.isna(orders['fill_date'][5]))
+        self.assertAlmostEqual(orders['price'][0], 3 * 1.0015)
+        self.assertEqual(list(orders['fee_rate']),
+                         [0.002, 0.005, 0.001, 0.01, 0.002, 0.005])
+        self.assertAlmostEqual(result['used_balances']['BTC'].iloc[-1],
+                               0.35)
+
+    def test__simulate_orders__insufficient_funds(self):
+        with self.assertRaises(InsufficientFunds) as e:
+            simulate_orders(timeframe=self.timeframe, ohlcvs=self.ohlcvs,
+                            markets=self.markets,
+                            amounts={'BTC/USD': [1, 0, 40, 0]},
+                            balances={'USD': 100})
+        self.assertEqual(str(e.exception),
+                         'Vectorized: balance of USD too little at '
+                         '2017-01-01 01:04:00+00:00')
+
+    def test__simulate_orders__limit_order_blocks_balance(self):
+        with self.assertRaises(InsufficientFunds) as e:
+            simulate_orders(timeframe=self.timeframe, ohlcvs=self.ohlcvs,
+                            markets=self.markets,
+                            amounts={'BTC/USD': [-1, -1, 0, 0]},
+                            prices={'BTC/USD': [20, 20, nan, nan]},
+                            balances={'BTC': 1.5})
+        self.assertEqual(str(e.exception),
+                         'Vectorized: balance of BTC too little at '
+                         '2017-01-01 01:02:00+00:00')
+
+    def test__simulate_orders__errors(self):
+        def simulate(**kwargs):
+            params = {'timeframe': self.timeframe, 'ohlcvs': self.ohlcvs,
+                      'markets': self.markets,
+                      'amounts': {'BTC/USD': [1, 0, 0, 0]}}
+            params.update(kwargs)
+            with self.assertRaises(ValueError) as e:
+                simulate_orders(**params)
+            return str(e.exception)
+
+        self.assertEqual(simulate(amounts={'BTC/USD': [1, 0]}),
+                         'Vectorized: amounts of BTC/USD need one value per '
+                         'date')
+        self.assertEqual(simulate(prices={'BTC/USD': [-1, 0, 0, 0]}),
+                         'Vectorized: prices need to be positive')
+        self.assertEqual(simulate(markets={}),
+                         'Vectorized: no market for BTC/USD')
+        self.assertEqual(simulate(ohlcvs={}),
+                         'Vectorized: no prices for BTC/USD')
+        timeframe = Timeframe(pd_start_date=pd_ts('2017-01-01 1:00'),
+                              pd_end_date=pd_ts('2017-01-01 1:06'),
+                              pd_interval=pandas.Timedelta(seconds=90))
+        self.assertEqual(simulate(timeframe=timeframe),
+                         'Vectorized: interval needs to be a multiple of '
+                         '1 minute')
+
+    def test__positions_to_amounts(self):
+        self.assertEqual(list(positions_to_amounts([1, 1, 0, 2])),
+                         [1, 0, -1, 2])
+        self.assertEqual(list(positions_to_amounts([1, 1], 3)), [-2, 0])
+
+    def test__simulate_positions(self):
+        result = simulate_positions(
+            timeframe=self.timeframe, ohlcvs=self.ohlcvs,
+            markets=self.markets, positions={'BTC/USD': [1, 1, 0, 0]},
+            balances={'USD': 10, 'BTC': 0.01}, start_positions={})
+        self.assertEqual(list(result['orders']['side']), ['buy', 'sell'])
+        btc = result['balances']['BTC']
+        self.assertAlmostEqual(btc.iloc[1], 0.01 + 1 * (1 - 0.002))
+        self.assertAlmostEqual(btc.iloc[2], 0.01 - 0.002)
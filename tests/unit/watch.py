@@ -0,0 +1,217 @@
+import asyncio
+import ccxt.async_support
+import os
+import pandas
+import unittest
+from btrccts.algorithm import AlgorithmBase
+from btrccts.context import BacktestContext
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.run import ExitReason, execute_algorithm
+from btrccts.timeframe import Timeframe
+from btrccts.watch import TimeframeFinished, wait_for_date_after, \
+    wait_for_next_date
+from unittest.mock import patch
+from tests.common import BTC_USD_MARKET, async_fetch_markets_return, \
+    async_return, async_test, pd_ts
+
+here = os.path.dirname(__file__)
+data_dir = os.path.join(here, 'run', 'data_dir')
+
+
+class WatchAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.kraken = context.create_exchange('kraken', async_ccxt=True)
+        self.candles = []
+        self.exit_reason = None
+
+    async def next_iteration(self):
+        while True:
+            candles = await self.kraken.watch_ohlcv('BTC/USD', '1m')
+            self.candles += candles
+
+    async def exit(self, reason):
+        self.exit_reason = reason
+        await self.kraken.close()
+
+
+class BackgroundWatchAlgo(AlgorithmBase):
+
+    def __init__(self, context, args):
+        self.context = context
+        self.kraken = context.create_exchange('kraken', async_ccxt=True)
+        self.dates = []
+        self.ticker_dates = []
+        self.task = None
+
+    async def watch(self):
+        while True:
+            ticker = await self.kraken.watch_ticker('BTC/USD')
+            self.ticker_dates.append(ticker['timestamp'])
+
+    async def next_iteration(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.watch())
+        self.dates.append(self.context.date())
+        # The watcher waits for the next date, when next_iteration returns
+        await asyncio.sleep(0)
+
+    async def exit(self, reason):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        await self.kraken.close()
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:16'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        ohlcv = pandas.read_csv(
+            os.path.join(data_dir, 'ohlcv', 'kraken', 'BTC', 'USD.csv'),
+            index_col=0, parse_dates=True)
+        backend = ExchangeBackend(timeframe=self.timeframe,
+                                  balances={'BTC': 1},
+                                  ohlcvs={'BTC/USD': ohlcv})
+        self.context = BacktestContext(timeframe=self.timeframe,
+                                       exchange_backends={'kraken': backend})
+
+    @async_test
+    async def test__wait_for_next_date__shared_step(self):
+        await asyncio.gather(wait_for_next_date(self.timeframe),
+                             wait_for_next_date(self.timeframe))
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:11'))
+
+    @async_test
+    async def test__wait_for_date_after(self):
+        date = await wait_for_date_after(self.timeframe, None)
+        self.assertEqual(date, pd_ts('2019-10-01 10:10'))
+        date = await wait_for_date_after(self.timeframe,
+                                         pd_ts('2019-10-01 10:09'))
+        self.assertEqual(date, pd_ts('2019-10-01 10:10'))
+        date = await wait_for_date_after(self.timeframe,
+                                         pd_ts('2019-10-01 10:11'))
+        self.assertEqual(date, pd_ts('2019-10-01 10:12'))
+
+    @async_test
+    async def test__wait_for_next_date__finished(self):
+        for _ in range(6):
+            await wait_for_next_date(self.timeframe)
+        with self.assertRaises(TimeframeFinished):
+            await wait_for_next_date(self.timeframe)
+        with self.assertRaises(TimeframeFinished):
+            await wait_for_date_after(self.timeframe, None)
+
+    @async_test
+    async def test__watch_ohlcv(self):
+        exchange = self.context.create_exchange('kraken', async_ccxt=True)
+        self.assertEqual(await exchange.watch_ohlcv('BTC/USD', '1m'),
+                         [[1569924600000, 2, 3, 1, 3, 100]])
+        self.assertEqual(await exchange.watch_ohlcv('BTC/USD', '5m'),
+                         [[1569924600000, 2, 3, 1, 3, 100]])
+        self.assertEqual(await exchange.watch_ohlcv('BTC/USD', '1m'),
+                         [[1569924660000, 3, 4, 2, 4, 200]])
+        # The incomplete candle gets updated
+        self.assertEqual(await exchange.watch_ohlcv('BTC/USD', '5m'),
+                         [[1569924600000, 2, 4, 1, 4, 300]])
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:11'))
+
+    @async_test
+    async def test__watch_ticker(self):
+        exchange = self.context.create_exchange('kraken', async_ccxt=True)
+        ticker = await exchange.watch_ticker('BTC/USD')
+        self.assertEqual(ticker['timestamp'], 1569924600000)
+        ticker = await exchange.watch_ticker('BTC/USD')
+        self.assertEqual(ticker['timestamp'], 1569924660000)
+        self.assertEqual(ticker['close'], 4)
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    @async_test
+    async def test__watch_orders(self, currencies, markets):
+        markets.side_effect = async_fetch_markets_return([BTC_USD_MARKET])
+        currencies.side_effect = async_return({})
+        exchange = self.context.create_exchange('kraken', async_ccxt=True)
+        await exchange.create_order(symbol='BTC/USD', type='limit',
+                                    side='sell', amount=1, price=4.5)
+        orders = await exchange.watch_orders()
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0]['id'], '1')
+        self.assertEqual(orders[0]['status'], 'closed')
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:12'))
+        await exchange.create_order(symbol='BTC/USD', type='market',
+                                    side='buy', amount=0.1)
+        orders = await exchange.watch_orders()
+        self.assertEqual([o['id'] for o in orders], ['2'])
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:12'))
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    @async_test
+    async def test__watch__set_state(self, currencies, markets):
+        markets.side_effect = async_fetch_markets_return([BTC_USD_MARKET])
+        currencies.side_effect = async_return({})
+        exchange = self.context.create_exchange('kraken', async_ccxt=True)
+        state = self.context.get_state()
+        await exchange.create_order(symbol='BTC/USD', type='limit',
+                                    side='sell', amount=1, price=4.5)
+        orders = await exchange.watch_orders()
+        self.assertEqual([o['status'] for o in orders], ['closed'])
+        await exchange.watch_ticker('BTC/USD')
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:12'))
+        # Restored like a branch
+        self.context.set_state(state)
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:10'))
+        ticker = await exchange.watch_ticker('BTC/USD')
+        self.assertEqual(ticker['timestamp'],
+                         pd_ts('2019-10-01 10:10').value // 10**6)
+        await exchange.create_order(symbol='BTC/USD', type='market',
+                                    side='sell', amount=0.1)
+        orders = await exchange.watch_orders()
+        self.assertEqual([(o['id'], o['status']) for o in orders],
+                         [('1', 'closed')])
+        self.assertEqual(self.timeframe.date(), pd_ts('2019-10-01 10:10'))
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    def test__execute_algorithm(self, currencies, markets):
+        markets.side_effect = async_fetch_markets_return([BTC_USD_MARKET])
+        currencies.side_effect = async_return({})
+        with self.assertLogs('btrccts'):
+            result = execute_algorithm(
+                exchange_names=['kraken'], symbols=['BTC/USD'], live=False,
+                auth_aliases={}, AlgorithmClass=WatchAlgo, args={},
+                start_balances={'kraken': {'USD': 1000}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir)
+        self.assertEqual(result.exit_reason, ExitReason.FINISHED)
+        self.assertEqual([c[4] for c in result.candles],
+                         [3, 4, 5, 6, 7, 8, 9])
+
+    @patch.object(ccxt.async_support.kraken, 'fetch_markets')
+    @patch.object(ccxt.async_support.kraken, 'fetch_currencies')
+    def test__execute_algorithm__background_watcher(self, currencies,
+                                                    markets):
+        markets.side_effect = async_fetch_markets_return([BTC_USD_MARKET])
+        currencies.side_effect = async_return({})
+        with self.assertLogs('btrccts'):
+            result = execute_algorithm(
+                exchange_names=['kraken'], symbols=['BTC/USD'], live=False,
+                auth_aliases={}, AlgorithmClass=BackgroundWatchAlgo, args={},
+                start_balances={'kraken': {'USD': 1000}},
+                pd_start_date=pd_ts('2019-10-01 10:10'),
+                pd_end_date=pd_ts('2019-10-01 10:16'),
+                pd_interval=pandas.Timedelta(minutes=1),
+                data_dir=data_dir)
+        # The step of the watcher and of the main loop are one step
+        dates = list(pandas.date_range('2019-10-01 10:10', '2019-10-01 10:16',
+                                       freq='1min', tz='UTC'))
+        self.assertEqual(result.dates, dates)
+        # A watcher, which is not waiting at the step, misses the date
+        timestamps = [date.value // 10**6 for date in dates]
+        self.assertEqual(result.ticker_dates[0], timestamps[0])
+        self.assertEqual(result.ticker_dates,
+                         [t for t in timestamps if t in result.ticker_dates])
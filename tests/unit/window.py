@@ -0,0 +1,229 @@
+import numpy
+import pandas
+import unittest
+from ccxt.base.errors import BadSymbol
+from btrccts.context import BacktestContext, LiveContext
+from btrccts.exchange_backend import ExchangeBackend
+from btrccts.timeframe import Timeframe
+from btrccts.window import LiveWindows, OhlcvArrayCache, RingBuffer
+from numpy.testing import assert_array_equal
+from unittest.mock import MagicMock, patch
+from tests.common import pd_ts
+from tests.unit.indicators import FakeExchange, create_ohlcv
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class BacktestWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ohlcv = create_ohlcv('2019-10-01 10:00', 30)
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:29'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        backend = ExchangeBackend(timeframe=self.timeframe,
+                                  ohlcvs={'BTC/USD': self.ohlcv})
+        self.context = BacktestContext(timeframe=self.timeframe,
+                                       exchange_backends={'kraken': backend})
+
+    def test__window(self):
+        window = self.context.window('kraken', 'BTC/USD', 3)
+        assert_array_equal(window, self.ohlcv[COLUMNS].values[8:11])
+        self.assertFalse(window.flags.writeable)
+        with self.assertRaises(ValueError):
+            window[0, 0] = 1
+        self.timeframe.add_timedelta()
+        window = self.context.window('kraken', 'BTC/USD', 3)
+        assert_array_equal(window, self.ohlcv[COLUMNS].values[9:12])
+        # Views of the same array
+        self.assertTrue(numpy.shares_memory(
+            window, self.context.window('kraken', 'BTC/USD', 5)))
+
+    def test__window__fields(self):
+        self.timeframe.add_timedelta()
+        close = self.context.window('kraken', 'BTC/USD', 4, 'close')
+        assert_array_equal(close, self.ohlcv['close'].values[8:12])
+        high, low = self.context.window('kraken', 'BTC/USD', 2,
+                                        ['high', 'low'])
+        assert_array_equal(high, self.ohlcv['high'].values[10:12])
+        assert_array_equal(low, self.ohlcv['low'].values[10:12])
+        self.assertFalse(high.flags.writeable)
+
+    def test__window__before_start(self):
+        # Shorter, if there are less candles until the current date
+        window = self.context.window('kraken', 'BTC/USD', 100)
+        assert_array_equal(window, self.ohlcv[COLUMNS].values[:11])
+
+    def test__window__between_candles(self):
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10:30'),
+                                   pd_end_date=pd_ts('2019-10-01 10:20'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        backend = ExchangeBackend(timeframe=self.timeframe,
+                                  ohlcvs={'BTC/USD': self.ohlcv})
+        window = backend.ohlcv_window('BTC/USD', 2, 'close')
+        assert_array_equal(window, self.ohlcv['close'].values[9:11])
+
+    def test__window__errors(self):
+        with self.assertRaises(ValueError) as e:
+            self.context.window('kraken', 'BTC/USD', 0)
+        self.assertEqual(str(e.exception), 'Window: n needs to be positive')
+        with self.assertRaises(ValueError) as e:
+            self.context.window('kraken', 'BTC/USD', 2, 'price')
+        self.assertEqual(str(e.exception), 'Window: unknown field price')
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test__ring_buffer(self):
+        buffer = RingBuffer(3, 2)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.last(2).shape, (0, 2))
+        buffer.append(numpy.array([[1, 2], [3, 4]]))
+        assert_array_equal(buffer.last(3), [[1, 2], [3, 4]])
+        buffer.append(numpy.array([[5, 6], [7, 8]]))
+        self.assertEqual(len(buffer), 3)
+        assert_array_equal(buffer.last(3), [[3, 4], [5, 6], [7, 8]])
+        assert_array_equal(buffer.last(1), [[7, 8]])
+        self.assertFalse(buffer.last(3).flags.writeable)
+        # More rows than the capacity
+        buffer.append(numpy.arange(10).reshape(5, 2))
+        assert_array_equal(buffer.last(3), [[4, 5], [6, 7], [8, 9]])
+
+
+class LiveWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ohlcv = create_ohlcv('2019-10-01 10:00', 60)
+        self.exchange = FakeExchange(self.ohlcv)
+        self.now = pd_ts('2019-10-01 10:20:30')
+        self.windows = LiveWindows(fetch_ohlcv=self.exchange.fetch_ohlcv,
+                                   now=lambda: self.now)
+
+    def expected(self, start, end):
+        return self.ohlcv[COLUMNS].values[start:end]
+
+    def test__window(self):
+        # The last complete candle is 10:19
+        window = self.windows.get('kraken', 'BTC/USD', 3)
+        assert_array_equal(window, self.expected(17, 20))
+        self.assertEqual(len(self.exchange.calls), 1)
+        self.assertFalse(window.flags.writeable)
+        self.now = pd_ts('2019-10-01 10:22:10')
+        window = self.windows.get('kraken', 'BTC/USD', 3, 'close')
+        assert_array_equal(window, self.ohlcv['close'].values[19:22])
+        # Only the new candles are fetched
+        self.assertEqual(self.exchange.calls[-1][2],
+                         pd_ts('2019-10-01 10:20').value / 10**6)
+        calls = len(self.exchange.calls)
+        # A smaller window uses the same buffer, no new candle: no fetch
+        window = self.windows.get('kraken', 'BTC/USD', 2)
+        assert_array_equal(window, self.expected(20, 22))
+        self.assertEqual(len(self.exchange.calls), calls)
+
+    @patch('btrccts.indicators.LIVE_FETCH_LIMIT', 4)
+    def test__window__larger(self):
+        self.windows.get('kraken', 'BTC/USD', 3)
+        # A larger window fetches the history again
+        window = self.windows.get('kraken', 'BTC/USD', 10)
+        assert_array_equal(window, self.expected(10, 20))
+        self.assertEqual(self.exchange.calls[-3][2],
+                         pd_ts('2019-10-01 10:10').value / 10**6)
+
+    @patch('btrccts.context.pandas.Timestamp.now')
+    def test__live_context(self, now):
+        now.return_value = pd_ts('2019-10-01 10:20:30')
+        context = LiveContext(timeframe=None, conf_dir='')
+        exchange = MagicMock()
+        exchange.fetch_ohlcv.side_effect = \
+            lambda symbol, timeframe, since, limit: self.exchange.fetch_ohlcv(
+                None, symbol, since, limit)
+        with patch.object(context, 'create_exchange',
+                          return_value=exchange) as create_exchange:
+            window = context.window('kraken', 'BTC/USD', 4, 'close')
+        create_exchange.assert_called_once_with('kraken')
+        self.assertEqual(exchange.fetch_ohlcv.call_args[0][:2],
+                         ('BTC/USD', '1m'))
+        assert_array_equal(window, self.ohlcv['close'].values[16:20])
+
+
+class PanelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.btc = create_ohlcv('2019-10-01 10:00', 30)
+        # Other prices and a different first and last candle
+        self.eth = create_ohlcv('2019-10-01 10:05', 30) * 2
+        self.timeframe = Timeframe(pd_start_date=pd_ts('2019-10-01 10:10'),
+                                   pd_end_date=pd_ts('2019-10-01 10:20'),
+                                   pd_interval=pandas.Timedelta(minutes=1))
+        self.backend = ExchangeBackend(
+            timeframe=self.timeframe,
+            ohlcvs={'ETH/BTC': self.eth, 'BTC/USD': self.btc})
+        self.context = BacktestContext(
+            timeframe=self.timeframe,
+            exchange_backends={'kraken': self.backend})
+
+    def test__panel__current(self):
+        self.assertEqual(self.context.panel_symbols('kraken'),
+                         ['BTC/USD', 'ETH/BTC'])
+        panel = self.context.panel('kraken')
+        assert_array_equal(panel, [self.btc[COLUMNS].values[10],
+                                   self.eth[COLUMNS].values[5]])
+        self.assertFalse(panel.flags.writeable)
+        self.timeframe.add_timedelta()
+        close = self.context.panel('kraken', fields='close')
+        assert_array_equal(close, [self.btc['close'].values[11],
+                                   self.eth['close'].values[6]])
+
+    def test__panel__window(self):
+        panel = self.context.panel('kraken', 3)
+        self.assertEqual(panel.shape, (2, 3, 5))
+        assert_array_equal(panel[0], self.btc[COLUMNS].values[8:11])
+        assert_array_equal(panel[1], self.eth[COLUMNS].values[3:6])
+        high, low = self.context.panel('kraken', 2, ['high', 'low'])
+        assert_array_equal(high, [self.btc['high'].values[9:11],
+                                  self.eth['high'].values[4:6]])
+        assert_array_equal(low, [self.btc['low'].values[9:11],
+                                 self.eth['low'].values[4:6]])
+        # Aligned at the latest first candle (10:05)
+        panel = self.context.panel('kraken', 100, 'close')
+        self.assertEqual(panel.shape, (2, 6))
+        # The array is created once
+        self.assertTrue(numpy.shares_memory(
+            panel, self.context.panel('kraken')))
+
+    def test__array_cache(self):
+        ohlcvs = {'ETH/BTC': self.eth, 'BTC/USD': self.btc}
+        cache = OhlcvArrayCache()
+        first, second = [ExchangeBackend(timeframe=self.timeframe,
+                                         ohlcvs=ohlcvs, array_cache=cache)
+                         for _ in range(2)]
+        self.assertTrue(numpy.shares_memory(
+            first.ohlcv_window('BTC/USD', 3),
+            second.ohlcv_window('BTC/USD', 5)))
+        self.assertTrue(numpy.shares_memory(first.ohlcv_panel(),
+                                            second.ohlcv_panel(2)))
+        self.assertFalse(numpy.shares_memory(
+            first.ohlcv_window('BTC/USD', 3),
+            first.ohlcv_window('ETH/BTC', 3)))
+        # Without a shared cache, every backend has its own arrays
+        self.assertFalse(numpy.shares_memory(
+            first.ohlcv_window('BTC/USD', 3),
+            self.backend.ohlcv_window('BTC/USD', 3)))
+        # Other dataframes are converted again
+        other = ExchangeBackend(timeframe=self.timeframe,
+                                ohlcvs={'BTC/USD': self.btc.copy()},
+                                array_cache=cache)
+        self.assertFalse(numpy.shares_memory(
+            first.ohlcv_window('BTC/USD', 3),
+            other.ohlcv_window('BTC/USD', 3)))
+        self.assertFalse(numpy.shares_memory(first.ohlcv_panel(),
+                                             other.ohlcv_panel()))
+
+    def test__panel__errors(self):
+        backend = ExchangeBackend(timeframe=self.timeframe)
+        with self.assertRaises(BadSymbol) as e:
+            backend.ohlcv_panel()
+        self.assertEqual(str(e.exception), 'ExchangeBackend: no prices')
+        with self.assertRaises(ValueError) as e:
+            self.backend.ohlcv_panel(0)
+        self.assertEqual(str(e.exception), 'Window: n needs to be positive')